@@ -13,6 +13,7 @@ class Context(HandlerCompose):
     def __init__(self, engine):
         super(Context, self).__init__(engine)
         self._current_time = None
+        self._time_listeners = []
         self._handlers['on_time'] = Handler(
             self.on_time, EVENTS.TIME, 'bar.open', 200
         )
@@ -28,6 +29,27 @@ class Context(HandlerCompose):
 
     def on_time(self, event, kwargs=None):
         self._current_time = event.time
+        for listener in self._time_listeners:
+            listener(event.time)
+
+    def reset(self):
+        """
+        清除当前时间，用于开始下一次回测
+        """
+        self._current_time = None
+
+    def add_time_listener(self, listener):
+        """
+        注册在当前时间更新时调用的函数, 用于数据模块等按时间推进内部游标
+
+        Args:
+            listener(function): 接收新的当前时间作为参数
+
+        Returns:
+            None
+        """
+        if listener not in self._time_listeners:
+            self._time_listeners.append(listener)
 
     def link(self, **kwargs):
         kwargs.pop('context', None)
@@ -48,6 +70,12 @@ class ContextMixin(object):
         # TODO 和initializedMixin做统一
         pass
 
+    def reset(self):
+        """
+        清除一次回测产生的状态，保留构造好的模块和已加载的数据，由Trader.reset调用
+        """
+        pass
+
     def set_context(self, context):
         if self.__use_proxy:
             self.context = proxy(context)
@@ -1,8 +1,8 @@
 from datetime import datetime
 
 from fxdayu.data.base import AbstractDataSupport
+from fxdayu.data.bar_store import BarStore, to_nanosecond
 import pandas as pd
-from numpy import float64
 
 
 class PanelDataSupport(AbstractDataSupport):
@@ -13,19 +13,28 @@ class PanelDataSupport(AbstractDataSupport):
         context is a optional parameters, to
 
         Args:
-            panel(pandas.Panel): Panel where real data stored in
+            panel(pandas.Panel | dict | fxdayu.data.bar_store.BarStore): Panel where real data stored in,
+                a dict of DataFrame or a BarStore is also accepted, bars are kept in a BarStore
             context: default end bar number refer to context.real_bar_num
             side(str): "L" or "R", "L" means bar's datetime refer to it's start time
                 "R" means bar's datetime refer to it's end time
         """
-        super(PanelDataSupport, self).__init__()
-        self._panel = panel
+        super(PanelDataSupport, self).__init__(None)
+        self._store = self._to_store(panel)
         self._frequency = frequency
         self._others = {}
-        self._date_index = self._panel.iloc[0].index
-        self._side = side
+        self._side = "left" if side == "L" else "right"
         self._context = context
 
+    @staticmethod
+    def _to_store(panel):
+        if isinstance(panel, BarStore):
+            return panel
+        elif isinstance(panel, dict):
+            return BarStore.from_frames(panel)
+        else:
+            return BarStore.from_panel(panel)
+
     @property
     def date_index(self):
         """
@@ -35,7 +44,7 @@ class PanelDataSupport(AbstractDataSupport):
         Returns:
             pandas.DatetimeIndex: Panel's datetime index
         """
-        return self._date_index
+        return self._store.index
 
     def set_context(self, context):
         """
@@ -52,21 +61,21 @@ class PanelDataSupport(AbstractDataSupport):
     def instance(self, tickers, fields, frequency, start=None, end=None, length=None):
         pass
 
-    def _get_ending_index(self, end):
+    def _get_ending_index(self, end, store=None):
         if isinstance(end, int):
             return end  # ending bar's number (start from 1) was given
         elif isinstance(end, datetime):
-            # ending bar's datetime was given
-            return self._date_index.searchsorted(end, side=self._side)
+            # ending bar's datetime was given, searched on the time axis of the store read
+            return (self._store if store is None else store).searchsorted(end, side=self._side)
         else:
             raise TypeError()
 
-    def _get_starting_index(self, start):
+    def _get_starting_index(self, start, store=None):
         if isinstance(start, int):
             return start - 1  # starting bar's number (start from 1) was given
         elif isinstance(start, datetime):
-            # starting bar's datetime was given
-            return self._date_index.searchsorted(start, side=self._side)
+            # starting bar's datetime was given, searched on the time axis of the store read
+            return (self._store if store is None else store).searchsorted(start, side=self._side)
         else:
             raise TypeError()
 
@@ -90,41 +99,29 @@ class PanelDataSupport(AbstractDataSupport):
         if isinstance(fields, str):
             fields = [fields]
         if frequency == self._frequency:
-            if start:
-                start_index = self._get_starting_index(start)
-                if end:
-                    end_index = self._get_ending_index(end)
-                elif length:
-                    end_index = start_index + length
-                else:
-                    end_index = self._context.real_bar_num  # using current bar number in context
+            store = self._store
+        else:
+            store = self._others[frequency]
+        if start:
+            start_index = self._get_starting_index(start, store)
+            if end:
+                end_index = self._get_ending_index(end, store)
+            elif length:
+                end_index = start_index + length
             else:
-                if end:
-                    end_index = self._get_ending_index(end)
-                else:
-                    end_index = self._context.real_bar_num  # using current bar number in context
-                start_index = end_index - length
-            if len(tickers) == 1:
-                df = self._panel[tickers[0]].iloc[start_index:end_index]
-                if fields:
-                    if len(fields) == 1:
-                        return df[fields[0]]
-                    else:
-                        return df[fields]
-                else:
-                    return df
+                end_index = self._context.real_bar_num  # using current bar number in context
+        else:
+            if end:
+                end_index = self._get_ending_index(end, store)
             else:
-                panel = self._panel[tickers].iloc[:, start_index:end_index]
-                if fields:
-                    if len(fields) == 1:
-                        return panel.loc[:, :, fields[0]]
-                    else:
-                        # TODO whether it is necessary to set copy=False
-                        return panel.loc[:, :, fields].swapaxes(0, 2)
-                else:
-                    return panel.swapaxes(0, 2)
+                end_index = self._context.real_bar_num  # using current bar number in context
+            start_index = end_index - length
+        if fields and len(fields) == 1:
+            fields = fields[0]
+        if len(tickers) == 1:
+            return store.frame(tickers[0], fields, start_index, end_index)
         else:
-            pn = self._others[frequency]
+            return store.panel(tickers, fields, start_index, end_index, by="field")
 
     def current(self, tickers, fields=None):
         """
@@ -140,33 +137,22 @@ class PanelDataSupport(AbstractDataSupport):
             tickers = [tickers]
         if isinstance(fields, str):
             fields = [fields]
+        if fields and len(fields) == 1:
+            fields = fields[0]
+        position = self._context.real_bar_num - 1
         if len(tickers) == 1:
-            series = self._panel[tickers[0]].iloc[self._context.real_bar_num - 1]
-            if fields:
-                if len(fields) == 1:
-                    return series[fields[0]]
-                else:
-                    return series[fields]
-            else:
-                return series
+            return self._store.bar(tickers[0], position, fields)
         else:
-            df = self._panel[tickers].iloc[:, self._context.real_bar_num - 1].T
-            if fields:
-                if len(fields) == 1:
-                    return df[fields[0]]
-                else:
-                    return df[fields]
-            else:
-                return df
+            return self._store.cross(tickers, position, fields)
 
     def pop(self, item):
-        return self._panel.pop(item)
+        return self._store.drop(item)
 
     def insert(self, item, frame, frequency=None):
         if not frequency or frequency == self._frequency:
-            self._panel[item] = frame
+            self._store.insert(item, frame)
         else:
-            self._others.setdefault(frequency, pd.Panel())[item] = frame
+            self._others.setdefault(frequency, BarStore(list(frame.columns))).insert(item, frame)
 
 
 class Context(object):
@@ -181,71 +167,79 @@ class MultiPanelData(AbstractDataSupport):
         self._panels = {}
         self._frequency = None
         self.major_axis = None
-        self.context = context if context is not None else Context()
+        self.context = None
+        self.set_context(context if context is not None else Context())
 
     def set_context(self, context):
         self.context = context
+        if hasattr(context, "add_time_listener"):
+            context.add_time_listener(self.on_context_time)
+
+    def on_context_time(self, time):
+        """
+        Advance cursor of every frequency as context time moves, so that lookups at
+        current time don't need to search the time axis.
+        """
+        for store in self._panels.values():
+            store.seek(time)
 
     def init(self, frequency, **ticker_frame):
-        panel = self.insert(frequency, **ticker_frame)
+        store = self.insert(frequency, **ticker_frame)
         self._frequency = frequency
-        self.major_axis = panel.major_axis
+        self.major_axis = store.index
 
     def insert(self, frequency, **ticker_frame):
-        panel = self._panels.get(frequency, None)
-        if panel is not None:
-            for ticker, frame in ticker_frame.items():
-                panel[ticker] = frame
-
+        store = self._panels.get(frequency, None)
+        if store is not None:
+            store.extend(ticker_frame)
         else:
-            panel = pd.Panel.from_dict(ticker_frame)
-            self._panels[frequency] = panel
-        return panel
+            store = BarStore.from_frames(ticker_frame)
+            self._panels[frequency] = store
+        if frequency == self._frequency:
+            self.major_axis = store.index
+        return store
 
     def drop(self, frequency, *tickers):
-        panel = self._panels.get(frequency, None)
-        if panel is not None:
+        store = self._panels.get(frequency, None)
+        if store is not None:
             if len(tickers):
                 for ticker in tickers:
-                    panel.pop(ticker)
+                    store.drop(ticker)
             else:
                 self._panels.pop(frequency)
 
+    def symbols(self, frequency=None):
+        """
+        Symbols stored in given frequency, default to main frequency.
+        """
+        return self._panels[frequency if frequency else self._frequency].symbols
+
     @staticmethod
-    def _find(panel, item, major, minor):
-        if item is not None:
-            if isinstance(item, (str, unicode)):
-                frame = panel[item]
-                return frame[minor].iloc[major]
-            else:
-                panel = panel[item]
-                return panel[:, major, minor]
+    def _find(store, item, major, minor):
+        if item is None:
+            symbols = store.symbols
+            item = symbols[0] if len(symbols) == 1 else symbols
+        if isinstance(item, (str, unicode)):
+            return store.frame(item, minor, major.start, major.stop)
         else:
-            if len(panel.items) == 1:
-                return panel[panel.items[0]][minor].iloc[major]
-            else:
-                return panel[:, major, minor]
+            return store.panel(item, minor, major.start, major.stop)
 
     @staticmethod
-    def search_axis(axis, time):
-        index = axis.searchsorted(time)
-        if axis[index] <= time:
-            return index
-        else:
-            return index - 1
+    def search_axis(store, time):
+        return store.locate(time)
 
-    def major_slice(self, axis, now, start, end, length):
-        last = self.search_axis(axis, now)
+    def major_slice(self, store, now, start, end, length):
+        last = store.seek(now)
 
         if end:
-            end = self.search_axis(axis, end)
+            end = self.search_axis(store, end)
             if end > last:
                 end = last
         else:
             end = last
 
         if start:
-            start = axis.searchsorted(pd.to_datetime(start))
+            start = store.searchsorted(start)
             if length:
                 if start + length <= end+1:
                     return slice(start, start+length)
@@ -260,33 +254,28 @@ class MultiPanelData(AbstractDataSupport):
             return slice(0, end+1)
 
     def current(self, tickers, fields=None):
-        if fields is None:
-            fields = slice(None)
-        panel = self._panels[self._frequency]
-        end = pd.to_datetime(self.context.current_time)
-        index = panel.major_axis.searchsorted(end, 'left')
-        if index >= len(panel.major_axis):
-            index = -1
+        store = self._panels[self._frequency]
+        time = self.context.current_time
+        index = store.seek(time)
+        # the first bar not earlier than current time, or the last bar when all are earlier
+        if (index < 0 or store.times[index] < to_nanosecond(time)) and index + 1 < len(store):
+            index += 1
 
         if isinstance(tickers, (str, unicode)):
-            frame = panel[tickers]
-            return frame[fields].iloc[index]
+            return store.bar(tickers, index, fields)
         else:
             for ticker in tickers:
-                if ticker not in panel.items:
+                if ticker not in store:
                     raise KeyError('%s not in items' % ticker)
-            panel = panel[tickers]
-            return panel.iloc[:, index].T[fields]
+            return store.cross(tickers, index, fields)
 
     def history(
             self, tickers, frequency, fields=None,
             start=None, end=None, length=None
     ):
-        if fields is None:
-            fields = slice(None)
-        panel = self._panels[frequency]
-        index_slice = self.major_slice(panel.major_axis, self.current_time, start, end, length)
-        return self._find(panel, tickers, index_slice, fields)
+        store = self._panels[frequency]
+        index_slice = self.major_slice(store, self.current_time, start, end, length)
+        return self._find(store, tickers, index_slice, fields)
 
     @property
     def frequency(self):
@@ -7,8 +7,10 @@ import pandas as pd
 from dictproxyhack import dictproxy
 
 from fxdayu.event import TimeEvent, ExitEvent
+from fxdayu.data.bar_store import Panel, make_panel
 from fxdayu.data.base import AbstractDataSupport
-from fxdayu.data.cache import MemoryCacheProxy
+from fxdayu.data.cache import MemoryCacheProxy, BarCache
+from fxdayu.data.disk_cache import DiskBarCache
 from fxdayu.data.support import PanelDataSupport, MultiPanelData
 
 
@@ -23,9 +25,10 @@ _BAR_FIELDS_MAP = OrderedDict([
 
 
 class MongoDataSupport(AbstractDataSupport):
-    def __init__(self, engine, db="admin", **info):
+    def __init__(self, engine, db="admin", cache_dir=None, **info):
         super(MongoDataSupport, self).__init__(engine)
         self._client = self.connect(**info)
+        self._disk_cache = DiskBarCache(cache_dir, list(_BAR_FIELDS_MAP.values())[1:]) if cache_dir else None
         self._db = db
         self._tickers = {}
         self._start = None
@@ -48,7 +51,6 @@ class MongoDataSupport(AbstractDataSupport):
         self._cache = MemoryCacheProxy(self, max_backtrack)
 
     def _fetch_ticker_bar_data(self, db, ticker, timeframe, dt_filter=None):
-        collection = self._client[db][ticker + "." + timeframe]
         if dt_filter is None:
             dt_filter = {}
             if self._start:
@@ -56,6 +58,15 @@ class MongoDataSupport(AbstractDataSupport):
             if self._end:
                 dt_filter['$lte'] = self._end
 
+        if self._disk_cache is not None:
+            frame = self._disk_cache.read(
+                db, ticker + "." + timeframe, dt_filter.get('$gte'), dt_filter.get('$lte'),
+                lambda start, end: self._find_bars(db, ticker, timeframe, start, end)
+            )
+            frame.insert(0, "datetime", frame.index)
+            return frame
+
+        collection = self._client[db][ticker + "." + timeframe]
         filter_ = {'datetime': dt_filter} if len(dt_filter) else {}
         if len(dt_filter) == 2:
             frame = pd.DataFrame(
@@ -77,13 +88,33 @@ class MongoDataSupport(AbstractDataSupport):
         frame.index = frame["datetime"]
         return frame
 
+    def _find_bars(self, db, ticker, timeframe, start=None, end=None):
+        """
+        读取MongoDB中[start, end]范围内的全部bar，用于填充本地缓存缺失的部分
+        """
+        dt_filter = {}
+        if start:
+            dt_filter['$gte'] = start
+        if end:
+            dt_filter['$lte'] = end
+        filter_ = {'datetime': dt_filter} if len(dt_filter) else {}
+        frame = pd.DataFrame(
+            list(
+                self._client[db][ticker + "." + timeframe].find(
+                    filter_, projection=_BAR_FIELDS_MAP.keys()
+                ).sort([('datetime', 1)])
+            )
+        ).rename_axis(_BAR_FIELDS_MAP, axis=1).reindex(columns=_BAR_FIELDS_MAP.values())
+        frame.index = frame.pop("datetime")
+        return frame
+
     def fetch_data(self):
         if not self._initialized:
             raise RuntimeError("MongoDataSupport hasn't been initialized!")
         temp = {}
         for ticker in self._tickers:
             temp[ticker] = self._fetch_ticker_bar_data(self._db, ticker, self._timeframe)
-        self._ds = PanelDataSupport(pd.Panel(temp), None)
+        self._ds = PanelDataSupport(temp, None)
 
     def set_context(self, context):
         if not self._ds:
@@ -133,10 +164,18 @@ class MongoDataSupport(AbstractDataSupport):
 
 
 class MultiDataSupport(AbstractDataSupport):
-    def __init__(self, engine, context=None, event_queue=None, **info):
+    def __init__(self, engine, context=None, event_queue=None, cache_dir=None, bar_cache=None, **info):
         super(MultiDataSupport, self).__init__(engine)
         self._db = info.pop('db', None)
         self._client = self.connect(**info)
+        self._disk_cache = DiskBarCache(cache_dir) if cache_dir else None
+        if bar_cache is not None:
+            self.bar_cache = bar_cache if isinstance(bar_cache, BarCache) else BarCache(bar_cache)
+            self._history_mongo = self.bar_cache.cached(key=("ticker", "frequency", "ticker_type"))(
+                self._history_mongo
+            )
+        else:
+            self.bar_cache = None
         self._panel_data = MultiPanelData(engine, context)
         self._initialized = False
         self.tickers = {}
@@ -234,7 +273,7 @@ class MultiDataSupport(AbstractDataSupport):
         """
 
         if assets is None:
-            assets = self._panel_data._panels[self._panel_data.frequency].items
+            assets = self._panel_data.symbols()
 
         try:
             return self._panel_data.current(assets, fields)
@@ -276,7 +315,7 @@ class MultiDataSupport(AbstractDataSupport):
 
         try:
             if assets is None:
-                assets = self._panel_data._panels[frequency].items
+                assets = self._panel_data.symbols(frequency)
 
             data = self._panel_data.history(
                 assets, frequency, fields,
@@ -290,7 +329,7 @@ class MultiDataSupport(AbstractDataSupport):
 
         except KeyError:
             if assets is None:
-                assets = self._panel_data._panels[self._panel_data.frequency].items
+                assets = self._panel_data.symbols()
 
             if not end:
                 end = self.current_time
@@ -301,7 +340,7 @@ class MultiDataSupport(AbstractDataSupport):
                 frames = {}
                 for ticker in assets:
                     frames[ticker] = self.history_db(ticker, frequency, fields, start, end, length)
-                return pd.Panel(frames)
+                return make_panel(frames)
 
     @staticmethod
     def match_length(frame, length):
@@ -310,11 +349,13 @@ class MultiDataSupport(AbstractDataSupport):
                 return False
             else:
                 return True
-        elif isinstance(frame, pd.Panel):
+        elif Panel is not None and isinstance(frame, Panel):
             if len(frame.major_axis) != length:
                 return False
             else:
                 return True
+        elif isinstance(frame, dict):
+            return all(len(item) == length for item in frame.values())
         else:
             return False
 
@@ -356,6 +397,14 @@ class MultiDataSupport(AbstractDataSupport):
         :param ticker_type:
         :return:
         """
+        ticker_type = self._db if not ticker_type else ticker_type
+        if self._disk_cache is not None and not length:
+            frame = self._history_cache(ticker, frequency, fields, start, end, ticker_type)
+        else:
+            frame = self._history_mongo(ticker, frequency, fields, start, end, length, ticker_type)
+        return frame if len(frame) != 1 else frame.iloc[0]
+
+    def _history_mongo(self, ticker, frequency, fields=None, start=None, end=None, length=None, ticker_type=None):
         dt_filter = {}
         col_name = '.'.join((ticker, frequency))
         if start:
@@ -365,7 +414,6 @@ class MultiDataSupport(AbstractDataSupport):
 
         filter_ = {'datetime': dt_filter} if len(dt_filter) else {}
 
-        ticker_type = self._db if not ticker_type else ticker_type
         fields, mapper, columns = self.key_map_transfer(fields, ticker_type)
 
         if not length:
@@ -386,7 +434,28 @@ class MultiDataSupport(AbstractDataSupport):
 
         frame = frame.rename_axis(mapper, 1).reindex(columns=columns)
         frame.index = frame.pop('datetime')
-        return frame if len(frame) != 1 else frame.iloc[0]
+        return frame
+
+    def _history_cache(self, ticker, frequency, fields=None, start=None, end=None, ticker_type=None):
+        """
+        从本地磁盘缓存读取[start, end]范围内的数据，缓存中缺失的时间段才会从MongoDB读取并合并进缓存。
+
+        :return: DataFrame
+        """
+
+        def fetch(_start, _end):
+            try:
+                return self._history_mongo(ticker, frequency, None, _start, _end, None, ticker_type)
+            except KeyError:
+                return None
+
+        col_name = '.'.join((ticker, frequency))
+        frame = self._disk_cache.read(ticker_type, col_name, start, end, fetch)
+        if not len(frame):
+            raise KeyError("Unable to find required data in %s.%s, please check your MongoDB" % (ticker_type, col_name))
+        if fields:
+            frame = frame[fields if isinstance(fields, list) else [fields]]
+        return frame
 
     def key_map_transfer(self, fields, ticker_type):
         if fields:
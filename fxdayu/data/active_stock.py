@@ -1,6 +1,9 @@
 from fxdayu.data.handler import MongoHandler, RedisHandler
+from fxdayu.data.cache import BarCache
+from fxdayu.data.ring_buffer import BarRing
+from fxdayu.event import EVENTS
 from itertools import compress
-from fxdayu.engine.handler import HandlerCompose
+from fxdayu.engine.handler import HandlerCompose, Handler
 from threading import Thread
 from fxdayu.data.resampler import Resampler
 from datetime import datetime, date, time
@@ -49,7 +52,7 @@ class ActiveStockData(object):
     CACHE = 2
     FIELDS = ['open', 'high', 'low', 'close', 'volume']
 
-    def __init__(self, cache=None, external=None):
+    def __init__(self, cache=None, external=None, bar_cache=None, window=None):
         if isinstance(cache, dict):
             self.cache = RedisHandler(**cache)
         elif isinstance(cache, RedisHandler):
@@ -70,12 +73,22 @@ class ActiveStockData(object):
         else:
             self.external = MongoHandler()
 
+        if bar_cache is not None:
+            self.bar_cache = bar_cache if isinstance(bar_cache, BarCache) else BarCache(bar_cache)
+            self._read_external = self.bar_cache.cached(key=("symbol",))(self._read_external)
+        else:
+            self.bar_cache = None
+
         self.resampler = Resampler()
         self.today = datetime.combine(date.today(), time())
         self.reader = {self.BOTH: self._read_both,
                        self.EXTERNAL: self._read_external,
                        self.CACHE: self._read_cache}
         self._listen = None
+        self.bar_source = None
+        self.window = window
+        self.windows = {}
+        self._fed = set()  # symbols whose windows are appended by bar events
 
     def _read_both(self, symbol, fields, start, end, length):
         cache = self._read_cache(symbol, fields, start, end, length)
@@ -95,6 +108,19 @@ class ActiveStockData(object):
         else:
             return self.external.read(symbol, start=start, end=end, length=length, projection=fields)
 
+    def attach_bars(self, source):
+        """
+        Read recent bars from source in memory before Redis and Mongo.
+
+        Args:
+            source: has history(symbols, frequency, fields, length) which returns None
+                when the bars required aren't all in memory, e.g. TickBarAggregator
+
+        Returns:
+            None
+        """
+        self.bar_source = source
+
     @shaper
     def history(self, symbols, frequency=None, fields=None, start=None, end=None, length=None):
         if not fields:
@@ -102,6 +128,11 @@ class ActiveStockData(object):
         elif isinstance(fields, (str, unicode)):
             fields = [fields]
 
+        if self.bar_source is not None and length and start is None and end is None:
+            data = self.bar_source.history(symbols, frequency, fields, length)
+            if data is not None:
+                return data
+
         if frequency:
             if length:
                 length = self.resampler.expand_length(length, frequency)
@@ -131,9 +162,78 @@ class ActiveStockData(object):
             else:
                 return self._history(symbols, fields, start, end, length)
 
+    def warm(self, symbols, length=None):
+        """
+        Load recent 1min bars of symbols from Redis and Mongo into in-memory windows once,
+        later history(length=N) requests of these symbols are served from the windows without I/O.
+        Windows are appended by bar events, windows not appended by any bar event read bars newer
+        than their latest one from Redis in refresh, once every bar.
+
+        Args:
+            symbols(str | list): symbols
+            length(int): number of bars to load, default to window capacity
+
+        Returns:
+            None
+        """
+        if not self.window:
+            raise ValueError("window capacity is not set")
+        if isinstance(symbols, (str, unicode)):
+            symbols = [symbols]
+        for symbol in symbols:
+            code = coder(symbol)
+            ring = self.windows.get(code, None)
+            if ring is None:
+                ring = self.windows[code] = BarRing(self.window, self.FIELDS)
+            length = length or self.window
+            external = self._read_external(code, self.FIELDS, None, self.today, length)
+            cache = self._read_cache(code, self.FIELDS, self.today, None, None)
+            ring.extend(pd.concat([external, cache]).iloc[-length:])
+
+    def append_bar(self, symbol, time, openPrice, highPrice, lowPrice, closePrice, volume):
+        """
+        Append a newly arrived 1min bar to the window of a warmed symbol.
+
+        Returns:
+            bool: whether the bar is written
+        """
+        code = coder(symbol)
+        ring = self.windows.get(code, None)
+        if ring is None:
+            return False
+        self._fed.add(code)
+        return ring.append(time, (openPrice, highPrice, lowPrice, closePrice, volume))
+
+    def refresh(self):
+        """
+        Read new bars from Redis into the windows not appended by bar events,
+        e.g. bars are written to Redis by another process.
+
+        Returns:
+            None
+        """
+        for code, ring in self.windows.items():
+            if code not in self._fed:
+                self._refresh(code, ring)
+
+    def _refresh(self, symbol, ring):
+        """
+        Append bars in Redis not earlier than the latest bar of the window, the latest bar
+        is replaced in case it was updated.
+        """
+        if not len(ring):
+            return
+        start = pd.Timestamp(ring.last_time).to_pydatetime()
+        ring.extend(self._read_cache(symbol, self.FIELDS, start, None, None))
+
     def _history(self, symbol, fields=None, start=None, end=None, length=None):
-        how, reconsider = self.range(start, end, length)
         symbol = coder(symbol)
+        if length and start is None and end is None:
+            ring = self.windows.get(symbol, None)
+            if ring is not None and ring.covers(fields or self.FIELDS) and len(ring) >= length:
+                return ring.frame(length, fields)
+
+        how, reconsider = self.range(start, end, length)
         data = self.reader[how](symbol, fields, start, end, length)
         if reconsider:
             if len(data) < length:
@@ -202,9 +302,20 @@ class ActiveStockData(object):
 
 
 class ActiveDataSupport(HandlerCompose, ActiveStockData):
+    WINDOW_FREQUENCY = "1min"
+
     def __init__(self, engine, *args, **kwargs):
         super(ActiveDataSupport, self).__init__(engine)
         ActiveStockData.__init__(self, **kwargs)
+        self._handlers["on_bar"] = Handler(self.on_bar, EVENTS.BAR, topic="", priority=200)
+        self._handlers["on_time"] = Handler(self.on_time, EVENTS.TIME, topic="bar.open", priority=200)
+
+    def on_bar(self, event, kwargs=None):
+        if event.topic in ("", self.WINDOW_FREQUENCY):
+            self.append_bar(event.ticker, event.time, event.open, event.high, event.low, event.close, event.volume)
+
+    def on_time(self, event, kwargs=None):
+        self.refresh()
 
 
 def get_fit(codes, data):
@@ -0,0 +1,366 @@
+# encoding: utf-8
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+__all__ = ["BarStore", "Cursor", "make_panel", "BAR_FIELDS"]
+
+BAR_FIELDS = ["open", "high", "low", "close", "volume"]
+
+Panel = getattr(pd, "Panel", None)
+
+
+def make_panel(frames):
+    """
+    Create a 3D result from a dict of DataFrame, pandas.Panel is used when it's available,
+    otherwise (newer pandas) the dict itself is returned.
+
+    Args:
+        frames(dict): items of the panel
+
+    Returns:
+        pandas.Panel | dict
+    """
+    if Panel is not None:
+        return Panel(frames)
+    return frames
+
+
+def to_nanosecond(time):
+    """
+    Convert datetime like object to int64 nanoseconds, which is the unit of BarStore's time axis.
+    """
+    if isinstance(time, (int, np.integer)):
+        return int(time)
+    return pd.Timestamp(time).value
+
+
+def to_times(index):
+    """
+    Convert a datetime index to int64 nanoseconds array.
+    """
+    return np.asarray(index.values, dtype="datetime64[ns]").view(np.int64)
+
+
+class Cursor(object):
+    """
+    Cursor over a sorted int64 time axis, pointing to the last position not later than the
+    time it was seeked to. Seeking forward bar by bar costs O(1), other seeks fall back to
+    a binary search.
+    """
+    __slots__ = ["times", "position", "time"]
+
+    def __init__(self, times):
+        self.times = times
+        self.position = -1
+        self.time = None
+
+    def reset(self):
+        self.position = -1
+        self.time = None
+
+    def seek(self, t):
+        """
+        Args:
+            t(int): time in int64 nanoseconds
+
+        Returns:
+            int: position of the last time not later than t, -1 if t is before the first one
+        """
+        if self.time is not None and t >= self.time:
+            times = self.times
+            n = len(times)
+            position = self.position
+            nxt = position + 1
+            if nxt < n and times[nxt] <= t:
+                if nxt + 1 >= n or times[nxt + 1] > t:
+                    position = nxt
+                else:
+                    position = int(np.searchsorted(times, t, "right")) - 1
+        else:
+            position = int(np.searchsorted(self.times, t, "right")) - 1
+        self.position = position
+        self.time = t
+        return position
+
+
+class BarStore(object):
+    """
+    Columnar bar storage. All the symbols share one int64 time axis (nanoseconds since epoch),
+    and bars of each symbol are stored in a float64 array of shape (fields, times), so that
+    bars of every (symbol, field) are contiguous in memory and can be returned as views.
+
+    Missing bars of a symbol on the shared time axis are filled with NaN.
+
+    BarStore also keeps a cursor pointing to the last bar not later than the time it was
+    seeked to, seeking forward in time (as a backtest does) costs O(1).
+    """
+
+    def __init__(self, fields=None):
+        self._fields = list(fields) if fields else list(BAR_FIELDS)
+        self._field_loc = {field: i for i, field in enumerate(self._fields)}
+        self._times = np.empty(0, dtype=np.int64)
+        self._index = pd.DatetimeIndex([])
+        self._arrays = OrderedDict()
+        self._cursor = Cursor(self._times)
+        self._cursor_key = None
+
+    @classmethod
+    def from_frames(cls, frames, fields=None):
+        """
+        Create a BarStore from a dict of DataFrame indexed by datetime.
+
+        Args:
+            frames(dict): {symbol: DataFrame}
+            fields(list): fields to store, default to fields of the first frame
+
+        Returns:
+            BarStore
+        """
+        if fields is None:
+            fields = BAR_FIELDS
+            for frame in frames.values():
+                fields = [f for f in frame.columns if f != "datetime"]
+                break
+        store = cls(fields)
+        store.extend(frames)
+        return store
+
+    @classmethod
+    def from_panel(cls, panel):
+        """
+        Create a BarStore from a pandas.Panel whose items are symbols, major_axis is datetime
+        and minor_axis are fields.
+        """
+        return cls.from_frames(OrderedDict((item, panel[item]) for item in panel.items), list(panel.minor_axis))
+
+    @property
+    def fields(self):
+        return self._fields
+
+    @property
+    def symbols(self):
+        return list(self._arrays.keys())
+
+    @property
+    def index(self):
+        """
+        pandas.DatetimeIndex: shared time axis
+        """
+        return self._index
+
+    @property
+    def times(self):
+        """
+        numpy.ndarray: shared time axis in int64 nanoseconds
+        """
+        return self._times
+
+    def __len__(self):
+        return len(self._times)
+
+    def __contains__(self, symbol):
+        return symbol in self._arrays
+
+    def array(self, symbol):
+        """
+        Args:
+            symbol(str): symbol
+
+        Returns:
+            numpy.ndarray: float64 array of shape (fields, times)
+
+        Raises:
+            KeyError: symbol not in store
+        """
+        return self._arrays[symbol]
+
+    def _realign(self, index):
+        positions = index.get_indexer(self._index)
+        for symbol, array in self._arrays.items():
+            new = np.empty((len(self._fields), len(index)), dtype=np.float64)
+            new.fill(np.nan)
+            new[:, positions] = array
+            self._arrays[symbol] = new
+        self._index = index
+        self._times = to_times(index)
+        self._cursor = Cursor(self._times)
+        self._cursor_key = None
+
+    def _to_array(self, frame):
+        array = np.empty((len(self._fields), len(self._index)), dtype=np.float64)
+        array.fill(np.nan)
+        positions = self._index.get_indexer(frame.index)
+        for loc, field in enumerate(self._fields):
+            if field in frame.columns:
+                array[loc, positions] = frame[field].values
+        return array
+
+    @staticmethod
+    def _frame_index(frame):
+        if not isinstance(frame.index, pd.DatetimeIndex):
+            if "datetime" in frame.columns:
+                frame = frame.set_index("datetime")
+            else:
+                frame = frame.copy(deep=False)
+            frame.index = pd.DatetimeIndex(frame.index)
+        if not frame.index.is_monotonic_increasing:
+            frame = frame.sort_index()
+        return frame
+
+    def extend(self, frames):
+        """
+        Insert several symbols at once, time axis is realigned only once.
+
+        Args:
+            frames(dict): {symbol: DataFrame}
+
+        Returns:
+            None
+        """
+        frames = OrderedDict((symbol, self._frame_index(frame)) for symbol, frame in frames.items())
+        index = self._index
+        for frame in frames.values():
+            index = index.union(frame.index)
+        if not index.equals(self._index):
+            self._realign(index)
+        for symbol, frame in frames.items():
+            self._arrays[symbol] = self._to_array(frame)
+
+    def insert(self, symbol, frame):
+        """
+        Insert or replace bars of a symbol.
+
+        Args:
+            symbol(str): symbol
+            frame(pandas.DataFrame): bars indexed by datetime
+
+        Returns:
+            None
+        """
+        self.extend({symbol: frame})
+
+    def drop(self, symbol):
+        """
+        Remove bars of a symbol and return them as array.
+        """
+        return self._arrays.pop(symbol)
+
+    def searchsorted(self, time, side="left"):
+        return int(np.searchsorted(self._times, to_nanosecond(time), side))
+
+    def locate(self, time):
+        """
+        Position of the last bar not later than given time, -1 if time is before the first bar.
+        """
+        return int(np.searchsorted(self._times, to_nanosecond(time), "right")) - 1
+
+    def reset_cursor(self):
+        self._cursor.reset()
+        self._cursor_key = None
+
+    @property
+    def cursor(self):
+        return self._cursor.position
+
+    def seek(self, time):
+        """
+        Move the cursor to the last bar not later than given time.
+        It costs O(1) when time moves forward bar by bar, or when the same time object
+        is seeked again, and a binary search otherwise.
+
+        Args:
+            time(datetime): time to seek
+
+        Returns:
+            int: position of the cursor, -1 if time is before the first bar
+        """
+        if time is self._cursor_key and time is not None:
+            return self._cursor.position
+        position = self._cursor.seek(to_nanosecond(time))
+        self._cursor_key = time
+        return position
+
+    def _field_locs(self, fields):
+        if fields is None or (isinstance(fields, slice) and fields == slice(None)):
+            return slice(None), self._fields
+        if isinstance(fields, (list, tuple)):
+            return [self._field_loc[field] for field in fields], list(fields)
+        return self._field_loc[fields], fields
+
+    def values(self, symbol, field, start=None, stop=None):
+        """
+        Contiguous view of bars of a (symbol, field).
+        """
+        return self._arrays[symbol][self._field_loc[field], start:stop]
+
+    def series(self, symbol, field, start=None, stop=None):
+        """
+        pandas.Series of a (symbol, field) backed by a view of the store.
+        """
+        return pd.Series(self.values(symbol, field, start, stop), index=self._index[start:stop],
+                         name=field, copy=False)
+
+    def frame(self, symbol, fields=None, start=None, stop=None):
+        """
+        Bars of a symbol, a Series if fields is a str, else a DataFrame.
+        When all fields are required the DataFrame is backed by a view of the store.
+        """
+        locs, names = self._field_locs(fields)
+        array = self._arrays[symbol]
+        if isinstance(names, list):
+            return pd.DataFrame(array[locs, start:stop].T, index=self._index[start:stop],
+                                columns=names, copy=False)
+        return pd.Series(array[locs, start:stop], index=self._index[start:stop], name=names, copy=False)
+
+    def bar(self, symbol, position, fields=None):
+        """
+        A single bar of a symbol, a Series named by its datetime or a scalar if fields is a str.
+        """
+        locs, names = self._field_locs(fields)
+        array = self._arrays[symbol]
+        if isinstance(names, list):
+            return pd.Series(array[locs, position], index=names, name=self._index[position])
+        return array[locs, position]
+
+    def cross(self, symbols, position, fields=None):
+        """
+        A single bar of several symbols, a DataFrame indexed by symbols or a Series if fields is a str.
+        """
+        locs, names = self._field_locs(fields)
+        arrays = self._arrays
+        if isinstance(names, list):
+            return pd.DataFrame([arrays[symbol][locs, position] for symbol in symbols],
+                                index=list(symbols), columns=names)
+        return pd.Series([arrays[symbol][locs, position] for symbol in symbols], index=list(symbols),
+                         name=names)
+
+    def panel(self, symbols, fields=None, start=None, stop=None, by="symbol"):
+        """
+        Bars of several symbols.
+
+        Args:
+            symbols(list): symbols
+            fields(str | list): a DataFrame (time x symbols) is returned if it's a str
+            start(int): start position
+            stop(int): stop position
+            by(str): "symbol" means result's items are symbols, "field" means items are fields
+
+        Returns:
+            pandas.DataFrame | pandas.Panel
+        """
+        locs, names = self._field_locs(fields)
+        index = self._index[start:stop]
+        if not isinstance(names, list):
+            return pd.DataFrame(OrderedDict(
+                (symbol, self._arrays[symbol][locs, start:stop]) for symbol in symbols
+            ), index=index, columns=list(symbols))
+        if by == "field":
+            return make_panel(OrderedDict(
+                (field, self.panel(symbols, field, start, stop)) for field in names
+            ))
+        return make_panel(OrderedDict(
+            (symbol, self.frame(symbol, names, start, stop)) for symbol in symbols
+        ))
+
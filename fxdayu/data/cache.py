@@ -3,8 +3,10 @@
 import time
 from bisect import bisect
 from functools import wraps
-from collections import deque
+from collections import deque, OrderedDict
 from datetime import datetime
+from inspect import getcallargs
+from threading import RLock
 
 from fxdayu.settings import CACHE_BACKEND, DATABASE
 from vedis import Vedis
@@ -53,12 +55,232 @@ class MemoryCacheProxy(object):
         dct = self._cache[ticker]
         df = self._db.get_ticker_bar_data(ticker, timeframe, last, now, self._max_len)
         for field in _BAR_FIELDS:
-            dct[field].appendright(df[field])
+            dct[field].extend(df[field])
         self._cache[ticker]["last"] = now
         return get_ticker_bar_data_from_df(pd.DataFrame(dct, columns=_BAR_FIELDS),
                                            timeframe, None, backtrack)
 
 
+class _CacheEntry(object):
+    __slots__ = ["frame", "ranges", "columns", "nbytes"]
+
+    def __init__(self, frame, ranges, columns):
+        self.frame = frame
+        self.ranges = ranges
+        self.columns = columns
+        self.nbytes = int(frame.memory_usage(index=True, deep=False).sum())
+
+
+class BarCache(object):
+    """
+    LRU bar cache. Each entry is keyed by (symbol, frequency, ...) and holds bars of the
+    time ranges already read from database, overlapping ranges are coalesced so that a
+    request inside any cached range is served without querying database.
+
+    Entries are evicted in least recently used order when total size exceeds max_bytes.
+
+    Usage::
+
+        cache = BarCache(max_bytes=256 * 1024 * 1024)
+
+        @cache.cached(key=("symbol", "frequency"))
+        def read(symbol, frequency, fields=None, start=None, end=None, length=None):
+            ...
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        """
+
+        Args:
+            max_bytes(int): max size in bytes of cached bars
+        """
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = RLock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        """
+        Returns:
+            dict: hits, misses, evictions, entries and bytes of the cache
+        """
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "entries": len(self._entries), "bytes": self.nbytes}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    @staticmethod
+    def _columns(fields, index):
+        if fields is None:
+            return None
+        if isinstance(fields, str):
+            fields = [fields]
+        return [field for field in fields if field != index]
+
+    @staticmethod
+    def _find_range(ranges, time):
+        for low, high in ranges:
+            if (low is None or low <= time) and time <= high:
+                return low, high
+        return None
+
+    def _lookup(self, entry, columns, start, end, length):
+        if columns is None:
+            if entry.columns is not None:
+                return None
+        elif not set(columns).issubset(entry.frame.columns):
+            return None
+
+        frame = entry.frame
+        if start is not None and end is not None:
+            found = self._find_range(entry.ranges, start)
+            if found is None or found[1] < end:
+                return None
+            result = frame.loc[start:end]
+        elif start is not None and length:
+            found = self._find_range(entry.ranges, start)
+            if found is None:
+                return None
+            result = frame.loc[start:found[1]]
+            if len(result) < length:
+                return None
+            result = result.iloc[:length]
+        elif end is not None:
+            found = self._find_range(entry.ranges, end)
+            if found is None:
+                return None
+            result = frame.loc[found[0]:end]
+            if length:
+                if len(result) < length and found[0] is not None:
+                    return None
+                result = result.iloc[-length:]
+            elif found[0] is not None:
+                return None
+        else:
+            return None
+
+        return result if columns is None else result[columns]
+
+    @staticmethod
+    def _covered(frame, start, end, length):
+        if start is not None and end is not None:
+            return start, end
+        elif start is not None and length:
+            return start, frame.index[-1]
+        elif end is not None:
+            if length and len(frame) >= length:
+                return frame.index[0], end
+            return None, end
+        return None
+
+    @staticmethod
+    def _coalesce(ranges):
+        result = []
+        for low, high in sorted(ranges, key=lambda r: (r[0] is not None, r[0])):
+            if result and (low is None or low <= result[-1][1]):
+                if high > result[-1][1]:
+                    result[-1] = (result[-1][0], high)
+            else:
+                result.append((low, high))
+        return result
+
+    def get(self, key, fields=None, start=None, end=None, length=None, index="datetime"):
+        """
+        Returns:
+            pandas.DataFrame: cached bars, None if not cached
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            result = None
+            if entry is not None:
+                result = self._lookup(entry, self._columns(fields, index), start, end, length)
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries[key] = self._entries.pop(key)
+            return result
+
+    def put(self, key, frame, fields=None, start=None, end=None, length=None, index="datetime"):
+        """
+        Merge bars read from database into cache.
+        """
+        if not isinstance(frame, pd.DataFrame) or not len(frame) \
+                or not isinstance(frame.index, pd.DatetimeIndex):
+            return
+        covered = self._covered(frame, start, end, length)
+        if covered is None:
+            return
+        columns = self._columns(fields, index)
+
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.nbytes -= entry.nbytes
+                if entry.columns == columns or (entry.columns is not None and columns is not None and
+                                                set(entry.columns) == set(columns)):
+                    frame = pd.concat([entry.frame, frame[list(entry.frame.columns)]])
+                    frame = frame[~frame.index.duplicated(keep="last")].sort_index()
+                    ranges = self._coalesce(entry.ranges + [covered])
+                else:
+                    ranges = [covered]
+            else:
+                ranges = [covered]
+            if not frame.index.is_monotonic_increasing:
+                frame = frame.sort_index()
+
+            entry = _CacheEntry(frame, ranges, columns)
+            if entry.nbytes > self.max_bytes:
+                return
+            self._entries[key] = entry
+            self.nbytes += entry.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+                self.evictions += 1
+
+    def cached(self, key=("symbol", "frequency"), fields="fields", start="start", end="end", length="length",
+               index="datetime"):
+        """
+        Decorator of a database read function which returns bars in a DataFrame indexed by datetime.
+
+        Args:
+            key(tuple): names of arguments which identify a series of bars
+            fields(str): name of the fields argument
+            start(str): name of the start argument
+            end(str): name of the end argument
+            length(str): name of the length argument
+            index(str): name of the datetime field, which is excluded from columns
+
+        Returns:
+            function: decorator
+        """
+
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                call = getcallargs(func, *args, **kwargs)
+                k = tuple(call.get(name) for name in key)
+                f, s, e, l = call.get(fields), call.get(start), call.get(end), call.get(length)
+                result = self.get(k, f, s, e, l, index)
+                if result is not None:
+                    return result
+                result = func(*args, **kwargs)
+                self.put(k, result, f, s, e, l, index)
+                return result
+
+            wrapper.cache = self
+            return wrapper
+
+        return decorator
+
+
 class RedisCacheProxy(object):
     def __init__(self, backend="Vedis"):
         self._backend = backend
@@ -1,6 +1,10 @@
+from fxdayu.data.bar_store import Cursor, to_nanosecond, to_times
+from fxdayu.data.cache import BarCache
+from fxdayu.data.resampler import STOCK_GROUPER, aggregate
 from fxdayu.data.handler import MongoHandler
 from fxdayu.engine.handler import HandlerCompose
-from datetime import datetime, timedelta
+from datetime import datetime
+import numpy as np
 import pandas as pd
 from collections import Iterable, defaultdict
 
@@ -27,30 +31,6 @@ def mapper(fields):
         return RESAMPLE_MAP
 
 
-class TimeEdge():
-    def __init__(self, edge):
-        self.edge = edge
-        self.start = None
-        self.end = None
-
-    def range(self, end):
-        self.end = end
-        self.start = self.edge(end)
-        return end
-
-    def __call__(self, x):
-        self.range(x[-1])
-        return pd.DatetimeIndex(
-            reversed(map(self.scheduler, reversed(x)))
-        )
-
-    def scheduler(self, t):
-        if t < self.end and (t > self.start):
-            return self.end
-        else:
-            return self.range(t)
-
-
 class MarketData(object):
 
     def __init__(self, client=None, host='localhost', port=27017, users=None, db=None, **kwargs):
@@ -246,22 +226,28 @@ class MarketData(object):
 
 class MarketDataFreq(object):
 
-    def __init__(self, client=None, host='localhost', port=27017, users=None, db=None, **kwargs):
+    def __init__(self, client=None, host='localhost', port=27017, users=None, db=None, bar_cache=None, **kwargs):
         self.client = client if client else MongoHandler(host, port, users, db, **kwargs)
+        if bar_cache is not None:
+            self.bar_cache = bar_cache if isinstance(bar_cache, BarCache) else BarCache(bar_cache)
+            self._read_db = self.bar_cache.cached(key=("symbol", "db"))(self._read_db)
+        else:
+            self.bar_cache = None
         self.read = self.client.read
         self.write = self.client.write
         self.inplace = self.client.inplace
         self.initialized = False
         self.frequency = None
         self._panels = {}
+        self._cursors = {}
+        self._now = None
+        self._now_ns = None
         self.name_map = {}
         self._db = self.client.db
         self.sample_factor = {'min': 1, 'H': 60, 'D': 240, 'W': 240*5, 'M': 240*5*31}
-        self.grouper = {
-            'W': TimeEdge(lambda x: x.replace(hour=0, minute=0)-timedelta(days=x.weekday())),
-            'H': TimeEdge(lambda x: x.replace(minute=30, hour=x.hour if x.minute > 30 else x.hour-1) if x.hour < 12
-                          else x.replace(minute=0, hour=x.hour if x.minute != 0 else x.hour-1))
-        }
+        self.grouper = dict(STOCK_GROUPER)
+        self._resampled = {}
+        self._all_time = None
         self.fields = list(RESAMPLE_MAP.keys())
 
     @property
@@ -275,7 +261,11 @@ class MarketDataFreq(object):
             result = self._read_db(_symbol, ['open', 'high', 'low', 'close', 'volume'], start, end, None, _db)
             if len(result):
                 self._panels[_symbol] = result
+                self._cursors[_symbol] = Cursor(to_times(result.index))
                 self._db[_symbol] = _db
+                for key in [k for k in self._resampled if k[0] == _symbol]:
+                    del self._resampled[key]
+                self._all_time = None
 
         if isinstance(symbols, str):
             initialize(symbols, db)
@@ -361,8 +351,37 @@ class MarketDataFreq(object):
         else:
             return len(axis) - 1
 
-    def major_slice(self, axis, now, start, end, length):
-        last = self.search_axis(axis, now)
+    def reset(self):
+        """
+        Rewind cursors of loaded symbols for the next backtest, bars are kept.
+        """
+        for cursor in self._cursors.values():
+            cursor.reset()
+        self._now = None
+        self._now_ns = None
+
+    def on_context_time(self, time):
+        """
+        Called when context time moves, current time is converted only once per bar
+        and cursors of symbols are advanced from here when they are looked up.
+        """
+        self._now = time
+        self._now_ns = to_nanosecond(time)
+
+    def _position(self, symbol, axis, now):
+        """
+        Position of the last bar of symbol not later than now, using the symbol's cursor.
+        """
+        cursor = self._cursors.get(symbol, None)
+        if cursor is None:
+            return self.search_axis(axis, now)
+        if now is self._now:
+            return cursor.seek(self._now_ns)
+        return cursor.seek(to_nanosecond(now))
+
+    def major_slice(self, axis, now, start, end, length, last=None):
+        if last is None:
+            last = self.search_axis(axis, now)
 
         if end:
             end = self.search_axis(axis, end)
@@ -395,7 +414,9 @@ class MarketDataFreq(object):
     def _find_candle(self, symbol, fields, start, end, length):
         try:
             frame = self._panels[symbol]
-            time_slice = self.major_slice(frame.index, self.time, start, end, length)
+            now = self.time
+            time_slice = self.major_slice(frame.index, now, start, end, length,
+                                          self._position(symbol, frame.index, now))
             return frame.iloc[time_slice][fields]
         except KeyError:
             if not end or end > self.time:
@@ -412,11 +433,59 @@ class MarketDataFreq(object):
                 return result.iloc[0] if len(result) else result
 
     def resample(self, symbol, frequency, fields, start, end, length, n, w, grouper, agg):
+        if symbol in self._panels and (not end or end >= self.time):
+            frame = self._resampled_bars(symbol, frequency, grouper)[fields]
+            if start:
+                frame = frame.iloc[frame.index.searchsorted(pd.to_datetime(start)):]
+                if length:
+                    frame = frame.iloc[:length]
+            elif length:
+                if len(frame) < length:
+                    raise KeyError("data required out of range")
+                frame = frame.iloc[-length:]
+            return frame.iloc[-1] if length == 1 else frame
+
         frame = self._find_candle(symbol, fields, start, end, length*n*self.sample_factor[w] if length else None)
+        if isinstance(frame, pd.Series):
+            return self._aggregate(frame.to_frame(fields), frequency, grouper)[0][fields]
+        return self._aggregate(frame, frequency, grouper)[0]
+
+    @staticmethod
+    def _aggregate(frame, frequency, grouper):
+        """
+        Resample bars with vectorized bucket assignment.
+
+        Returns:
+            tuple: (resampled DataFrame, position of the first bar of the last bucket)
+        """
+        if not isinstance(frame, pd.DataFrame) or not len(frame):
+            return frame, 0
         if grouper is not None:
-            return frame.groupby(grouper).agg(agg)
-        else:
-            return frame.resample(frequency, label='right', closed='right').agg(agg).dropna()
+            return aggregate(frame, grouper.keys(to_times(frame.index)), "last")
+        counts = pd.Series(1, index=frame.index).resample(frequency, label='right', closed='right').count()
+        keys = np.repeat(to_times(counts.index), counts.values)
+        return aggregate(frame, keys, "key")
+
+    def _resampled_bars(self, symbol, frequency, grouper):
+        """
+        Resampled bars of a symbol until now, cached per (symbol, frequency).
+        When time moves forward only the last bucket and the new base bars are aggregated again.
+        """
+        base = self._panels[symbol]
+        now = self.time
+        upto = self._position(symbol, base.index, now) + 1
+        key = (symbol, frequency)
+        cache = self._resampled.get(key, None)
+        if cache is None or cache[2] > upto:
+            frame, tail = self._aggregate(base.iloc[:upto], frequency, grouper)
+            cache = [frame, tail, upto]
+            self._resampled[key] = cache
+        elif cache[2] < upto:
+            frame, tail = self._aggregate(base.iloc[cache[1]:upto], frequency, grouper)
+            cache[0] = pd.concat([cache[0].iloc[:-1], frame]) if len(cache[0]) else frame
+            cache[1] += tail
+            cache[2] = upto
+        return cache[0]
 
     @staticmethod
     def f_period(frequency):
@@ -432,16 +501,20 @@ class MarketDataFreq(object):
 
     @property
     def all_time(self):
-        all_ = []
-        for item in self._panels.items():
-            all_.extend(filter(lambda x: x not in all_, item[1].index))
-
-        return sorted(all_)
+        if self._all_time is None:
+            all_ = []
+            for item in self._panels.items():
+                all_.extend(filter(lambda x: x not in all_, item[1].index))
+            self._all_time = sorted(all_)
+        return self._all_time
 
     def can_trade(self, symbol=None):
         if symbol:
             try:
-                return self.time in self._panels[symbol].index
+                frame = self._panels[symbol]
+                now = self.time
+                position = self._position(symbol, frame.index, now)
+                return position >= 0 and frame.index[position] == now
             except KeyError:
                 try:
                     data = self.client.read('.'.join((symbol, self.frequency)), self._db[symbol], end=self.time, length=1)
@@ -461,10 +534,12 @@ class MarketDataFreq(object):
 
 class DataSupport(HandlerCompose, MarketDataFreq):
 
-    def __init__(self, engine, context, client=None, host='localhost', port=27017, users=None, db=None, **kwargs):
+    def __init__(self, engine, context, client=None, host='localhost', port=27017, users=None, db=None,
+                 bar_cache=None, **kwargs):
         super(DataSupport, self).__init__(engine)
-        MarketDataFreq.__init__(self, client, host, port, users, db, **kwargs)
+        MarketDataFreq.__init__(self, client, host, port, users, db, bar_cache, **kwargs)
         self.context = context
+        context.add_time_listener(self.on_context_time)
 
     @property
     def time(self):
@@ -0,0 +1,343 @@
+# encoding: utf-8
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+    import msvcrt
+
+from fxdayu.data.bar_store import BAR_FIELDS, to_nanosecond, to_times
+
+__all__ = ["DiskBarCache"]
+
+_MIN_NS = np.iinfo(np.int64).min
+_MAX_NS = np.iinfo(np.int64).max
+_STEP = 1000  # datetime is accurate to microsecond
+
+
+def _replace(src, dst):
+    try:
+        os.replace(src, dst)
+    except AttributeError:  # python2
+        if os.path.exists(dst):
+            os.remove(dst)
+        os.rename(src, dst)
+
+
+def _lock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    while True:
+        f.seek(0)
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)  # gives up after 10 seconds
+            return
+        except (IOError, OSError):
+            continue
+
+
+def _unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _to_datetime(ns):
+    if ns in (_MIN_NS, _MAX_NS):
+        return None
+    return pd.Timestamp(ns).to_pydatetime()
+
+
+class DiskBarCache(object):
+    """
+    Local on-disk cache of bars, one directory per (db, collection) which holds a column file
+    (.npy) for datetime and every field, plus a manifest recording which time ranges have
+    already been fetched from database.
+
+    Column files are opened with mmap, so only the bars required are read from disk.
+    Reading a range fetches only the missing parts from database and append-merges them
+    into the cache.
+
+    Layout::
+
+        root/
+            db/
+                collection/
+                    manifest.json  {"fields": [...], "ranges": [[start_ns, end_ns], ...]}
+                    .lock          serializes readers and writers of the collection
+                    datetime.npy   int64 nanoseconds
+                    open.npy       float64
+                    ...
+    """
+
+    MANIFEST = "manifest.json"
+    LOCK = ".lock"
+    INDEX = "datetime"
+
+    def __init__(self, root, fields=None):
+        """
+        Args:
+            root(str): root directory of the cache
+            fields(list): fields to cache, default to ["open", "high", "low", "close", "volume"]
+        """
+        self.root = root
+        self.fields = list(fields) if fields else list(BAR_FIELDS)
+
+    def _path(self, db, collection, name=None):
+        path = os.path.join(self.root, str(db) if db else "default", collection)
+        if name is None:
+            return path
+        return os.path.join(path, name)
+
+    def _column(self, db, collection, name):
+        return self._path(db, collection, name + ".npy")
+
+    @contextmanager
+    def lock(self, db, collection):
+        """
+        Exclusive lock of a cached collection across threads and processes, e.g. optimizer
+        workers reading the same collection, held while missing ranges are fetched and merged
+        so that every range is fetched once and column files are never written concurrently.
+        """
+        path = self._path(db, collection)
+        if not os.path.exists(path):
+            try:
+                os.makedirs(path)
+            except OSError:  # created by another process
+                if not os.path.isdir(path):
+                    raise
+        # every call opens its own file, so threads of one process exclude each other as well
+        with open(os.path.join(path, self.LOCK), "a+") as f:
+            _lock_file(f)
+            try:
+                yield
+            finally:
+                _unlock_file(f)
+
+    def manifest(self, db, collection):
+        """
+        Returns:
+            dict: manifest of the cached collection, None if not cached
+        """
+        path = self._path(db, collection, self.MANIFEST)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def load(self, db, collection):
+        """
+        Open cached columns with mmap.
+
+        Returns:
+            tuple: (datetime array, {field: array}), (None, None) if not cached
+        """
+        manifest = self.manifest(db, collection)
+        if manifest is None or not os.path.exists(self._column(db, collection, self.INDEX)):
+            return None, None
+        times = np.load(self._column(db, collection, self.INDEX), mmap_mode="r")
+        columns = {field: np.load(self._column(db, collection, field), mmap_mode="r")
+                   for field in manifest["fields"]}
+        return times, columns
+
+    @staticmethod
+    def _bounds(start, end):
+        s = _MIN_NS if start is None else to_nanosecond(start)
+        e = to_nanosecond(datetime.now() if end is None else end)
+        return s, e
+
+    @staticmethod
+    def missing(ranges, start, end):
+        """
+        Parts of [start, end] not covered by ranges.
+
+        Args:
+            ranges(list): sorted and merged [[start_ns, end_ns], ...]
+            start(int): start in nanoseconds
+            end(int): end in nanoseconds
+
+        Returns:
+            list: [(start_ns, end_ns), ...]
+        """
+        gaps = []
+        cursor = start
+        for s, e in ranges:
+            if e < cursor:
+                continue
+            if s > end:
+                break
+            if s > cursor:
+                gaps.append((cursor, s - _STEP))
+            cursor = max(cursor, e + _STEP)
+            if cursor > end:
+                break
+        if cursor <= end:
+            gaps.append((cursor, end))
+        return gaps
+
+    @staticmethod
+    def _merge_ranges(ranges):
+        result = []
+        for s, e in sorted(ranges):
+            if result and s <= result[-1][1] + _STEP:
+                result[-1][1] = max(result[-1][1], e)
+            else:
+                result.append([s, e])
+        return result
+
+    def read(self, db, collection, start=None, end=None, fetch=None):
+        """
+        Read bars in [start, end] from cache, missing ranges are fetched first.
+
+        Args:
+            db(str): database name
+            collection(str): collection name
+            start(datetime): None means from the earliest
+            end(datetime): None means now
+            fetch(function): fetch(start, end) -> DataFrame indexed by datetime, used to
+                read missing ranges from database, start or end is None when unbounded
+
+        Returns:
+            pandas.DataFrame: bars indexed by datetime
+        """
+        s, e = self._bounds(start, end)
+        with self.lock(db, collection):
+            manifest = self.manifest(db, collection)
+            ranges = manifest["ranges"] if manifest else []
+            gaps = self.missing(ranges, s, e)
+            if gaps and fetch is not None:
+                frames = [fetch(_to_datetime(gs), _to_datetime(ge)) for gs, ge in gaps]
+                covered = self.covered(gaps, frames, e)
+                if covered or any(frame is not None and len(frame) for frame in frames):
+                    self.merge(db, collection, frames, covered)
+            return self._slice(db, collection, s, e)
+
+    @staticmethod
+    def covered(gaps, frames, end):
+        """
+        Ranges known to be complete after fetching gaps. Bars after now or after the last fetched
+        bar of a gap open to the requested end may still be written to database, so the range
+        recorded for such a gap stops at the last fetched bar.
+
+        Args:
+            gaps(list): [(start_ns, end_ns), ...] fetched
+            frames(list): DataFrame fetched for each gap
+            end(int): requested end in nanoseconds
+
+        Returns:
+            list: [(start_ns, end_ns), ...]
+        """
+        now = to_nanosecond(datetime.now())
+        ranges = []
+        for (gs, ge), frame in zip(gaps, frames):
+            ge = min(ge, now)
+            if ge >= min(end, now):  # open to the requested end
+                if frame is None or not len(frame):
+                    continue
+                ge = min(ge, int(to_times(pd.DatetimeIndex(frame.index)).max()))
+            if ge >= gs:
+                ranges.append((gs, ge))
+        return ranges
+
+    def _slice(self, db, collection, start, end):
+        times, columns = self.load(db, collection)
+        if times is None:
+            return pd.DataFrame(columns=self.fields)
+        i = int(np.searchsorted(times, start, "left"))
+        j = int(np.searchsorted(times, end, "right"))
+        index = pd.DatetimeIndex(np.array(times[i:j]).view("datetime64[ns]"), name=self.INDEX)
+        return pd.DataFrame(
+            {field: np.array(columns[field][i:j]) for field in self.fields if field in columns},
+            index=index, columns=self.fields
+        )
+
+    def merge(self, db, collection, frames, ranges):
+        """
+        Append-merge fetched frames into cache, bars of fetched frames replace cached bars
+        of the same datetime. Callers should hold lock(db, collection).
+
+        Args:
+            db(str): database name
+            collection(str): collection name
+            frames(list): DataFrame indexed by datetime
+            ranges(list): time ranges in nanoseconds covered by the frames
+
+        Returns:
+            None
+        """
+        times, columns = self.load(db, collection)
+        manifest = self.manifest(db, collection)
+        all_times = [np.asarray(times)] if times is not None else []
+        all_values = {field: ([np.asarray(columns[field])] if times is not None else []) for field in self.fields}
+        for frame in frames:
+            if frame is None or not len(frame):
+                continue
+            all_times.append(to_times(pd.DatetimeIndex(frame.index)))
+            for field in self.fields:
+                if field in frame.columns:
+                    all_values[field].append(frame[field].values.astype(np.float64))
+                else:
+                    all_values[field].append(np.full(len(frame), np.nan))
+
+        if all_times:
+            merged = np.concatenate(all_times)
+            order = np.argsort(merged, kind="mergesort")
+            merged = merged[order]
+            keep = np.append(merged[1:] != merged[:-1], True)  # keep the latest fetched
+            merged = merged[keep]
+        else:
+            merged = np.empty(0, dtype=np.int64)
+            order = keep = None
+
+        path = self._path(db, collection)
+        if not os.path.exists(path):
+            os.makedirs(path)
+        self._save(db, collection, self.INDEX, merged)
+        for field in self.fields:
+            if order is None:
+                values = np.empty(0, dtype=np.float64)
+            else:
+                values = np.concatenate(all_values[field])[order][keep]
+            self._save(db, collection, field, values)
+
+        old_ranges = manifest["ranges"] if manifest else []
+        manifest = {
+            "fields": self.fields,
+            "ranges": self._merge_ranges([list(r) for r in old_ranges] + [[int(s), int(e)] for s, e in ranges]),
+        }
+        fd, tmp = tempfile.mkstemp(".tmp", self.MANIFEST, self._path(db, collection))
+        with os.fdopen(fd, "w") as f:
+            json.dump(manifest, f)
+        _replace(tmp, self._path(db, collection, self.MANIFEST))
+
+    def _save(self, db, collection, name, array):
+        fd, tmp = tempfile.mkstemp(".tmp.npy", name, self._path(db, collection))
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, np.ascontiguousarray(array))
+        _replace(tmp, self._column(db, collection, name))
+
+    def clear(self, db=None, collection=None):
+        """
+        Remove cached bars of a collection, a db or all.
+        """
+        import shutil
+
+        if db is None:
+            path = self.root
+        elif collection is None:
+            path = os.path.join(self.root, str(db))
+        else:
+            path = self._path(db, collection)
+        if os.path.exists(path):
+            shutil.rmtree(path)
@@ -1,8 +1,19 @@
 # encoding:utf-8
+from collections import OrderedDict
+from functools import partial
+from itertools import islice
+from multiprocessing.pool import ThreadPool
+from time import time
+import logging
+
 from pymongo.mongo_client import database
+from pymongo import InsertOne, ReplaceOne, UpdateOne
+import numpy as np
 import pandas as pd
 import pymongo
 
+from fxdayu.data.bar_store import make_panel
+
 
 class DataHandler(object):
 
@@ -27,6 +38,9 @@ class DataHandler(object):
 
 class MongoHandler(DataHandler):
 
+    BATCH_SIZE = 10000
+    CHUNK_SIZE = 5000
+
     def __init__(self, host='localhost', port=27017, users=None, db=None, **kwargs):
         self.client = pymongo.MongoClient(host, port, **kwargs)
         self.db = self.client[db] if db else None
@@ -46,31 +60,62 @@ class MongoHandler(DataHandler):
             else:
                 return self.client[db][collection]
 
-    def write(self, data, collection, db=None, index=None):
+    def write(self, data, collection, db=None, index=None, chunk_size=CHUNK_SIZE, report=False):
         """
 
         :param data(DataFrame|list(dict)): 要存的数据
         :param collection(str): 表名
         :param db(str): 数据库名
         :param index(str): 以index值建索引, None不建索引
+        :param chunk_size(int): 每批写入的文档数
+        :param report(bool|function): 写入进度报告, True输出到日志, 或传入function(name, done, total, seconds)
         :return:
         """
         collection = self._locate(collection, db)
         data = self.normalize(data, index)
-        collection.insert_many(data)
+        self._bulk_write(collection, [InsertOne(doc) for doc in data], chunk_size, report)
         if index:
             collection.create_index(index)
         return {'collection': collection.name, 'start': data[0], 'end': data[-1]}
 
-    def read(self, collection, db=None, index='datetime', start=None, end=None, length=None, **kwargs):
+    @staticmethod
+    def _report(name, done, total, seconds):
+        logging.info(
+            "%s: %d/%d documents written, %.0f docs/s" % (name, done, total, done / seconds if seconds else done)
+        )
+
+    def _bulk_write(self, collection, requests, chunk_size=CHUNK_SIZE, report=False):
         """
+        分批以unordered方式执行bulk_write
 
-        :param collection(str): 表名
+        :return: int, 执行的请求数
+        """
+        if report is True:
+            report = self._report
+        total = len(requests)
+        begin = time()
+        done = 0
+        for i in range(0, total, chunk_size):
+            chunk = requests[i:i + chunk_size]
+            collection.bulk_write(chunk, ordered=False)
+            done += len(chunk)
+            if report:
+                report(collection.name, done, total, time() - begin)
+        return done
+
+    def read(self, collection, db=None, index='datetime', start=None, end=None, length=None,
+             bulk=False, partitions=1, workers=4, **kwargs):
+        """
+
+        :param collection(str|list): 表名, 传入多个表名时并发读取并返回Panel
         :param db(str): 数据库名
         :param index(str): 读取索引方式
         :param start(datetime):
         :param end(datetime):
         :param length(int):
+        :param bulk(bool): 按列批量读取, 不经过逐行的dict构建DataFrame
+        :param partitions(int): bulk模式下按index范围切分成多段并行读取, 仅在不限制length时有效
+        :param workers(int): 并发读取的线程数
         :param kwargs:
         :return:
         """
@@ -93,26 +138,44 @@ class MongoHandler(DataHandler):
 
         db = self.db if db is None else self.client[db]
 
-        if isinstance(collection, str):
-            return self._read(db[collection], index, **kwargs)
+        if bulk:
+            reader = partial(self._read_bulk, index=index, partitions=partitions, workers=workers, **kwargs)
+        else:
+            reader = partial(self._read, index=index, **kwargs)
+
         if isinstance(collection, database.Collection):
-            return self._read(collection, index, **kwargs)
+            return reader(collection)
         elif isinstance(collection, (list, tuple)):
-            panel = {}
-            for col in collection:
-                try:
-                    if isinstance(col, database.Collection):
-                        panel[col.name] = self._read(col, index, **kwargs)
-                    else:
-                        panel[col] = self._read(db[col], index, **kwargs)
-                except KeyError as ke:
-                    if index in str(ke):
-                        pass
-                    else:
-                        raise ke
-            return pd.Panel.from_dict(panel)
+            return make_panel(self._read_many(collection, db, reader, index, workers))
         else:
-            return self._read(db[collection], index, **kwargs)
+            return reader(db[collection])
+
+    @staticmethod
+    def _map(function, iterable, workers):
+        iterable = list(iterable)
+        if workers <= 1 or len(iterable) <= 1:
+            return list(map(function, iterable))
+        pool = ThreadPool(min(workers, len(iterable)))
+        try:
+            return pool.map(function, iterable)
+        finally:
+            pool.close()
+
+    def _read_many(self, collections, db, reader, index, workers=4):
+        def read_one(col):
+            if not isinstance(col, database.Collection):
+                col = db[col]
+            try:
+                return col.name, reader(col)
+            except KeyError as ke:
+                if index in str(ke):
+                    return col.name, None
+                else:
+                    raise ke
+
+        return OrderedDict(
+            (name, frame) for name, frame in self._map(read_one, collections, workers) if frame is not None
+        )
 
     @staticmethod
     def _read(collection, index=None, **kwargs):
@@ -131,36 +194,169 @@ class MongoHandler(DataHandler):
 
         return data
 
-    def inplace(self, data, collection, db=None, index='datetime'):
+    @staticmethod
+    def _fields(collection, projection=None, filter=None):
+        if isinstance(projection, dict):
+            included = [key for key, value in projection.items() if value and key != '_id']
+            if included:
+                return included
+            excluded = {key for key, value in projection.items() if not value}
+        elif projection:
+            return [key for key in projection if key != '_id']
+        else:
+            excluded = set()
+
+        doc = collection.find_one(filter)
+        if doc is None:
+            return []
+        return [key for key in doc if key != '_id' and key not in excluded]
+
+    def _read_columns(self, collection, fields, filter=None, sort=None, limit=0, batch_size=BATCH_SIZE,
+                      reverse=False, **kwargs):
+        """
+        按批次取出文档, 每批直接整理成各字段的numpy数组
+
+        :param reverse: 是否把结果倒序, 用于把降序读取的结果恢复为升序
+        :return: dict(field: numpy.ndarray)
+        """
+        cursor = collection.find(
+            filter, dict([(field, True) for field in fields], _id=False),
+            sort=sort, limit=limit or 0, batch_size=batch_size, **kwargs
+        )
+        chunks = OrderedDict((field, []) for field in fields)
+        while True:
+            docs = list(islice(cursor, batch_size))
+            if not docs:
+                break
+            for field, chunk in chunks.items():
+                try:
+                    chunk.append(np.array([doc[field] for doc in docs]))
+                except KeyError:
+                    chunk.append(np.array([doc.get(field, np.nan) for doc in docs]))
+
+        columns = OrderedDict()
+        for field, chunk in chunks.items():
+            if not chunk:
+                return OrderedDict()
+            column = np.concatenate(chunk) if len(chunk) > 1 else chunk[0]
+            columns[field] = column[::-1] if reverse else column
+        return columns
+
+    def _partition(self, collection, index, filter, partitions):
+        condition = (filter or {}).get(index, {})
+        low, high = condition.get('$gte'), condition.get('$lte')
+        if low is None:
+            doc = collection.find_one(filter, {index: True}, sort=[(index, 1)])
+            low = doc[index] if doc else None
+        if high is None:
+            doc = collection.find_one(filter, {index: True}, sort=[(index, -1)])
+            high = doc[index] if doc else None
+        if low is None or high is None or not low < high:
+            return []
+
+        step = (high - low) // partitions
+        edges = [low + step * i for i in range(partitions)] + [high]
+        filters = []
+        for i in range(partitions):
+            f = dict(filter or {})
+            if i == partitions - 1:
+                f[index] = {'$gte': edges[i], '$lte': edges[i + 1]}
+            else:
+                f[index] = {'$gte': edges[i], '$lt': edges[i + 1]}
+            filters.append(f)
+        return filters
+
+    def _read_bulk(self, collection, index=None, partitions=1, workers=4, filter=None, projection=None,
+                   sort=None, limit=0, batch_size=BATCH_SIZE, **kwargs):
+        """
+        按列批量读取, 文档按批次取出后直接整理成各字段的numpy数组, 长历史可按index范围切分并行读取
+
+        :return: DataFrame
+        """
+        fields = self._fields(collection, projection, filter)
+        if index and fields and index not in fields:
+            fields.append(index)
+
+        # 只按第一个排序键的方向整体倒序一次, 使结果按升序排列
+        reverse = bool(sort) and sort[0][1] < 0
+        parts = []
+        if fields:
+            filters = self._partition(collection, index, filter, partitions) \
+                if partitions > 1 and index and not limit else []
+            if filters:
+                # 各段分别倒序, 段之间本身按index升序
+                parts = self._map(
+                    lambda f: self._read_columns(collection, fields, f, sort, 0, batch_size, reverse, **kwargs),
+                    filters, workers
+                )
+            else:
+                parts = [self._read_columns(collection, fields, filter, sort, limit, batch_size, reverse, **kwargs)]
+        parts = [part for part in parts if part]
+
+        if not parts:
+            if index:
+                raise KeyError(index)
+            return pd.DataFrame(columns=fields)
+
+        data = pd.DataFrame(OrderedDict(
+            (field, np.concatenate([part[field] for part in parts]) if len(parts) > 1 else parts[0][field])
+            for field in fields if field != index
+        ), columns=[field for field in fields if field != index])
+
+        if index:
+            data.index = pd.Index(
+                np.concatenate([part[index] for part in parts]) if len(parts) > 1 else parts[0][index], name=index
+            )
+
+        return data
+
+    def inplace(self, data, collection, db=None, index='datetime', chunk_size=CHUNK_SIZE, report=False):
         """
         以替换的方式存(存入不重复)
+        以index为键unordered upsert, 并删除原有数据中在data时间范围内但不在data中的文档
 
         :param data(DataFrame|list(dict)): 要存的数据
         :param collection(str): 表名
         :param db(str): 数据库名
         :param index(str): 默认以datetime为索引替换
+        :param chunk_size(int): 每批写入的文档数
+        :param report(bool|function): 写入进度报告
         :return:
         """
 
         collection = self._locate(collection, db)
         data = self.normalize(data, index)
-
-        collection.delete_many({index: {'$gte': data[0][index], '$lte': data[-1][index]}})
-        collection.insert_many(data)
         collection.create_index(index)
+
+        keys = set(doc[index] for doc in data)
+        stale = [
+            doc[index] for doc in collection.find(
+                {index: {'$gte': data[0][index], '$lte': data[-1][index]}}, {index: True, '_id': False}
+            ) if doc[index] not in keys
+        ]
+        for i in range(0, len(stale), chunk_size):
+            collection.delete_many({index: {'$in': stale[i:i + chunk_size]}})
+
+        self._bulk_write(
+            collection, [ReplaceOne({index: doc[index]}, doc, upsert=True) for doc in data], chunk_size, report
+        )
         return {'collection': collection.name, 'start': data[0], 'end': data[-1]}
 
-    def update(self, data, collection, db=None, index='datetime', how='$set'):
+    def update(self, data, collection, db=None, index='datetime', how='$set', upsert=False,
+               chunk_size=CHUNK_SIZE, report=False):
         collection = self._locate(collection, db)
 
         if isinstance(data, pd.DataFrame):
             if index in data.columns:
-                data.index = data[index]
-            for name, doc in data.iterrows():
-                collection.update_one({index: name}, {how: doc.to_dict()})
+                data = data.set_index(index, drop=False)
+            requests = [
+                UpdateOne({index: name}, {how: doc}, upsert=upsert)
+                for name, doc in zip(data.index, data.to_dict('records'))
+            ]
         else:
-            for doc in data:
-                collection.update_one({index: doc.pop(index)}, doc)
+            requests = [UpdateOne({index: doc.pop(index)}, doc, upsert=upsert) for doc in data]
+        if requests:
+            self._bulk_write(collection, requests, chunk_size, report)
 
     def delete(self, filter, collection, db=None):
         collection = self._locate(collection, db)
@@ -169,8 +365,8 @@ class MongoHandler(DataHandler):
     def normalize(self, data, index=None):
         if isinstance(data, pd.DataFrame):
             if index and (index not in data.columns):
-                data[index] = data.index
-            return [doc[1].to_dict() for doc in data.iterrows()]
+                data = data.assign(**{index: data.index})
+            return data.to_dict('records')
         elif isinstance(data, dict):
             key, value = list(map(lambda *args: args, *data.iteritems()))
             return list(map(lambda *args: dict(map(lambda x, y: (x, y), key, args)), *value))
@@ -195,8 +391,26 @@ class MongoHandler(DataHandler):
 from collections import Iterable
 from datetime import datetime
 from numpy import float64
+import numpy as np
 import redis
 
+EPOCH = datetime(1970, 1, 1)
+REDIS_3 = int(redis.__version__.split('.')[0]) >= 3
+
+
+def zadd(pipeline, key, pairs):
+    """
+    兼容redis-py 2.x(zadd(name, score1, member1, ...))与3.x(zadd(name, mapping))的zadd
+
+    :param pairs: [(score, member), ...]
+    """
+    if REDIS_3:
+        return pipeline.zadd(key, {member: score for score, member in pairs})
+    args = []
+    for score, member in pairs:
+        args.extend((score, member))
+    return pipeline.zadd(key, *args)
+
 
 class RedisHandler(DataHandler):
 
@@ -222,6 +436,8 @@ class RedisHandler(DataHandler):
 
         if isinstance(sequence, str):
             return trans(sequence)
+        elif trans is float64 and isinstance(sequence, list):
+            return np.array(sequence, dtype=float64)
         elif isinstance(sequence, Iterable):
             return map(trans, sequence)
         else:
@@ -236,9 +452,123 @@ class RedisHandler(DataHandler):
             fields = list(self.fields)
             fields.remove(index)
 
-        loc, main_index = self._read_index(self.join(name, index), self.transformer[index], start, end, length)
+        score_key = self.score_key(name, index)
+        pipeline = self.client.pipeline(transaction=False)
+        pipeline.zcard(score_key)
+        if start:
+            pipeline.zcount(score_key, '-inf', '(%r' % self.to_score(start))
+        if end:
+            pipeline.zcount(score_key, '-inf', '%r' % self.to_score(end))
+        pipeline.llen(self.join(name, index))
+        counts = pipeline.execute()
+
+        if not counts[0] or counts.pop() != counts[0]:
+            # 没有score索引或索引与列表长度不一致(如索引建立前写入的旧数据), 按列表顺序查找
+            loc, main_index = self._read_index(self.join(name, index), self.transformer[index], start, end, length)
+            return pd.DataFrame(self.locate_read(name, loc, fields), self.trans(index, main_index))
+
+        s, e = self._locate_range(counts, start, end, length)
+        if e < s:
+            return pd.DataFrame(columns=fields)
+
+        pipeline.zrange(score_key, s, e, withscores=True, score_cast_func=float)
+        for f in fields:
+            pipeline.lrange(self.join(name, f), s, e)
+        result = pipeline.execute()
+        scores = np.array([score for member, score in result[0]], dtype=np.float64)
+        return pd.DataFrame(
+            {f: self.trans(f, values) for f, values in zip(fields, result[1:])},
+            self.from_score(index, scores), columns=fields
+        )
+
+    @staticmethod
+    def _locate_range(counts, start=None, end=None, length=None):
+        """
+        根据zcard及zcount的结果计算[s, e]位置
+
+        :param counts: [zcard, count of (-inf, start), count of (-inf, end]]
+        """
+        counts = list(counts)
+        n = counts.pop(0)
+        if start:
+            s = counts.pop(0)
+            if end:
+                e = counts.pop(0) - 1
+            elif length:
+                e = min(s + length, n) - 1
+            else:
+                e = n - 1
+        elif end:
+            e = counts.pop(0) - 1
+            s = max(e - length + 1, 0) if length else 0
+        else:
+            e = n - 1
+            s = max(n - length, 0) if length else 0
+        return s, e
+
+    @staticmethod
+    def score_key(name, index='datetime'):
+        return ':'.join((name, index, 'score'))
+
+    def to_score(self, value, index='datetime'):
+        """
+        将索引值转换为sorted set的score, datetime转换为时间戳(秒)
+        """
+        if isinstance(value, (str, bytes)) or not isinstance(value, (datetime, int, float, np.number)):
+            try:
+                value = self.transformer[index](value)
+            except (KeyError, TypeError, ValueError):
+                value = pd.Timestamp(value).to_pydatetime()
+        if isinstance(value, datetime):
+            return (value.replace(tzinfo=None) - EPOCH).total_seconds()
+        return float(value)
+
+    @staticmethod
+    def from_score(index, scores):
+        if index == 'datetime':
+            return pd.to_datetime(np.round(scores * 1e6).astype(np.int64), unit='us')
+        return scores
+
+    def build_index(self, name, index='datetime', pipeline=None):
+        """
+        为已有的索引列表建立sorted set索引, 之后的read可以O(log n)定位范围
 
-        return pd.DataFrame(self.locate_read(name, loc, fields), self.trans(index, main_index))
+        :param name: str
+        :param index: str
+        :return:
+        """
+        values = self.client.lrange(self.join(name, index), 0, -1)
+        execute = pipeline is None
+        if execute:
+            pipeline = self.client.pipeline()
+        pipeline.delete(self.score_key(name, index))
+        self._add_score(pipeline, name, index, values)
+        return pipeline.execute() if execute else pipeline
+
+    def _add_score(self, pipeline, name, index, values, start=0):
+        """
+        以值在索引列表中的位置为member加入score, 相同的索引值也各占一个member
+
+        :param start: values中第一个值在列表中的位置
+        """
+        pairs = [(self.to_score(value, index), '%d' % position) for position, value in enumerate(values, start)]
+        if pairs:
+            zadd(pipeline, self.score_key(name, index), pairs)
+        return pipeline
+
+    def _prepare_score(self, pipeline, name, index):
+        """
+        返回新写入的数据在索引列表中的起始位置, score索引与列表长度不一致时先为已有数据重建索引
+
+        :return: int
+        """
+        state = self.client.pipeline(transaction=False)
+        state.llen(self.join(name, index))
+        state.zcard(self.score_key(name, index))
+        length, indexed = state.execute()
+        if indexed != length:
+            self.build_index(name, index, pipeline)
+        return length
 
     @staticmethod
     def search_sorted(index, key, transform, reverse=False):
@@ -291,20 +621,29 @@ class RedisHandler(DataHandler):
             execute = True
 
         if isinstance(data, pd.DataFrame):
+            start = self._prepare_score(pipeline, name, index)
             if index in data.columns:
                 pipeline.rpush(self.join(name, index), *data[index])
+                self._add_score(pipeline, name, index, data[index], start)
             else:
                 pipeline.rpush(self.join(name, index), *data.index)
+                self._add_score(pipeline, name, index, data.index, start)
             for key, item in data.iteritems():
                 pipeline.rpush(self.join(name, key), *item)
         elif isinstance(data, dict):
+            start = self._prepare_score(pipeline, name, index) if index in data else 0
             for key, value in data.items():
                 if isinstance(value, (str, int, float, unicode)):
                     pipeline.rpush(self.join(name, key), value)
+                    values = [value]
                 elif isinstance(value, Iterable):
                     pipeline.rpush(self.join(name, key), *value)
+                    values = value
                 else:
                     pipeline.rpush(self.join(name, key), value)
+                    values = [value]
+                if key == index:
+                    self._add_score(pipeline, name, index, values, start)
         else:
             return pipeline
 
@@ -358,14 +697,18 @@ class RedisHandler(DataHandler):
     def locate_read(self, name, loc, fields=None):
         if fields is None:
             fields = self.fields
-        if isinstance(loc, int):
-            return {f: self.trans(f, self.client.lindex(self.join(name, f), loc)) for f in fields}
-        elif isinstance(loc, slice):
-            return {f: self.trans(f, self.client.lrange(self.join(name, f), loc.start, loc.stop)) for f in fields}
-        elif isinstance(loc, (list, tuple)):
-            return {f: self.trans(f, self.client.lrange(self.join(name, f), loc[0], loc[1])) for f in fields}
-        else:
-            return {f: self.trans(f, self.client.lrange(self.join(name, f), 0, -1)) for f in fields}
+        fields = list(fields)
+        pipeline = self.client.pipeline(transaction=False)
+        for f in fields:
+            if isinstance(loc, int):
+                pipeline.lindex(self.join(name, f), loc)
+            elif isinstance(loc, slice):
+                pipeline.lrange(self.join(name, f), loc.start, loc.stop)
+            elif isinstance(loc, (list, tuple)):
+                pipeline.lrange(self.join(name, f), loc[0], loc[1])
+            else:
+                pipeline.lrange(self.join(name, f), 0, -1)
+        return {f: self.trans(f, values) for f, values in zip(fields, pipeline.execute())}
 
     def read_hash(self, name, keys=None, **kwargs):
         if keys is None:
@@ -380,7 +723,8 @@ class RedisHandler(DataHandler):
     def delete(self, name, fields=None):
         if fields is None:
             fields = self.fields
-        return self.client.delete(*map(lambda x: self.join(name, x), fields))
+        keys = [self.join(name, x) for x in fields] + [self.score_key(name, x) for x in fields]
+        return self.client.delete(*keys)
 
     def subscribe(self, *args, **kwargs):
         self.pubsub.subscribe(*args, **kwargs)
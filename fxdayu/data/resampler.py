@@ -1,7 +1,12 @@
 # encoding:utf-8
-from datetime import timedelta
+from datetime import timedelta, time
+import numpy as np
 import pandas as pd
 
+from fxdayu.data.bar_store import to_times
+
+DAY_NS = 24 * 3600 * 10 ** 9
+
 
 class TimeEdge():
     def __init__(self, edge):
@@ -27,11 +32,117 @@ class TimeEdge():
             return self.range(t)
 
 
+def _time_of_day(t):
+    if isinstance(t, str):
+        t = time(*map(int, t.split(":")))
+    return ((t.hour * 60 + t.minute) * 60 + t.second) * 10 ** 9 + t.microsecond * 1000
+
+
+class SessionGrouper(object):
+    """
+    Vectorized grouper of bars into intraday session buckets.
+
+    Bucket ends of every day are precomputed from edges (time of day), and bars are
+    assigned to buckets with numpy.searchsorted. A bucket is (previous end, end], bars
+    after the last edge of a day form a bucket until the end of that day.
+    Buckets are labeled with the time of their last bar.
+    """
+
+    def __init__(self, edges):
+        """
+
+        Args:
+            edges(list): bucket ends as datetime.time or "HH:MM[:SS]", e.g. A-share hour bars
+                ["9:30", "10:30", "11:30", "13:00", "14:00", "15:00"]
+        """
+        self.edges = np.array(sorted(set(_time_of_day(t) for t in edges)) + [DAY_NS], dtype=np.int64)
+        self._first = None
+        self._boundaries = np.empty(0, dtype=np.int64)
+
+    def boundaries(self, first_day, last_day):
+        """
+        Bucket ends of days in [first_day, last_day], as int64 nanoseconds.
+        Computed boundaries are kept and only extended when days out of them are required.
+        """
+        if self._first is None or first_day < self._first or \
+                last_day >= self._first + len(self._boundaries) // len(self.edges):
+            if self._first is not None:
+                first_day = min(first_day, self._first)
+                last_day = max(last_day, self._first + len(self._boundaries) // len(self.edges) - 1)
+            days = np.arange(first_day, last_day + 1, dtype=np.int64) * DAY_NS
+            self._boundaries = (days[:, None] + self.edges[None, :]).ravel()
+            self._first = first_day
+        return self._boundaries
+
+    def keys(self, times):
+        """
+        Args:
+            times(numpy.ndarray): int64 nanoseconds, sorted
+
+        Returns:
+            numpy.ndarray: bucket keys of times, not decreasing
+        """
+        if not len(times):
+            return np.empty(0, dtype=np.int64)
+        boundaries = self.boundaries(int(times[0] // DAY_NS), int(times[-1] // DAY_NS))
+        return np.searchsorted(boundaries, times, "left")
+
+
+class WeekGrouper(object):
+    """
+    Vectorized grouper of bars into weeks, from Monday to Sunday.
+    Buckets are labeled with the time of their last bar.
+    """
+
+    @staticmethod
+    def keys(times):
+        # 1970-01-01 is Thursday
+        return (times // DAY_NS + 3) // 7
+
+
+def aggregate(frame, keys, label="last"):
+    """
+    Aggregate consecutive bars sharing the same bucket key, with numpy reduceat.
+
+    Args:
+        frame(pandas.DataFrame): bars sorted by time
+        keys(numpy.ndarray): int64 bucket key of every bar, not decreasing
+        label(str): "last" labels a bucket with the time of its last bar,
+            "key" labels it with its key as int64 nanoseconds
+
+    Returns:
+        tuple: (aggregated DataFrame, position of the first bar of the last bucket)
+    """
+    n = len(keys)
+    if not n:
+        return frame.iloc[:0], 0
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    ends = np.concatenate((starts[1:], [n])) - 1
+    data = {}
+    for field in frame.columns:
+        values = frame[field].values
+        how = RESAMPLE_MAP.get(field, 'last')
+        if how == 'first':
+            data[field] = values[starts]
+        elif how == 'max':
+            data[field] = np.maximum.reduceat(values, starts)
+        elif how == 'min':
+            data[field] = np.minimum.reduceat(values, starts)
+        elif how == 'sum':
+            data[field] = np.add.reduceat(values, starts)
+        else:
+            data[field] = values[ends]
+    if label == "key":
+        index = pd.DatetimeIndex(keys[starts].view('datetime64[ns]'))
+    else:
+        index = frame.index[ends]
+    return pd.DataFrame(data, index=index, columns=frame.columns), int(starts[-1])
+
+
 MIN1FACTOR = {'min': 1, 'H': 60, 'D': 240, 'W': 240*5, 'M': 240*5*31}
 STOCK_GROUPER = {
-    'W': TimeEdge(lambda x: x.replace(hour=0, minute=0)-timedelta(days=x.weekday())),
-    'H': TimeEdge(lambda x: x.replace(minute=30, hour=x.hour if x.minute > 30 else x.hour-1) if x.hour < 12
-                  else x.replace(minute=0, hour=x.hour if x.minute != 0 else x.hour-1))
+    'W': WeekGrouper(),
+    'H': SessionGrouper(["9:30", "10:30", "11:30", "13:00", "14:00", "15:00"])
     }
 
 RESAMPLE_MAP = {'high': 'max',
@@ -44,11 +155,20 @@ RESAMPLE_MAP = {'high': 'max',
 class Resampler(object):
 
     def __init__(self, grouper=STOCK_GROUPER, factor=MIN1FACTOR):
+        """
+
+        Args:
+            grouper(dict): {frequency: grouper}, grouper has a keys(times) method which returns
+                bucket keys of int64 nanoseconds times, e.g. SessionGrouper of a market's sessions
+            factor(dict): number of 1 min bars of each frequency
+        """
         self.grouper = grouper
         self.factor = factor
 
     def resample(self, data, how):
         grouper = self.grouper.get(how, None)
+        if grouper is not None and hasattr(grouper, "keys"):
+            return aggregate(data, grouper.keys(to_times(data.index)))[0]
         mapper = {key: RESAMPLE_MAP[key] for key in data.columns}
         if grouper:
             return data.groupby(grouper).agg(mapper)
@@ -80,5 +200,5 @@ if __name__ == '__main__':
     candle = mh.read('000001.1min', end=datetime(2016, 2, 1))
     rsl = Resampler()
 
-    print rsl.resample(candle, 'H').iloc[30: 20]
+    print(rsl.resample(candle, 'H').iloc[30: 20])
 
@@ -0,0 +1,132 @@
+# encoding: utf-8
+import numpy as np
+import pandas as pd
+
+from fxdayu.data.bar_store import BAR_FIELDS, to_nanosecond
+
+__all__ = ["BarRing"]
+
+
+class BarRing(object):
+    """
+    Fixed capacity window of the most recent bars of a symbol, preallocated as numpy arrays.
+
+    Every bar is written twice, at position i and i + capacity of arrays twice as long as
+    capacity, so the latest n bars are always a contiguous slice and can be returned as
+    views without copying or reordering.
+    """
+
+    def __init__(self, capacity, fields=None):
+        """
+
+        Args:
+            capacity(int): max number of bars kept
+            fields(list): bar fields, default to ["open", "high", "low", "close", "volume"]
+        """
+        self.capacity = int(capacity)
+        self.fields = list(fields) if fields else list(BAR_FIELDS)
+        self._columns = {field: i for i, field in enumerate(self.fields)}
+        self._times = np.zeros(2 * self.capacity, dtype=np.int64)
+        self._values = np.full((2 * self.capacity, len(self.fields)), np.nan)
+        self._pos = -1  # position of the latest bar in [0, capacity)
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def last_time(self):
+        """
+        Returns:
+            int: time of the latest bar in nanoseconds, None if empty
+        """
+        if not self._count:
+            return None
+        return int(self._times[self._pos])
+
+    def append(self, time, values):
+        """
+        Append a bar. A bar of the same time as the latest one replaces it,
+        an older bar is ignored.
+
+        Args:
+            time(datetime | int): bar time
+            values(list): values in the order of fields
+
+        Returns:
+            bool: whether the bar is written
+        """
+        t = to_nanosecond(time)
+        if self._count:
+            last = self._times[self._pos]
+            if t < last:
+                return False
+            if t > last:
+                self._pos = (self._pos + 1) % self.capacity
+                self._count = min(self._count + 1, self.capacity)
+        else:
+            self._pos = 0
+            self._count = 1
+        for i in (self._pos, self._pos + self.capacity):
+            self._times[i] = t
+            self._values[i] = values
+        return True
+
+    def extend(self, frame):
+        """
+        Append bars of a DataFrame indexed by datetime, only the latest capacity bars
+        newer than the latest one are written.
+
+        Args:
+            frame(pandas.DataFrame): bars sorted by time
+
+        Returns:
+            None
+        """
+        if frame is None or not len(frame):
+            return
+        times = np.asarray(pd.DatetimeIndex(frame.index).values, dtype="datetime64[ns]").view(np.int64)
+        values = np.column_stack([
+            frame[field].values.astype(np.float64) if field in frame.columns else np.full(len(frame), np.nan)
+            for field in self.fields
+        ])
+        if self._count:
+            start = int(np.searchsorted(times, self._times[self._pos], "left"))
+            times, values = times[start:], values[start:]
+        for t, row in zip(times[-self.capacity:], values[-self.capacity:]):
+            self.append(int(t), row)
+
+    def window(self, length=None):
+        """
+        Latest bars as views of the buffer, they are overwritten by later appends.
+
+        Args:
+            length(int): number of bars, default to all
+
+        Returns:
+            tuple: (int64 times, 2d float values in the order of fields)
+        """
+        n = self._count if length is None else min(int(length), self._count)
+        end = self._pos + self.capacity + 1
+        return self._times[end - n:end], self._values[end - n:end]
+
+    def frame(self, length=None, fields=None):
+        """
+        Latest bars as a DataFrame over the views of window, nothing is copied when all fields
+        are required, so the frame is overwritten by later appends. Copy it to keep it.
+
+        Args:
+            length(int): number of bars, default to all
+            fields(list): fields, default to all
+
+        Returns:
+            pandas.DataFrame: bars indexed by datetime
+        """
+        times, values = self.window(length)
+        index = pd.DatetimeIndex(times.view("datetime64[ns]"), copy=False)
+        if fields is None:
+            return pd.DataFrame(values, index=index, columns=self.fields, copy=False)
+        return pd.DataFrame(values[:, [self._columns[f] for f in fields]], index=index, columns=list(fields))
+
+    def covers(self, fields):
+        return all(field in self._columns for field in fields)
@@ -1,11 +1,14 @@
 try:
+    from bar_store import BarStore
     from _dataframe_data_support import PanelDataSupport, MultiPanelData
     from _mongo_data_support import MongoDataSupport, MultiDataSupport
 except ImportError:
+    from .bar_store import BarStore
     from ._dataframe_data_support import PanelDataSupport, MultiPanelData
     from ._mongo_data_support import MongoDataSupport, MultiDataSupport
 
 __all__ = [
+    "BarStore",
     "PanelDataSupport",
     "MongoDataSupport",
     "MultiDataSupport",
@@ -1 +1 @@
-from ._engine import Engine
+from ._engine import Engine, HeapQueue
@@ -1,16 +1,58 @@
 # encoding:utf-8
 
+import heapq
 import logging
+from datetime import datetime
 from threading import Thread
 
+from enum import Enum
+
 try:
     from Queue import Empty, PriorityQueue
 except ImportError:
     from queue import Empty, PriorityQueue
 from fxdayu.engine.stream import StreamManager, StreamEnd
-from fxdayu.event import EVENTS
+from fxdayu.event import EVENTS, Event
+
+__all__ = ["Engine", "HeapQueue"]
+
+
+class HeapQueue(object):
+    """
+    无锁的堆优先级队列，接口与PriorityQueue兼容，只能在单线程中使用。
+    队列为空时get直接抛出Empty，不会阻塞。
+    """
+
+    def __init__(self):
+        self._heap = []
 
-__all__ = ["Engine"]
+    def put(self, item, block=True, timeout=None):
+        heapq.heappush(self._heap, item)
+
+    def get(self, block=True, timeout=None):
+        try:
+            return heapq.heappop(self._heap)
+        except IndexError:
+            raise Empty()
+
+    put_nowait = put
+    get_nowait = get
+
+    def qsize(self):
+        return len(self._heap)
+
+    def empty(self):
+        return not self._heap
+
+
+class _WakeUpEvent(Event):
+    """
+    停止阻塞模式的引擎时用于唤醒工作线程的事件，没有对应的工作流。
+    """
+    __slots__ = []
+
+    def __init__(self):
+        super(_WakeUpEvent, self).__init__(None, -999, datetime.now())
 
 
 class Engine(object):
@@ -19,19 +61,27 @@ class Engine(object):
     工作流开始处理外部输入的事件
 
     Attributes:
-        queue(type): 事件队列类型，推荐使用优先级队列PriorityQueue。
+        queue(type): 事件队列类型，默认根据运行模式选择HeapQueue或PriorityQueue。
+        mode(Engine.MODE): 运行模式，BACKTEST模式在调用线程中同步处理事件直到收到
+            EVENTS.EXIT或队列为空；BLOCKING模式在工作线程中阻塞等待新事件，适用于实盘。
         is_running(bool): 引擎是否在运行的标记。
         _stream_manager(StreamManager): 工作流管理器对象。
         _thread(Thread): 工作线程
     """
 
-    def __init__(self, queue=None, manager=None):
+    class MODE(Enum):
+        BACKTEST = 0  # 单线程同步运行，使用无锁堆队列
+        BLOCKING = 1  # 工作线程阻塞等待事件，适用于有外部线程推送事件的实盘
+
+    def __init__(self, queue=None, manager=None, mode=MODE.BLOCKING):
+        self._mode = self.MODE(mode)
         if queue is None:
-            queue = PriorityQueue
+            queue = HeapQueue if self._mode == self.MODE.BACKTEST else PriorityQueue
         if manager is None:
             manager = StreamManager
         self.event_queue = queue()
         self._stream_manager = manager()
+        self._sources = {}
         self._is_running = False
         self._thread = None
         self._context = None
@@ -41,42 +91,86 @@ class Engine(object):
     def is_running(self):
         return self._is_running
 
+    @property
+    def mode(self):
+        return self._mode
+
+    def _dispatch(self, event):
+        """
+        按工作流依次调用事件处理函数处理事件。
+
+        Args:
+            event(fxdayu.event.Event): 需要处理的事件
+
+        Returns:
+            None
+        """
+        kwargs = {}
+        handle = None
+        try:
+            for handle in self._stream_manager.get_iter(event.type, event.topic):
+                handle(event, kwargs)
+        except StreamEnd:
+            pass
+        except Exception as e:
+            if handle:
+                logging.error("error occurs when in handler: %s" % handle)
+            logging.exception(e)
+
     def run(self):
         """
-        事件驱动引擎的工作逻辑，一般运行在单独的线程中。
+        事件驱动引擎的工作逻辑，BLOCKING模式下一般运行在单独的线程中。
 
         Returns:
             None
         """
         with self._context:
             self._is_running = True
-            handle = None
-            while self._is_running:
-                try:
-                    event = self.event_queue.get(timeout=0)
-                    kwargs = {}
-                    for handle in self._stream_manager.get_iter(event.type, event.topic):
-                        handle(event, kwargs)
-                except StreamEnd:
-                    pass
-                except Empty:
-                    pass
-                except Exception as e:
-                    if handle:
-                        logging.error("error occurs when in handler: %s" % handle)
-                    logging.exception(e)
+            if self._mode == self.MODE.BACKTEST:
+                self._run_backtest()
+            else:
+                self._run_blocking()
+
+    def _run_backtest(self):
+        get = self.event_queue.get
+        dispatch = self._dispatch
+        sources = self._sources
+        while self._is_running:
+            try:
+                event = get(False)
+            except Empty:
+                break
+            if sources:
+                self._next_from(sources.pop(event, None))
+            dispatch(event)
+        self._is_running = False
+
+    def _run_blocking(self):
+        get = self.event_queue.get
+        dispatch = self._dispatch
+        sources = self._sources
+        while self._is_running:
+            event = get()
+            if sources:
+                self._next_from(sources.pop(event, None))
+            if self._is_running:
+                dispatch(event)
 
     def start(self):
         """
-        在单独的工作线程中启动事件驱动引擎。若事件引擎已启动，直接返回。
+        启动事件驱动引擎。BACKTEST模式下在当前线程中同步运行直到结束，
+        BLOCKING模式下在单独的工作线程中启动。若事件引擎已启动，直接返回。
 
         Returns:
             None
         """
         if self._is_running:
             return
-        self._thread = Thread(target=self.run)
-        self._thread.start()
+        if self._mode == self.MODE.BACKTEST:
+            self.run()
+        else:
+            self._thread = Thread(target=self.run)
+            self._thread.start()
 
     def join(self):
         """
@@ -85,7 +179,8 @@ class Engine(object):
         Returns:
             None
         """
-        self._thread.join()
+        if self._thread:
+            self._thread.join()
 
     def _stop(self, event, kwargs):
         """
@@ -111,12 +206,48 @@ class Engine(object):
             return
         self._is_running = False
         if self._thread:
+            self.event_queue.put(_WakeUpEvent())  # 唤醒阻塞在get上的工作线程
             self._thread.join()
             self._thread = None
 
+    def reset(self):
+        """
+        清空事件队列和事件序列，保留已注册的事件处理函数，用于在同一个引擎上进行下一次回测。
+        引擎运行时不能重置。
+
+        Returns:
+            None
+        """
+        if self._is_running:
+            raise RuntimeError("Can not reset a running engine")
+        self.event_queue = type(self.event_queue)()
+        self._sources = {}
+
     def put(self, event):
         self.event_queue.put(event)
 
+    def put_source(self, source):
+        """
+        加入一个按顺序排列的事件序列，引擎每次只将序列中的下一个事件放入事件队列，
+        该事件被取出时再放入之后的一个，多个序列和队列中的其他事件一起按优先级归并，
+        事件队列中只保留待处理的事件而不是全部事件。
+
+        Args:
+            source(iterable): 按事件优先级排好序的事件序列
+
+        Returns:
+            None
+        """
+        self._next_from(iter(source))
+
+    def _next_from(self, source):
+        if source is None:
+            return
+        event = next(source, None)
+        if event is not None:
+            self._sources[event] = source
+            self.event_queue.put(event)
+
     def set_context(self, context):
         self._context = context
 
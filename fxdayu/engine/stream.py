@@ -1,5 +1,4 @@
 import bisect
-from itertools import chain
 from collections import deque
 
 __all__ = ["PriorityList", "StreamManager", "StreamEnd"]
@@ -91,10 +90,46 @@ class PriorityList(object):
 class StreamManager(object):
     """
     Manager all event stream
+
+    Flattened handler tuples are cached per (stream, topic) and the cache of a
+    stream is dropped whenever a handler is registered or unregistered on it,
+    so dispatching an event is normally a single dict lookup.
     """
 
     def __init__(self):
         self._streams = {}
+        self._tables = {}
+
+    def _build(self, stream, topic):
+        """
+        Build flattened handlers tuple of given event stream under given topic
+
+        Args:
+            stream(fxdayu.event.EVENTS): type of event stream
+            topic(str): topic of event
+        Returns:
+            tuple: handlers in calling order
+        """
+        handlers = self._streams[stream]
+        head = deque([handlers[""]]) if "" in handlers else deque()
+        tail = deque([handlers["."]]) if "." in handlers else deque()
+        if topic:
+            paths = topic.split(".")
+            path = ""
+            for s in paths:
+                path += s
+                path_ = path + "."
+                if path in handlers:
+                    head.append(handlers[path])
+                if path_ in handlers:
+                    tail.appendleft(handlers[path_])
+                path += "."
+        result = []
+        for plist in head:
+            result.extend(plist)
+        for plist in tail:
+            result.extend(plist)
+        return tuple(result)
 
     def get_iter(self, stream, topic):
         """
@@ -104,26 +139,28 @@ class StreamManager(object):
             stream(fxdayu.event.EVENTS): type of event stream
             topic(str): topic of event
         Returns:
-            chain: chain of the handlers
+            tuple: handlers in calling order
         """
-        if stream in self._streams:
-            handlers = self._streams[stream]
-            head = deque([handlers[""]]) if "" in handlers else deque()
-            tail = deque([handlers["."]]) if "." in handlers else deque()
-            if topic:
-                paths = topic.split(".")
-                path = ""
-                for s in paths:
-                    path += s
-                    path_ = path + "."
-                    if path in handlers:
-                        head.append(handlers[path])
-                    if path_ in handlers:
-                        tail.appendleft(handlers[path_])
-                    path += "."
-            return chain(*chain(head, tail))
-        else:
-            return chain()
+        try:
+            return self._tables[stream][topic]
+        except KeyError:
+            if stream not in self._streams:
+                return ()
+            table = self._tables.setdefault(stream, {})
+            handlers = table[topic] = self._build(stream, topic)
+            return handlers
+
+    def _invalidate(self, stream):
+        """
+        Drop cached handlers tuples of given event stream
+
+        Args:
+            stream(fxdayu.event.EVENTS): type of event stream
+
+        Returns:
+            None
+        """
+        self._tables.pop(stream, None)
 
     def register_stream(self, stream):
         """
@@ -150,6 +187,7 @@ class StreamManager(object):
         """
         if stream in self._streams:
             del self._streams[stream]
+            self._invalidate(stream)
 
     def register_handler(self, handler, stream, topic=".", priority=0):
         """
@@ -170,6 +208,7 @@ class StreamManager(object):
         if topic not in handlers:
             handlers[topic] = PriorityList()
         handlers[topic].put(priority, handler)
+        self._invalidate(stream)
 
     def unregister_handler(self, handler, stream, topic="."):
         """
@@ -186,6 +225,7 @@ class StreamManager(object):
         if stream not in self._streams:
             return
         handlers = self._streams[stream]
+        self._invalidate(stream)
         handlers[topic].remove(handler)
         if len(handlers[topic]) == 0:
             del handlers[topic]
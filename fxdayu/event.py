@@ -1,16 +1,14 @@
 # encoding: utf-8
 
-import threading
 from datetime import datetime
+from itertools import count
 
 from dateutil.parser import parse
 
 from fxdayu.const import *
 from fxdayu.models.data import ExecutionData
 
-G = threading.local()
-ID_WIDTH = 12  # 0xffffffffffff / (365 * 24 * 60 * 60 * 100000) = 89
-THREAD_ID_WITH = 5  # 0xfffff = 1048575
+_PID = count(1)  # next() on itertools.count is atomic under the GIL
 
 
 class EVENTS(Enum):
@@ -30,6 +28,7 @@ class EVENTS(Enum):
     ERROR = 13
     INIT = 14
     SCHEDULE = 15
+    ORDERS = 16
     EXIT = 999
 
 
@@ -39,33 +38,43 @@ class Event(object):
     it implements the __lt__ and __gt__ function
     which compares its own priority and other event's priority
     Other events that extends from this class must set the 'priority' attribution
+
+    pid is a process-wide increasing integer, so events with the same priority and
+    time keep the order they were created in. Set PRECOMPUTE_KEY to True on a event
+    class to store (priority, time, pid) as key when the event is created, which makes
+    heap comparisons cheaper, only for events whose priority and time won't change
+    after creation.
     """
-    __slots__ = ["type", "priority", "topic", "time", "pid"]
+    __slots__ = ["type", "priority", "topic", "time", "pid", "key"]
+
+    PRECOMPUTE_KEY = False
 
     def __init__(self, _type, priority, timestamp, topic=""):
         self.type = _type
         self.priority = priority
         self.topic = topic
         self.time = timestamp
-        self.pid = self.next_pid()
+        self.pid = next(_PID)
+        self.key = (priority, timestamp, self.pid) if self.PRECOMPUTE_KEY else None
 
     @classmethod
     def next_pid(cls):
-        # XXX in a thread, event keep in order, but not totally threading-safe
-        global G
-        try:
-            G.count += 1
-        except AttributeError:
-            G.count = 1
-        result = hex(threading.current_thread().ident)[2:].replace("L", "").zfill(THREAD_ID_WITH)
-        result += hex(G.count)[2:].replace("L", "").zfill(ID_WIDTH)
-        return result
+        return next(_PID)
 
     def to_dict(self):
-        return {field: getattr(self, field) for field in self.__slots__}
+        return {field: getattr(self, field) for field in self.__slots__ if field != "key"}
 
     def __lt__(self, other):
-        return (self.priority, self.time, self.pid) < (other.priority, other.time, other.pid)
+        key = self.key
+        if key is not None:
+            other_key = other.key
+            if other_key is not None:
+                return key < other_key
+        if self.priority != other.priority:
+            return self.priority < other.priority
+        if self.time != other.time:
+            return self.time < other.time
+        return self.pid < other.pid
 
 
 class TickEvent(Event):
@@ -126,6 +135,30 @@ class OrderEvent(Event):
         self.data = order
 
 
+class OrderBatchEvent(Event):
+    """
+    OrderBatchEvent carries a batch of orders sent at once, e.g. by a portfolio rebalance,
+    handled in bulk by order, portfolio and router modules.
+    """
+    __slots__ = ["data"]
+
+    def __init__(self, orders, timestamp=None, topic=""):
+        """
+
+        Args:
+            orders(list): list of fxdayu.models.OrderReq
+            timestamp:
+            topic:
+
+        Returns:
+
+        """
+        if timestamp is None:
+            timestamp = datetime.now()
+        super(OrderBatchEvent, self).__init__(EVENTS.ORDERS, 0, timestamp, topic)
+        self.data = orders
+
+
 class CancelEvent(Event):
     """
     CancelEvent is created by a strategy when it wants to cancel an limit or stop order
@@ -180,6 +213,8 @@ class ExecutionEvent(Event):
 class TimeEvent(Event):
     __slots__ = []
 
+    PRECOMPUTE_KEY = True
+
     def __init__(self, timestamp, topic=""):
         super(TimeEvent, self).__init__(EVENTS.TIME, 1, timestamp, topic)
 
@@ -187,6 +222,8 @@ class TimeEvent(Event):
 class ScheduleEvent(Event):
     __slots__ = []
 
+    PRECOMPUTE_KEY = True
+
     def __init__(self, timestamp, topic=""):
         super(ScheduleEvent, self).__init__(EVENTS.SCHEDULE, 1, timestamp, topic)
 
@@ -200,10 +237,14 @@ class ConfigEvent(Event):
 
 
 class ExitEvent(Event):
+    """
+    Stops the engine. By default it comes after all other events, an ExitEvent of
+    a negative priority stops the engine before the events already queued.
+    """
     __slots__ = []
 
-    def __init__(self):
-        super(ExitEvent, self).__init__(EVENTS.EXIT, 999, datetime.now())
+    def __init__(self, priority=999):
+        super(ExitEvent, self).__init__(EVENTS.EXIT, priority, datetime.now())
 
 
 class AccountEvent(Event):
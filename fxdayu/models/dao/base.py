@@ -17,6 +17,10 @@ class DataDao(object):
     def match(url):
         return True
 
+    def insert_many(self, items, session=None):
+        for item in items:
+            self.insert(item, session)
+
 
 class PositionDataDao(DataDao):
     def insert(self, position, session=None):
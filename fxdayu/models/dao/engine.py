@@ -7,15 +7,39 @@ from fxdayu.context import ContextMixin
 from fxdayu.models.dao.table import Base
 import fxdayu.models.dao.base
 import fxdayu.models.dao.implement
+from fxdayu.models.dao.implement.memory import MEMORY_SCHEME, MemoryDao, is_memory_url
+from fxdayu.models.dao.write_behind import WriteBehindWriter, WriteBehindDao
 
 
 class PersistenceEngine(ContextMixin):
-    def __init__(self, url="sqlite:///:memory:"):
+    def __init__(self, url="sqlite:///:memory:", write_behind=False, interval=0.2, batch_size=500, journal=None):
+        """
+
+        Args:
+            url(str): database url, daos of "memory://" and in-memory sqlite keep data in memory only
+            write_behind(bool): keep data in memory and write them to database in background,
+                batched into one transaction every interval seconds or batch_size records
+            interval(float): max seconds between two background writes
+            batch_size(int): number of queued records which triggers a background write
+            journal(str): journal file of queued writes, replayed into database at start
+                so writes queued before a crash are not lost
+        """
         ContextMixin.__init__(self, use_proxy=True)
         self._url = url
-        self.db_engine = create_engine(url)
-        self.scoped_session = scoped_session(sessionmaker(bind=self.db_engine))
+        if url.startswith(MEMORY_SCHEME):
+            # daos of memory scheme keep data in themselves, no database is needed
+            self.db_engine = None
+            self.scoped_session = None
+        else:
+            self.db_engine = create_engine(url)
+            self.scoped_session = scoped_session(sessionmaker(bind=self.db_engine))
         self._initialized = False
+        self._daos = {}
+        if write_behind and not is_memory_url(url):
+            self.writer = WriteBehindWriter(self, interval, batch_size, journal)
+            self.writer.start()
+        else:
+            self.writer = None
 
     def _initialize(self):
         self._initialized = True
@@ -43,13 +67,46 @@ class PersistenceEngine(ContextMixin):
         return self.scoped_session()
 
     def get_dao(self, cls):
+        if cls in self._daos:
+            return self._daos[cls]
         dao = getattr(fxdayu.models.dao.base, cls.__name__ + "Dao")
         for implement in dao.implements():
             if implement.match(self._url):
-                return implement(self)
+                if self.writer is not None:
+                    memory = [i for i in dao.implements() if i.match(MEMORY_SCHEME)][0]
+                    instance = WriteBehindDao(self, implement(self), cls, memory.KEY)
+                else:
+                    instance = implement(self)
+                self._daos[cls] = instance
+                return instance
+
+    def flush(self):
+        """
+        Write queued data to database immediately when write behind.
+        """
+        if self.writer is not None:
+            self.writer.flush()
+
+    def reset(self):
+        """
+        Delete all data of daos and database tables, tables and daos are kept so that
+        the next backtest starts without creating them again. Never used in real trading.
+        """
+        self.flush()
+        for dao in self._daos.values():
+            if isinstance(dao, MemoryDao):
+                dao.clear()
+        if self.scoped_session is not None and self._initialized:
+            with self.session_scope() as session:
+                for table in reversed(Base.metadata.sorted_tables):
+                    session.execute(table.delete())
+            session.expunge_all()
 
     def close(self):
-        self.scoped_session.remove()
+        if self.writer is not None:
+            self.writer.stop()
+        if self.scoped_session is not None:
+            self.scoped_session.remove()
 
     def link_context(self):
         self.environment["persistence"] = self
@@ -1,3 +1,4 @@
+from .memory import *
 from .execution import *
 from .order import *
 from .position import *
\ No newline at end of file
@@ -0,0 +1,82 @@
+from collections import OrderedDict
+
+from fxdayu.models.dao.base import PositionDataDao, ExecutionDataDao, OrderStatusDataDao, OrderReqDao
+
+MEMORY_SCHEME = "memory://"
+
+
+def is_memory_url(url):
+    """
+    Whether url refers to a database living only in memory, "memory://" or an in-memory sqlite
+    such as "sqlite:///:memory:" and "sqlite://".
+    """
+    return url.startswith(MEMORY_SCHEME) or url == "sqlite://" or url.endswith(":memory:")
+
+
+class MemoryDao(object):
+    """
+    Pure in-memory storage of data objects indexed by (gateway, account, id).
+
+    Objects are kept as they are inserted, so find returns live objects and no copy,
+    merge or commit happens on the hot path. Nothing survives the process.
+    """
+    KEY = "clOrdID"
+
+    def __init__(self, engine=None):
+        self.engine = engine
+        self._accounts = OrderedDict()  # (gateway, account) -> OrderedDict(id -> object)
+
+    @staticmethod
+    def match(url):
+        return is_memory_url(url)
+
+    def insert(self, data, session=None):
+        account = (data.gateway, data.account)
+        items = self._accounts.get(account, None)
+        if items is None:
+            items = self._accounts[account] = OrderedDict()
+        items[getattr(data, self.KEY)] = data
+
+    def insert_many(self, items, session=None):
+        for data in items:
+            self.insert(data)
+
+    def delete(self, gateway, account, key, session=None):
+        items = self._accounts.get((gateway, account), None)
+        if items is not None:
+            items.pop(key, None)
+
+    def find(self, gateway, account, key, session=None):
+        items = self._accounts.get((gateway, account), None)
+        if items is None:
+            return None
+        return items.get(key, None)
+
+    def find_by_account(self, gateway, account, session=None):
+        return list(self._accounts.get((gateway, account), {}).values())
+
+    def find_all(self, session=None):
+        return [data for items in self._accounts.values() for data in items.values()]
+
+    def clear(self):
+        self._accounts.clear()
+
+
+@PositionDataDao.implement
+class PositionDataDaoMemory(MemoryDao, PositionDataDao):
+    KEY = "symbol"
+
+
+@ExecutionDataDao.implement
+class ExecutionDataDaoMemory(MemoryDao, ExecutionDataDao):
+    pass
+
+
+@OrderStatusDataDao.implement
+class OrderStatusDataDaoMemory(MemoryDao, OrderStatusDataDao):
+    pass
+
+
+@OrderReqDao.implement
+class OrderReqDaoMemory(MemoryDao, OrderReqDao):
+    pass
@@ -13,6 +13,12 @@ class OrderStatusDataDaoSqlAlchemy(OrderStatusDataDao):
         session.merge(order_status)
         session.commit()
 
+    def insert_many(self, items, session=None):
+        session = self.engine.session if session is None else session
+        for item in items:
+            session.merge(item)
+        session.commit()
+
     def delete(self, gateway, account, ord_id, session=None):
         session = self.engine.session if session is None else session
         session.query(OrderStatusData).filter(
@@ -46,6 +52,12 @@ class OrderReqDaoSqlAlchemy(OrderReqDao):
         session.merge(order_req)
         session.commit()
 
+    def insert_many(self, items, session=None):
+        session = self.engine.session if session is None else session
+        for item in items:
+            session.merge(item)
+        session.commit()
+
     def delete(self, gateway, account, ord_id, session=None):
         session = self.engine.session if session is None else session
         session.query(OrderReq).filter(
@@ -0,0 +1,252 @@
+import logging
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+from fxdayu.models.dao.implement.memory import MemoryDao
+from fxdayu.models.data import AccountData, PositionData, ExecutionData
+from fxdayu.models.order import OrderStatusData, OrderReq
+
+DATA_CLASSES = {cls.__name__: cls for cls in (AccountData, PositionData, ExecutionData, OrderStatusData, OrderReq)}
+
+MERGE = "merge"
+DELETE = "delete"
+
+
+def _state(data):
+    return {key: value for key, value in data.__dict__.items() if not key.startswith("_")}
+
+
+def _restore(name, state):
+    data = DATA_CLASSES[name]()
+    for key, value in state.items():
+        setattr(data, key, value)
+    return data
+
+
+def _read_journal(path):
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, "rb") as f:
+        while True:
+            try:
+                records.append(pickle.load(f))
+            except EOFError:
+                break
+            except Exception:  # record truncated by a crash
+                logging.warning("Persistence journal %s truncated after %s records", path, len(records))
+                break
+    return records
+
+
+class WriteBehindWriter(object):
+    """
+    Background writer of a PersistenceEngine.
+
+    Merges and deletes are queued and coalesced by (class, gateway, account, id), then written
+    by a background thread in one transaction every interval seconds or every batch_size
+    records. Each queued operation is also appended to a journal file, which is replayed into
+    the database when the writer starts, so operations not yet committed when the process
+    crashed are not lost.
+    """
+
+    def __init__(self, engine, interval=0.2, batch_size=500, journal=None):
+        """
+
+        Args:
+            engine(fxdayu.models.dao.engine.PersistenceEngine): provides sessions to database
+            interval(float): max seconds between two writes
+            batch_size(int): write at once when this number of records are queued
+            journal(str): path of the journal file, None to disable journal
+        """
+        self.engine = engine
+        self.interval = interval
+        self.batch_size = batch_size
+        self.journal = journal
+        self._pending = OrderedDict()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._journal_file = None
+        self._thread = None
+        self._running = False
+
+    @property
+    def _committing(self):
+        return self.journal + ".commit"
+
+    def start(self):
+        if self.journal:
+            self.replay()
+            self._journal_file = open(self.journal, "ab")
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="persistence-writer")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def replay(self):
+        """
+        Write operations left in journal files into database.
+
+        Returns:
+            int: number of operations replayed
+        """
+        paths = [self._committing, self.journal]
+        ops = OrderedDict()
+        for path in paths:
+            for record in _read_journal(path):
+                ops[record[1:5]] = record
+        if ops:
+            session = self.engine.session
+            try:
+                for record in ops.values():
+                    self._apply(session, record)
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+        return len(ops)
+
+    def merge(self, data, key):
+        # state is copied in the calling thread, data may be changed while it is queued
+        self._put((MERGE, type(data).__name__, data.gateway, data.account, getattr(data, key), _state(data)))
+
+    def delete(self, cls, gateway, account, key, value):
+        self._put((DELETE, cls.__name__, gateway, account, value, key))
+
+    def _put(self, record):
+        with self._lock:
+            self._pending[record[1:5]] = record
+            if self._journal_file is not None:
+                pickle.dump(record, self._journal_file, 2)
+                self._journal_file.flush()
+            size = len(self._pending)
+        if size >= self.batch_size:
+            self._wake.set()
+
+    @staticmethod
+    def _apply(session, record):
+        cls = DATA_CLASSES[record[1]]
+        if record[0] == MERGE:
+            session.merge(_restore(record[1], record[5]))
+        else:
+            session.query(cls).filter(
+                getattr(cls, "gateway") == record[2],
+                getattr(cls, "account") == record[3],
+                getattr(cls, record[5]) == record[4],
+            ).delete()
+
+    def flush(self):
+        """
+        Write all queued operations in one transaction.
+
+        Returns:
+            int: number of records written
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, OrderedDict()
+                if self._journal_file is not None and pending:
+                    self._rotate()
+            if not pending:
+                return 0
+
+            session = self.engine.session
+            try:
+                for record in pending.values():
+                    self._apply(session, record)
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                logging.error("Write-behind persistence failed: %s", e)
+                with self._lock:  # keep them for the next try, newer operations win
+                    for key, value in pending.items():
+                        if key not in self._pending:
+                            self._pending[key] = value
+                return 0
+
+            if self.journal and os.path.exists(self._committing):
+                os.remove(self._committing)
+            return len(pending)
+
+    def _rotate(self):
+        # journal of queued operations moves to the committing file, appended to what is left
+        # there by a failed write
+        self._journal_file.close()
+        with open(self.journal, "rb") as src:
+            content = src.read()
+        with open(self._committing, "ab") as dst:
+            dst.write(content)
+        self._journal_file = open(self.journal, "wb")
+
+    def _run(self):
+        while self._running:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+        self.engine.scoped_session.remove()
+
+    def stop(self):
+        """
+        Stop the background thread and write everything left.
+        """
+        self._running = False
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        if self._journal_file is not None:
+            self._journal_file.close()
+            self._journal_file = None
+            if not self._pending:
+                for path in (self.journal, self._committing):
+                    if os.path.exists(path):
+                        os.remove(path)
+
+
+class WriteBehindDao(MemoryDao):
+    """
+    Dao whose in-memory state is authoritative, changes are written to database
+    in background by WriteBehindWriter. The state is loaded from database once when created.
+    """
+
+    def __init__(self, engine, dao, cls, key):
+        """
+
+        Args:
+            engine(fxdayu.models.dao.engine.PersistenceEngine): engine with a writer
+            dao: dao reading database, e.g. PositionDataDaoSqlAlchemy
+            cls(type): data class
+            key(str): attribute identifying a data object in an account
+        """
+        super(WriteBehindDao, self).__init__(engine)
+        self.KEY = key
+        self.cls = cls
+        session = engine.session
+        for data in dao.find_all(session):
+            MemoryDao.insert(self, data)
+        session.expunge_all()
+
+    @staticmethod
+    def match(url):
+        return False
+
+    def insert(self, data, session=None):
+        super(WriteBehindDao, self).insert(data)
+        self.engine.writer.merge(data, self.KEY)
+
+    def insert_many(self, items, session=None):
+        writer = self.engine.writer
+        for data in items:
+            MemoryDao.insert(self, data)
+            writer.merge(data, self.KEY)
+
+    def delete(self, gateway, account, key, session=None):
+        super(WriteBehindDao, self).delete(gateway, account, key)
+        self.engine.writer.delete(self.cls, gateway, account, self.KEY, key)
@@ -177,6 +177,9 @@ class AccountHandler(HandlerCompose, ContextMixin):
             self.account = IBAccountGroup(main_id)
         self._account.add(child_id, account)
 
+    def reset(self):
+        self._account = None
+
     @property
     def account(self):
         return self._account
@@ -3,16 +3,18 @@
 import copy
 from collections import OrderedDict
 
+import numpy as np
 import pandas as pd
 
 from fxdayu.const import OrderStatus
 from fxdayu.context import ContextMixin
 from fxdayu.engine.handler import HandlerCompose, Handler
-from fxdayu.event import EVENTS, OrderEvent, CancelEvent
+from fxdayu.event import EVENTS, OrderEvent, OrderBatchEvent, CancelEvent
 from fxdayu.models.data import Security, ExecutionData
 from fxdayu.models.order import OrderStatusData, OrderReq, CancelReq
 from fxdayu.models.proxy import OrderProxy, OrderSenderMixin
 from fxdayu.modules.order.style import *
+from fxdayu.modules.portfolio.recorder import close_prices
 from fxdayu.utils.api_support import api_method
 
 
@@ -30,6 +32,7 @@ class OrderStatusHandler(HandlerCompose, ContextMixin, OrderSenderMixin):
         self._order_proxies = {}
         self._client_ord_id = 0
         self._handlers["on_order"] = Handler(self.on_order, EVENTS.ORDER, topic="", priority=0)
+        self._handlers["on_orders"] = Handler(self.on_orders, EVENTS.ORDERS, topic="", priority=0)
         self._handlers["on_execution"] = Handler(self.on_execution, EVENTS.EXECUTION, topic=".", priority=-100)
         self._handlers["on_order_status"] = Handler(self.on_order_status, EVENTS.ORD_STATUS, topic=".", priority=-100)
 
@@ -40,6 +43,11 @@ class OrderStatusHandler(HandlerCompose, ContextMixin, OrderSenderMixin):
         self._execution_dao = self._persistence.get_dao(ExecutionData)
         self._adapter = OrderReqAdapter(self.context, self.environment)
 
+    def reset(self):
+        self._open_orders = {}
+        self._order_proxies = {}
+        self._client_ord_id = 0
+
     @property
     def next_ord_id(self):
         self._client_ord_id += 1
@@ -62,7 +70,34 @@ class OrderStatusHandler(HandlerCompose, ContextMixin, OrderSenderMixin):
         Returns:
 
         """
-        order = event.data
+        status = self._accept(event.data)
+        if status is not None:
+            self._order_status_dao.insert(status)
+            self._orders_dao.insert(event.data)
+        else:
+            pass  # TODO warning Order send failed
+
+    def on_orders(self, event, kwargs=None):
+        """
+        Args:
+            event(fxdayu.event.OrderBatchEvent): batch of orders
+            kwargs(dict): other optional parameters
+
+        Returns:
+            None
+        """
+        orders = [order for order in event.data if order.clOrdID]
+        statuses = [self._accept(order) for order in orders]
+        self._order_status_dao.insert_many(statuses)
+        self._orders_dao.insert_many(orders)
+
+    def _accept(self, order):
+        """
+        Create status and proxy of a new order.
+
+        Returns:
+            fxdayu.models.order.OrderStatusData: None if the order has no clOrdID
+        """
         if order.clOrdID:
             status = OrderStatusData()
             status.exchange = order.exchange
@@ -77,15 +112,12 @@ class OrderStatusHandler(HandlerCompose, ContextMixin, OrderSenderMixin):
             status.gateway = order.gateway
             status.account = order.account
             status.orderTime = self.context.current_time
-            self._order_status_dao.insert(status)
-            self._orders_dao.insert(order)
             order_proxy = OrderProxy(order, status, self)
             self._order_proxies[order.gClOrdID] = order_proxy
             if order.symbol not in self._open_orders:
                 self._open_orders[order.symbol] = OrderedDict()
             self._open_orders[order.symbol][order.gClOrdID] = order_proxy
-        else:
-            pass  # TODO warning Order send failed
+            return status
 
     def on_execution(self, event, kwargs=None):
         """
@@ -161,6 +193,10 @@ class OrderStatusHandler(HandlerCompose, ContextMixin, OrderSenderMixin):
         event = OrderEvent(order)
         self.engine.put(event)
 
+    def send_orders(self, orders):
+        if orders:
+            self.engine.put(OrderBatchEvent(orders))
+
     def _get_base_data(self, data, index="time", method="df"):
         if method == "df":
             if isinstance(data, dict):
@@ -366,6 +402,155 @@ class OrderStatusHandler(HandlerCompose, ContextMixin, OrderSenderMixin):
         else:
             self._miss_security()
 
+    def _batch(self, targets, unit, target, style=None):
+        """
+        Compute share deltas of a batch with arrays and send them in one OrderBatchEvent.
+        Prices of all securities are read with a single data query, securities whose price
+        is not available are skipped. Orders reducing a position are put before the others,
+        so that cash freed by them is available to the others.
+
+        Args:
+            targets(dict): {security: number}, security is a code or Security
+            unit(str): "amount", "value" or "percent", unit of numbers in targets
+            target(bool): whether numbers are target positions or changes of positions
+            style(fxdayu.modules.order.style.OrderStyle): style of all orders
+
+        Returns:
+            dict: {security: order id} of orders sent
+        """
+        keys, securities, numbers = [], [], []
+        for key, number in targets.items():
+            security = key if isinstance(key, Security) else self.environment.symbol(key)
+            if security:
+                keys.append(key)
+                securities.append(security)
+                numbers.append(number)
+            else:
+                self._miss_security()
+        if not securities:
+            return {}
+
+        numbers = np.array(numbers, dtype=np.float64)
+        if unit == "amount":
+            shares = np.trunc(numbers)
+        else:
+            if unit == "percent":
+                numbers = numbers * self.context.portfolio.portfolio_value
+            prices = close_prices(self.data, [security.symbol for security in securities])
+            point_values = np.array([getattr(security, "point_value", 1) for security in securities],
+                                    dtype=np.float64)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                shares = np.trunc(numbers / prices / point_values)
+            shares[numbers == 0] = 0  # targets of 0 don't need a price
+
+        positions = self.context.portfolio.positions
+        volumes = np.array([getattr(positions.get(security.symbol), "volume", 0) for security in securities],
+                           dtype=np.float64)
+        if target:
+            shares = shares - volumes
+
+        orders, ids = [], {}
+        # stable sort, reducing orders first and the others in the order of targets
+        for i in np.argsort(~(shares * volumes < 0), kind="mergesort"):
+            key, security, delta = keys[i], securities[i], shares[i]
+            if delta != delta or delta == 0:
+                continue
+            order = self._make_order_req(security, int(delta), style if style else MarketOrder())
+            if order:
+                orders.append(order)
+                ids[key] = order.gClOrdID
+            else:
+                self._miss_security()
+        self.send_orders(orders)
+        return ids
+
+    @api_method
+    def order_batch(self, amounts, style=None):
+        """
+        批量下单，所有订单在一个事件中发送。
+
+        Args:
+            amounts(dict): {证券: 交易手数}，正值意味着买入，负值意味着卖出。
+            style(fxdayu.modules.order.style.OrderStyle): (可选)所有订单的样式，默认值为市价订单。
+
+        Returns:
+            dict: {证券: 订单ID}
+        """
+        return self._batch(amounts, "amount", False, style)
+
+    @api_method
+    def order_target_batch(self, targets, style=None):
+        """
+        批量调整到目标手数，所有订单在一个事件中发送。
+
+        Args:
+            targets(dict): {证券: 目标手数}
+            style(fxdayu.modules.order.style.OrderStyle): (可选)所有订单的样式，默认值为市价订单。
+
+        Returns:
+            dict: {证券: 订单ID}
+        """
+        return self._batch(targets, "amount", True, style)
+
+    @api_method
+    def order_value_batch(self, values, style=None):
+        """
+        批量按价值下单，所有订单在一个事件中发送。
+
+        Args:
+            values(dict): {证券: 价值}，正值意味着买入，负值意味着卖出。
+            style(fxdayu.modules.order.style.OrderStyle): (可选)所有订单的样式，默认值为市价订单。
+
+        Returns:
+            dict: {证券: 订单ID}
+        """
+        return self._batch(values, "value", False, style)
+
+    @api_method
+    def order_target_value_batch(self, targets, style=None):
+        """
+        批量调整到目标头寸价值，所有订单在一个事件中发送。
+
+        Args:
+            targets(dict): {证券: 目标头寸价值}
+            style(fxdayu.modules.order.style.OrderStyle): (可选)所有订单的样式，默认值为市价订单。
+
+        Returns:
+            dict: {证券: 订单ID}
+        """
+        return self._batch(targets, "value", True, style)
+
+    @api_method
+    def order_percent_batch(self, percents, style=None):
+        """
+        批量按账户净值百分比下单，所有订单在一个事件中发送。
+
+        Args:
+            percents(dict): {证券: 百分比}，正值意味着买入，负值意味着卖出。
+            style(fxdayu.modules.order.style.OrderStyle): (可选)所有订单的样式，默认值为市价订单。
+
+        Returns:
+            dict: {证券: 订单ID}
+        """
+        return self._batch(percents, "percent", False, style)
+
+    @api_method
+    def order_target_percent_batch(self, targets, style=None):
+        """
+        批量调整到目标头寸占账户净值的百分比，所有订单在一个事件中发送。
+
+        Args:
+            targets(dict): {证券: 目标百分比}
+            style(fxdayu.modules.order.style.OrderStyle): (可选)所有订单的样式，默认值为市价订单。
+
+        Examples:
+            order_target_percent_batch({'000001': 0.3, '000002': 0.3, '600000': 0})
+
+        Returns:
+            dict: {证券: 订单ID}
+        """
+        return self._batch(targets, "percent", True, style)
+
     @api_method
     def cancel_order(self, order):
         if isinstance(order, OrderReq):
@@ -387,6 +572,12 @@ class OrderStatusHandler(HandlerCompose, ContextMixin, OrderSenderMixin):
         self.environment["order_target_value"] = self.order_target_value
         self.environment["order_percent"] = self.order_percent
         self.environment["order_target_percent"] = self.order_target_percent
+        self.environment["order_batch"] = self.order_batch
+        self.environment["order_target_batch"] = self.order_target_batch
+        self.environment["order_value_batch"] = self.order_value_batch
+        self.environment["order_target_value_batch"] = self.order_target_value_batch
+        self.environment["order_percent_batch"] = self.order_percent_batch
+        self.environment["order_target_percent_batch"] = self.order_target_percent_batch
         self.environment["cancel_order"] = self.cancel_order
         self.environment["get_order_status"] = self.get_order_status
 
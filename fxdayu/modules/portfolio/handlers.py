@@ -11,6 +11,7 @@ from fxdayu.engine.handler import HandlerCompose, Handler
 from fxdayu.event import EVENTS
 from fxdayu.models.data import PositionData
 from fxdayu.models.order import OrderStatusData
+from fxdayu.modules.portfolio.recorder import EquityRecorder, close_prices
 from fxdayu.utils.api_support import callback_method
 
 STAGE = {
@@ -70,6 +71,7 @@ class PortfolioHandler(HandlerCompose, ContextMixin, InitializeMixin):
         }
         if self._mode == self.MODE.STRATEGY:
             self._handlers["on_order"] = Handler(self.on_order, EVENTS.ORDER, priority=-100)
+            self._handlers["on_orders"] = Handler(self.on_orders, EVENTS.ORDERS, priority=-100)
             self._handlers["on_cancel"] = Handler(self.on_cancel, EVENTS.CANCEL, priority=-100)
         else:
             self._handlers["on_order_status"] = Handler(self.on_order_status, EVENTS.ORD_STATUS, topic="", priority=100)
@@ -77,8 +79,8 @@ class PortfolioHandler(HandlerCompose, ContextMixin, InitializeMixin):
         self._handlers['on_time'] = Handler(self.on_time, EVENTS.TIME, topic="bar.close", priority=150)
 
         # back_test
-        self._history_positions = []
-        self._info = []
+        self._recorder = EquityRecorder()
+        self._price_symbols = {}
 
         self._capital_used = EMPTY_FLOAT
         self._positions_value = EMPTY_FLOAT
@@ -93,6 +95,16 @@ class PortfolioHandler(HandlerCompose, ContextMixin, InitializeMixin):
         self._persistence = self.environment["persistence"]
         self._position_dao = self._persistence.get_dao(PositionData)
         self._order_status_dao = self._persistence.get_dao(OrderStatusData)
+        for position in self._position_dao.find_all():
+            self._recorder.set_volume(position.symbol, position.volume - position.frozenVolume,
+                                      (position.gateway, position.account))
+
+    def reset(self):
+        self._recorder.clear()
+        self._capital_used = EMPTY_FLOAT
+        self._positions_value = EMPTY_FLOAT
+        self._cash = self._starting_cash
+        self._margin = EMPTY_FLOAT
 
     @staticmethod
     def get_sign(n):
@@ -141,6 +153,27 @@ class PortfolioHandler(HandlerCompose, ContextMixin, InitializeMixin):
         position.avgPrice = 0  # avgPrice 暂时不可用
         return position
 
+    def _save_position(self, position):
+        self._position_dao.insert(position)
+        self._recorder.set_volume(position.symbol, position.volume - position.frozenVolume,
+                                  (position.gateway, position.account))
+
+    def _delete_position(self, gateway, account, symbol):
+        self._position_dao.delete(gateway, account, symbol)
+        self._recorder.set_volume(symbol, 0, (gateway, account))
+
+    def _close_prices(self, symbols):
+        """
+        Close prices of position symbols at current time, with one vectorized data query.
+        """
+        price_symbols = []
+        for symbol in symbols:
+            price_symbol = self._price_symbols.get(symbol, None)
+            if price_symbol is None:
+                price_symbol = self._price_symbols[symbol] = self.environment.symbol(symbol).symbol
+            price_symbols.append(price_symbol)
+        return close_prices(self.data, price_symbols)
+
     def _close_position(self, position):
         """
 
@@ -172,7 +205,22 @@ class PortfolioHandler(HandlerCompose, ContextMixin, InitializeMixin):
         Returns:
             None
         """
-        order = event.data
+        self._freeze(event.data)
+
+    def on_orders(self, event, kwargs=None):
+        """
+
+        Args:
+            event(fxdayu.event.OrderBatchEvent):
+            kwargs:
+
+        Returns:
+            None
+        """
+        for order in event.data:
+            self._freeze(order)
+
+    def _freeze(self, order):
         status = self.environment.get_order_status(order.gClOrdID)
         sign = MAP_DIRECTION_SIGN[Direction(status.side)]
         position = self._position_dao.find(status.gateway, status.account, status.symbol)
@@ -180,7 +228,7 @@ class PortfolioHandler(HandlerCompose, ContextMixin, InitializeMixin):
             position = self._empty_position(status.symbol, status)
         position.volume += status.orderQty * sign
         position.frozenVolume += status.leavesQty * sign
-        self._position_dao.insert(position)
+        self._save_position(position)
 
     def on_cancel(self, event, kwargs=None):
         order = event.data
@@ -191,7 +239,7 @@ class PortfolioHandler(HandlerCompose, ContextMixin, InitializeMixin):
             position = self._empty_position(status.symbol, status)
         position.volume -= (status.orderQty - status.cumQty) * sign
         position.frozenVolume -= (status.orderQty - status.cumQty) * sign
-        self._position_dao.insert(position)
+        self._save_position(position)
 
     # deprecated
     def on_position(self, event, kwargs=None):
@@ -210,7 +258,7 @@ class PortfolioHandler(HandlerCompose, ContextMixin, InitializeMixin):
             return
         position.sid = security.sid
         self._trans_position(position)
-        self._position_dao.insert(position)
+        self._save_position(position)
 
     def on_order_status(self, event, kwargs=None):
         """
@@ -239,7 +287,7 @@ class PortfolioHandler(HandlerCompose, ContextMixin, InitializeMixin):
                 position = self._empty_position(sid, new)
             position.volume += new.orderQty * sign
             position.frozenVolume += new.leavesQty * sign
-            self._position_dao.insert(position)
+            self._save_position(position)
         # TODO 撤单回报走execution而不走status
         if OrderStatus(new.ordStatus) == OrderStatus.CANCELLED:
             position = self._position_dao.find(old.gateway, old.account, old.symbol)
@@ -247,7 +295,7 @@ class PortfolioHandler(HandlerCompose, ContextMixin, InitializeMixin):
                 position = self._empty_position(sid, new)
             position.volume -= (new.orderQty - new.cumQty) * sign
             position.frozenVolume -= (new.orderQty - new.cumQty) * sign
-            self._position_dao.insert(position)
+            self._save_position(position)
 
     def on_execution(self, event, kwargs=None):
         """
@@ -285,22 +333,15 @@ class PortfolioHandler(HandlerCompose, ContextMixin, InitializeMixin):
             self._cash -= execution.lastPx * last_qty
             position.frozenVolume -= last_qty
             if position.volume == 0 and position.frozenVolume == 0:
-                self._position_dao.delete(execution.gateway, execution.account,
-                                          execution.symbol)
+                self._delete_position(execution.gateway, execution.account, execution.symbol)
             else:
-                self._position_dao.insert(position)
+                self._save_position(position)
         elif self._exec_mode == self.EXECUTION_MODE.FIFO:
             # TODO 先开先平的结算
             pass
 
     def on_time(self, event, kwargs=None):
-        for sid, position in self.positions.items():
-            show = position.to_dict()
-            show["datetime"] = event.time
-            self._history_positions.append(show)
-        self._info.append(
-            {'datetime': event.time, 'cash': self.cash, 'equity': self.portfolio_value},
-        )
+        self._recorder.record(event.time, self.cash, self.portfolio_value)
 
     def on_exit(self, event, kwargs=None):
         # TODO 对待挂单的处理
@@ -328,12 +369,28 @@ class PortfolioHandler(HandlerCompose, ContextMixin, InitializeMixin):
 
     @property
     def portfolio_value(self):
-        return self._cash + sum([self._close_position(p) for p in self.positions.values()]) + self._margin
+        return self._cash + self._recorder.market_value(self._close_prices) + self._margin
 
     @property
     def positions_value(self):
         return sum([abs(p.volume - p.frozenVolume) * p.avgPrice for p in self.positions.values()])
 
+    @property
+    def last_equity(self):
+        """
+        Returns:
+            float: equity recorded on the last bar
+        """
+        return self._recorder.last_equity
+
+    @property
+    def drawdown(self):
+        """
+        Returns:
+            float: drawdown ratio of the equity recorded on the last bar from its highest level
+        """
+        return self._recorder.drawdown
+
     @property
     def returns(self):
         return self.portfolio_value / self._starting_cash
@@ -344,11 +401,21 @@ class PortfolioHandler(HandlerCompose, ContextMixin, InitializeMixin):
 
     @property
     def info(self):
-        return self._info
+        """
+        Returns:
+            pandas.DataFrame: cash and equity on every bar, columns are datetime, cash and equity
+        """
+        return self._recorder.frame()
 
     @property
     def history(self):
-        return self._history_positions
+        """
+        Holdings of a symbol in all accounts are summed.
+
+        Returns:
+            pandas.DataFrame: holding volume of every symbol on every bar, indexed by datetime
+        """
+        return self._recorder.holdings()
 
     def link_context(self):
         self.context.portfolio = self
@@ -0,0 +1,214 @@
+# encoding: utf-8
+import numpy as np
+import pandas as pd
+
+__all__ = ["EquityRecorder", "close_prices"]
+
+
+def close_prices(data, symbols):
+    """
+    Close prices of symbols at current time with a single data.current call.
+
+    Args:
+        data: data support, current(symbols) returns a DataFrame of fields x symbols
+            (MarketDataFreq) or symbols x fields (MultiPanelData)
+        symbols(list): symbols
+
+    Returns:
+        numpy.ndarray: close prices in the order of symbols
+    """
+    if not len(symbols):
+        return np.empty(0)
+    quotes = data.current(list(symbols))
+    if isinstance(quotes, pd.DataFrame):
+        if "close" in quotes.columns:
+            quotes = quotes["close"]
+        else:
+            quotes = quotes.loc["close"]
+    elif isinstance(quotes, pd.Series) and "close" in quotes.index:
+        return np.array([quotes["close"]], dtype=np.float64)
+    return np.asarray(quotes.reindex(list(symbols)).values, dtype=np.float64)
+
+
+class EquityRecorder(object):
+    """
+    Array backed recorder of the portfolio on every bar.
+
+    Cash and equity are recorded into preallocated columns, and holding of every symbol
+    into a dense (bar x symbol) matrix. Current holdings are kept per account and symbol, and
+    summed per symbol in a vector updated only when a position changes, so recording a bar costs O(symbols) no matter how long the
+    history is. Columns grow by doubling when full. The last valid price of every symbol
+    is kept to value holdings whose price is missing, e.g. during a halt.
+    """
+
+    def __init__(self, capacity=1024):
+        """
+
+        Args:
+            capacity(int): initial number of bars preallocated
+        """
+        self._capacity = max(int(capacity), 1)
+        self._times = np.empty(self._capacity, dtype="datetime64[ns]")
+        self._cash = np.empty(self._capacity)
+        self._equity = np.empty(self._capacity)
+        self._holdings = np.zeros((self._capacity, 0))
+        self._length = 0
+        self._symbols = []
+        self._columns = {}
+        self._volumes = np.zeros(0)
+        self._held = {}  # (account, symbol) -> volume
+        self._prices = np.zeros(0)
+        self._peak = np.nan
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def symbols(self):
+        return self._symbols
+
+    def _column(self, symbol):
+        column = self._columns.get(symbol, None)
+        if column is None:
+            column = self._columns[symbol] = len(self._symbols)
+            self._symbols.append(symbol)
+            self._volumes = np.append(self._volumes, 0.0)
+            self._prices = np.append(self._prices, np.nan)
+            if column >= self._holdings.shape[1]:
+                holdings = np.zeros((self._capacity, max(2 * self._holdings.shape[1], 8)))
+                holdings[:, :self._holdings.shape[1]] = self._holdings
+                self._holdings = holdings
+        return column
+
+    def set_volume(self, symbol, volume, account=None):
+        """
+        Set current holding of a symbol in an account, called when its position changes.
+        Holdings of the same symbol in different accounts are summed.
+
+        Args:
+            symbol(str): symbol
+            volume(float): traded volume, negative for short
+            account: key of the account holding the position, e.g. (gateway, account)
+
+        Returns:
+            None
+        """
+        column = self._column(symbol)
+        key = (account, symbol)
+        self._volumes[column] += volume - self._held.get(key, 0)
+        if volume:
+            self._held[key] = volume
+        else:
+            self._held.pop(key, None)
+
+    def volumes(self):
+        """
+        Returns:
+            tuple: (symbols, holdings) of symbols currently held
+        """
+        held = np.flatnonzero(self._volumes)
+        return [self._symbols[i] for i in held], self._volumes[held]
+
+    def market_value(self, prices):
+        """
+        Holdings whose price is nan are valued at their last valid price,
+        holdings never priced are valued at 0.
+
+        Args:
+            prices(function): prices(symbols) -> numpy.ndarray of prices
+
+        Returns:
+            float: market value of current holdings
+        """
+        held = np.flatnonzero(self._volumes)
+        if not len(held):
+            return 0.0
+        current = np.asarray(prices([self._symbols[i] for i in held]), dtype=np.float64)
+        last = self._prices[held]
+        valid = ~np.isnan(current)
+        last[valid] = current[valid]
+        self._prices[held] = last
+        return float(np.nansum(last * self._volumes[held]))
+
+    def clear(self):
+        """
+        Drop recorded bars and current holdings, preallocated columns and known symbols are kept
+        for the next backtest.
+
+        Returns:
+            None
+        """
+        self._length = 0
+        self._volumes[:] = 0
+        self._held.clear()
+        self._prices[:] = np.nan
+        self._peak = np.nan
+
+    @property
+    def last_equity(self):
+        """
+        Returns:
+            float: equity recorded on the latest bar, nan if none recorded
+        """
+        if not self._length:
+            return np.nan
+        return float(self._equity[self._length - 1])
+
+    @property
+    def drawdown(self):
+        """
+        Returns:
+            float: drawdown ratio of the latest equity from the highest recorded one, 0 if none recorded
+        """
+        if not self._length or not self._peak > 0:
+            return 0.0
+        return 1 - self._equity[self._length - 1] / self._peak
+
+    def _grow(self):
+        capacity = self._capacity * 2
+        for name in ("_times", "_cash", "_equity"):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self._length] = old[:self._length]
+            setattr(self, name, new)
+        holdings = np.zeros((capacity, self._holdings.shape[1]))
+        holdings[:self._length] = self._holdings[:self._length]
+        self._holdings = holdings
+        self._capacity = capacity
+
+    def record(self, time, cash, equity):
+        """
+        Record cash, equity and current holdings of a bar.
+
+        Returns:
+            None
+        """
+        if self._length == self._capacity:
+            self._grow()
+        i = self._length
+        self._times[i] = np.datetime64(pd.Timestamp(time).to_datetime64(), "ns")
+        self._cash[i] = cash
+        self._equity[i] = equity
+        self._holdings[i, :len(self._volumes)] = self._volumes
+        self._length += 1
+        if not equity <= self._peak:
+            self._peak = equity
+
+    def frame(self):
+        """
+        Returns:
+            pandas.DataFrame: columns datetime, cash and equity
+        """
+        n = self._length
+        return pd.DataFrame({"datetime": self._times[:n], "cash": self._cash[:n], "equity": self._equity[:n]},
+                            columns=["datetime", "cash", "equity"])
+
+    def holdings(self):
+        """
+        Returns:
+            pandas.DataFrame: holding of every symbol on every bar, indexed by datetime
+        """
+        n = self._length
+        return pd.DataFrame(self._holdings[:n, :len(self._symbols)],
+                            index=pd.DatetimeIndex(self._times[:n], name="datetime"),
+                            columns=list(self._symbols))
@@ -9,6 +9,14 @@ class TimeSimulation(ContextMixin):
         self.engine = engine
         self._ahead = []
         self._behind = []
+        self._schedules = []
+
+    def reset(self):
+        for schedule, topic in self._schedules:
+            self.engine.unregister(schedule, EVENTS.SCHEDULE, topic)
+        self._schedules = []
+        self._ahead = []
+        self._behind = []
 
     def link_context(self):
         self.environment['time_schedule'] = self.time_schedule
@@ -20,39 +28,47 @@ class TimeSimulation(ContextMixin):
         else:
             self._behind.append((func, time_rule))
 
-    def put_ahead(self):
-        head = 'ahead'
-        count = 0
-        for func, time_rule in self._ahead:
+    def _register_ruled(self, head, ruled):
+        topics = []
+        for count, (func, time_rule) in enumerate(ruled):
             topic = head + str(count)
-            self.put_ruled(func, time_rule, topic)
-            count += 1
-
-    def put_ruled(self, func, time_rule, topic):
-        for time_ in self.data.all_time:
-            if time_rule(time_):
-                self.engine.put(ScheduleEvent(time_, topic))
+            self.register_schedule(func, topic)
+            topics.append((topic, time_rule))
+        return topics
 
+    def register_schedule(self, func, topic):
         def schedule(event, kwargs=None):
             func(self.context, self.data)
 
         self.engine.register(schedule, EVENTS.SCHEDULE, topic)
+        self._schedules.append((schedule, topic))
 
-    def put_behind(self):
-        head = 'behind'
-        count = 0
-        for func, time_rule in self._behind:
-            topic = head + str(count)
-            self.put_ruled(func, time_rule, topic)
-            count += 1
+    def time_source(self, ahead=(), behind=()):
+        """
+        Generator of all the time events of a backtest, events are created when the
+        engine asks for them instead of being put into the queue all at once.
+        Within the same time, events are yielded in order: ahead schedules, bar.open,
+        bar.close, behind schedules, which is what the engine merges by.
+
+        Args:
+            ahead(list): list of (topic, time_rule) scheduled before the bar
+            behind(list): list of (topic, time_rule) scheduled after the bar
 
-    def put_main(self):
+        Returns:
+            generator: sorted events, end with an ExitEvent
+        """
         for time_ in self.data.all_time:
-            self.engine.put(TimeEvent(time_, "bar.open"))
-            self.engine.put(TimeEvent(time_, "bar.close"))
-        self.engine.put(ExitEvent())
+            for topic, time_rule in ahead:
+                if time_rule(time_):
+                    yield ScheduleEvent(time_, topic)
+            yield TimeEvent(time_, "bar.open")
+            yield TimeEvent(time_, "bar.close")
+            for topic, time_rule in behind:
+                if time_rule(time_):
+                    yield ScheduleEvent(time_, topic)
+        yield ExitEvent()
 
     def put_time(self):
-        self.put_ahead()
-        self.put_main()
-        self.put_behind()
+        ahead = self._register_ruled('ahead', self._ahead)
+        behind = self._register_ruled('behind', self._behind)
+        self.engine.put_source(self.time_source(ahead, behind))
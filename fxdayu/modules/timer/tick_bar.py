@@ -0,0 +1,241 @@
+# encoding:utf-8
+from datetime import datetime, timedelta
+from threading import Event, Thread
+
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+
+from fxdayu.context import ContextMixin
+from fxdayu.data.bar_store import BAR_FIELDS, make_panel, to_nanosecond
+from fxdayu.data.ring_buffer import BarRing
+from fxdayu.engine.handler import HandlerCompose, Handler
+from fxdayu.event import EVENTS, BarEvent, TimeEvent, ScheduleEvent
+
+TICK_TIME_FORMATS = ("%Y%m%d %H:%M:%S.%f", "%Y%m%d %H:%M:%S")
+FLUSH_TOPIC = "tick_bar.flush"
+
+
+def frequency_nanos(frequency):
+    """
+    Length of a fixed frequency in nanoseconds, e.g. "1min", "5min", "H".
+
+    Raises:
+        ValueError: frequency isn't of fixed length, such as "W" or "M"
+    """
+    return to_offset(frequency).nanos
+
+
+def tick_time(tick, default=None):
+    """
+    Exchange time of a tick from its date and time, default is returned if they can't be parsed.
+    """
+    if tick.date and tick.time:
+        text = "%s %s" % (tick.date, tick.time)
+        for fmt in TICK_TIME_FORMATS:
+            try:
+                return datetime.strptime(text, fmt)
+            except ValueError:
+                continue
+    return default
+
+
+class _Bar(object):
+    __slots__ = ["end", "open", "high", "low", "close", "start_volume", "volume"]
+
+    def __init__(self, end, price, start_volume, volume):
+        self.end = end
+        self.open = price
+        self.high = price
+        self.low = price
+        self.close = price
+        self.start_volume = start_volume
+        self.volume = volume - start_volume
+
+    def update(self, price, volume):
+        if price > self.high:
+            self.high = price
+        elif price < self.low:
+            self.low = price
+        self.close = price
+        self.volume = volume - self.start_volume
+
+
+class TickBarAggregator(HandlerCompose, ContextMixin):
+    """
+    实时行情中由TickEvent增量合成多个周期的bar。
+
+    每个品种每个周期维护一根正在合成的bar，bar区间为(end-frequency, end]，
+    以end作为bar的时间。当某品种收到超出当前bar区间的tick，或者最小周期进入新区间时，
+    已完成的bar以BarEvent(topic为周期)推送，最小周期进入新区间时再推送bar.open和bar.close
+    的TimeEvent，因此可以代替RealTimer驱动策略。
+
+    已完成的bar按品种和周期保存在内存中，数据模块可以通过history直接读取，不必经过Redis。
+
+    午休和收盘前的最后一根bar之后没有新的tick，设置interval后由计时线程每隔interval秒
+    推送一次ScheduleEvent，在引擎线程中以当前时间减去delay调用flush，收盘时的bar在delay秒后推送。
+    已经被flush的区间内迟到的tick不再合成bar，其成交量计入下一根bar。
+    """
+
+    def __init__(self, engine, frequencies=("1min",), capacity=1000, put_time=True, interval=None, delay=5):
+        """
+
+        Args:
+            engine(fxdayu.engine.Engine): 事件引擎
+            frequencies(list|tuple): 需要合成的周期，必须是固定长度的周期，第一个为基础周期
+            capacity(int): 每个品种每个周期在内存中保留的已完成bar数量
+            put_time(bool): 是否在基础周期结束时推送TimeEvent
+            interval(float): 定时flush的间隔秒数，默认为None，即只在收到新tick时推送bar
+            delay(float): 定时flush时等待迟到tick的秒数，本地时钟和交易所时间的偏差也应计入
+        """
+        super(TickBarAggregator, self).__init__(engine)
+        ContextMixin.__init__(self)
+        self.frequencies = list(frequencies)
+        self._nanos = [frequency_nanos(f) for f in self.frequencies]
+        self._base = self._nanos[0]
+        self.capacity = capacity
+        self.put_time = put_time
+        self._open = {}  # (symbol, nanos) -> _Bar
+        self._bars = {}  # (symbol, nanos) -> BarRing
+        self._volumes = {}  # symbol -> last cumulative volume
+        self._base_end = None
+        self._flushed = None
+        self.interval = interval
+        self.delay = timedelta(seconds=delay)
+        self._stopped = Event()
+        self._thread = None
+        self._handlers["on_tick"] = Handler(self.on_tick, EVENTS.TICK, topic="", priority=100)
+        self._handlers["on_flush"] = Handler(self.on_flush, EVENTS.SCHEDULE, topic=FLUSH_TOPIC)
+
+    def init(self):
+        attach = getattr(self.data, "attach_bars", None)
+        if attach is not None:
+            attach(self)
+        if self.interval and self._thread is None:
+            self._stopped.clear()
+            self._thread = Thread(target=self._run_timer)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stop the flush timer thread.
+
+        Returns:
+            None
+        """
+        if self._thread is not None:
+            self._stopped.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run_timer(self):
+        while not self._stopped.wait(self.interval):
+            self.engine.put(ScheduleEvent(datetime.now() - self.delay, topic=FLUSH_TOPIC))
+
+    def on_flush(self, event, kwargs=None):
+        self.flush(event.time)
+
+    def link_context(self):
+        pass
+
+    @staticmethod
+    def _end(t, nanos):
+        return -(-t // nanos) * nanos
+
+    def on_tick(self, event, kwargs=None):
+        tick = event.data
+        t = to_nanosecond(tick_time(tick, event.time))
+
+        base_end = self._end(t, self._base)
+        if self._flushed is not None and base_end < self._flushed:
+            return
+        if self._base_end is None or base_end > self._base_end:
+            self.flush(t)
+            self._base_end = base_end
+
+        self._update(tick.symbol, tick.lastPrice, tick.volume, tick.lastVolume, t)
+
+    def _update(self, symbol, price, volume, last_volume, t):
+        previous = self._volumes.get(symbol, None)
+        if previous is None or volume < previous:
+            previous = max(volume - last_volume, 0)
+        self._volumes[symbol] = volume
+
+        for nanos, frequency in zip(self._nanos, self.frequencies):
+            key = (symbol, nanos)
+            bar = self._open.get(key, None)
+            if bar is not None and t <= bar.end:
+                bar.update(price, volume)
+            else:
+                if bar is not None:
+                    self._close(symbol, nanos, frequency, bar)
+                self._open[key] = _Bar(self._end(t, nanos), price, previous, volume)
+
+    def flush(self, t):
+        """
+        Close all bars which end before t, and put TimeEvent at the end of the base bar.
+        Called when a tick of the next base bar arrives, or by the flush timer.
+
+        Args:
+            t(int | datetime): current time
+
+        Returns:
+            None
+        """
+        t = to_nanosecond(t)
+        if self._flushed is None or t > self._flushed:
+            self._flushed = t
+        for nanos, frequency in zip(self._nanos, self.frequencies):
+            for (symbol, n), bar in list(self._open.items()):
+                if n == nanos and bar.end < t:
+                    self._close(symbol, nanos, frequency, bar)
+                    del self._open[(symbol, n)]
+
+        if self._base_end is not None and self._base_end < t:
+            if self.put_time:
+                time = pd.Timestamp(self._base_end).to_pydatetime()
+                self.engine.put(TimeEvent(time, topic="bar.open"))
+                self.engine.put(TimeEvent(time, topic="bar.close"))
+            self._base_end = None
+
+    def _close(self, symbol, nanos, frequency, bar):
+        time = pd.Timestamp(bar.end).to_pydatetime()
+        bars = self._bars.get((symbol, nanos), None)
+        if bars is None:
+            bars = self._bars[(symbol, nanos)] = BarRing(self.capacity, BAR_FIELDS)
+        bars.append(bar.end, (bar.open, bar.high, bar.low, bar.close, bar.volume))
+        self.engine.put(BarEvent(symbol, time, bar.open, bar.high, bar.low, bar.close, bar.volume,
+                                 topic=frequency))
+
+    def history(self, symbol, frequency=None, fields=None, length=None):
+        """
+        从内存读取已完成的bar
+
+        Args:
+            symbol(str | list): 品种
+            frequency(str): 周期，默认为基础周期
+            fields(str | list): 字段
+            length(int): 数量，默认为全部
+
+        Returns:
+            pandas.DataFrame | pandas.Panel | None: 周期未合成或bar数量不足length时返回None
+        """
+        if isinstance(symbol, (list, tuple)):
+            frames = {}
+            for s in symbol:
+                frame = self.history(s, frequency, fields, length)
+                if frame is None:
+                    return None
+                frames[s] = frame
+            return make_panel(frames)
+
+        try:
+            nanos = frequency_nanos(frequency) if frequency else self._base
+        except ValueError:
+            return None
+        bars = self._bars.get((symbol, nanos), None)
+        if bars is None or (length and len(bars) < length):
+            return None
+        if isinstance(fields, str):
+            fields = [fields]
+        return bars.frame(length, fields)
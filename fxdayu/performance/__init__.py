@@ -1,2 +1,5 @@
 from ._performance import *
 from ._performance import __all__
+from .stream import StreamingMetrics
+
+__all__ = __all__ + ["StreamingMetrics"]
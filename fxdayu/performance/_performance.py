@@ -144,8 +144,20 @@ class Performance(object):
         self._update(value * base + base)
 
     def set_orders(self, orders):
+        """
+
+        Args:
+            orders(pandas.DataFrame | function): orders, or a function returning them
+                which is called when orders are used for the first time
+        """
         self._orders = orders
 
+    @property
+    def orders(self):
+        if callable(self._orders):
+            self._orders = self._orders()
+        return self._orders
+
     def set_currency(self, currency):
         self._currency = currency
 
@@ -393,6 +405,31 @@ class OrderAnalysis(WindowFactorPerformance):
     def __init__(self):
         super(OrderAnalysis, self).__init__()
         self._units = {}
+        self._metrics = None
+
+    def set_metrics(self, metrics):
+        """
+        Take strategy_summary, risk_indicator and trade_summary_all from metrics accumulated
+        during the backtest instead of computing them from equity and orders. All are read at once,
+        so later updates or reset of metrics don't change this performance.
+
+        Args:
+            metrics(fxdayu.performance.stream.StreamingMetrics): metrics of the backtest
+        """
+        summary = pd.DataFrame(OrderedDict(
+            (name, metrics.trade_summary(direction))
+            for name, direction in ((u"全部", None), (u"多头", 1), (u"空头", -1))
+        ), dtype=object)
+        for field in (u"总持仓时间", u"平均持仓时间"):
+            summary.loc[field] = pd.to_timedelta(summary.loc[field]).astype(str)
+        if metrics.first_fill is not None:
+            summary.loc[u"交易天数"] = [_workdays(metrics.first_fill, metrics.last_fill), np.nan, np.nan]
+        self._metrics = {
+            "strategy_summary": metrics.strategy_summary(),
+            "risk_indicator": metrics.risk_indicator(),
+            "trade_summary_all": summary,
+        }
+        self._count += 1
 
     def _update_units(self, d):
         for key, value in d.items():
@@ -410,11 +447,12 @@ class OrderAnalysis(WindowFactorPerformance):
     @property
     @lru_cache()
     def order_details(self):
-        self._orders["报单编号"] = self._orders["报单编号"].astype(int)
-        self._orders["手续费"] = self._orders.get("手续费", default=0)
-        self._orders["整点价值"] = self._orders.get("整点价值", default=1)
-        self._orders["杠杆"] = self._orders.get("杠杆", default=1)
-        df = self._orders[["报单编号", "合约", "买卖", "开平", "报单状态", "报单价格", "报单数", "未成交数",
+        orders = self.orders
+        orders["报单编号"] = orders["报单编号"].astype(int)
+        orders["手续费"] = orders.get("手续费", default=0)
+        orders["整点价值"] = orders.get("整点价值", default=1)
+        orders["杠杆"] = orders.get("杠杆", default=1)
+        df = orders[["报单编号", "合约", "买卖", "开平", "报单状态", "报单价格", "报单数", "未成交数",
                            "成交数", "报单时间", "最后成交时间", "撤销时间", "成交均价", "手续费", "整点价值", "杠杆", "交易所"]]
 
         return df
@@ -452,27 +490,27 @@ class OrderAnalysis(WindowFactorPerformance):
         for ticker, orders in df.groupby("合约"):
             temp = pd.DataFrame(index=orders.index)
             temp["持仓数量"] = (orders["成交数"] * orders["买卖"].apply(side2sign)).cumsum()
-            temp["持仓方向"] = (temp["持仓数量"] >= 0).apply(sign2direction)
+            temp["持仓方向"] = temp["持仓数量"].apply(sign2direction)
             market_values = []
             position_avx_prices = []
             profits = []
             market_value = 0
             position_avx_price = 0
             last_volume = 0
-            for _, direction, volume in zip(orders.iterrows(), temp["持仓方向"].values, temp["持仓数量"].values):
+            columns = [orders[field].values for field in ("买卖", "成交数", "成交均价", "整点价值")]
+            for side, quantity, price, point_value, volume in zip(*(columns + [temp["持仓数量"].values])):
                 # TODO 未考虑反向开仓
-                _, order = _
                 if mode == "avg":
-                    if last_volume * side2sign(order["买卖"]) >= 0:
-                        market_value += order["成交数"] * order["成交均价"] * order["整点价值"]
+                    sign = side2sign(side)
+                    if last_volume * sign >= 0:
+                        market_value += quantity * price * point_value
                         profits.append(np.nan)
                     else:
-                        market_value -= order["成交数"] * position_avx_price * order["整点价值"]  # 按持仓均价平仓
-                        profit = order["整点价值"] * order["成交数"] * side2sign(order["买卖"]) * (
-                            position_avx_price - order["成交均价"])
+                        market_value -= quantity * position_avx_price * point_value  # 按持仓均价平仓
+                        profit = point_value * quantity * sign * (position_avx_price - price)
                         profits.append(profit)
                     last_volume = volume
-                    position_avx_price = market_value / abs(volume) / order["整点价值"] if volume else 0
+                    position_avx_price = market_value / abs(volume) / point_value if volume else 0
                     market_values.append(market_value)
                     position_avx_prices.append(position_avx_price)
                 elif mode == "fifo":
@@ -592,6 +630,8 @@ class OrderAnalysis(WindowFactorPerformance):
     @property
     @lru_cache()
     def trade_summary_all(self):
+        if self._metrics is not None:
+            return self._metrics["trade_summary_all"]
         dct = OrderedDict()
         panel = pd.Panel(self.trade_summary).swapaxes(0, 1)
         for field in panel.keys():
@@ -616,6 +656,8 @@ class OrderAnalysis(WindowFactorPerformance):
     @property
     @lru_cache()
     def strategy_summary(self):
+        if self._metrics is not None:
+            return self._metrics["strategy_summary"]
         dct = OrderedDict()
         t_y = self.pnl_compound_log("AS")[-5:]
         pnl_y = t_y["rate"] / t_y["trade_days"] * self._annual_factor
@@ -642,6 +684,8 @@ class OrderAnalysis(WindowFactorPerformance):
                 u"最大回撤比率"
             ]
         })
+        if self._metrics is not None:
+            return self._metrics["risk_indicator"]
         dct = OrderedDict()
         dct[u"最大回撤金额"] = self.drawdown.min()
         dct[u"最大回撤比率"] = self.drawdown_ratio.min() * 100
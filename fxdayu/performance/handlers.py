@@ -1,5 +1,73 @@
 # encoding: utf-8
 
+from fxdayu.const import Direction, OrderSide
+from fxdayu.context import ContextMixin
+from fxdayu.engine.handler import HandlerCompose, Handler
+from fxdayu.event import EVENTS
 from ._performance import Performance
+from .stream import StreamingMetrics
 
-__all__ = ["Performance"]
+__all__ = ["Performance", "MetricsHandler"]
+
+SIDE_SIGN = {
+    Direction.LONG.value: 1,
+    Direction.SHORT.value: -1,
+    OrderSide.BUY.value: 1,
+    OrderSide.SELL.value: -1,
+}
+
+
+class MetricsHandler(HandlerCompose, ContextMixin):
+    """
+    Feeds a StreamingMetrics with equity recorded by the portfolio on every bar close and with
+    every execution, so metrics of the running strategy can be read at any time from
+    context.metrics.
+    """
+
+    def __init__(self, engine, window=20, annual_factor=250):
+        """
+
+        Args:
+            engine(fxdayu.engine.Engine): event engine
+            window(int): number of bars of rolling volatility
+            annual_factor(int): trading days of a year
+        """
+        super(MetricsHandler, self).__init__(engine)
+        ContextMixin.__init__(self)
+        self.metrics = StreamingMetrics(window=window, annual_factor=annual_factor)
+        self._portfolio = None
+        self._handlers = {
+            # after portfolio recorded equity of the bar
+            "on_time": Handler(self.on_time, EVENTS.TIME, topic="bar.close", priority=140),
+            "on_execution": Handler(self.on_execution, EVENTS.EXECUTION, topic=".", priority=-50)
+        }
+
+    def init(self):
+        self._portfolio = self.context.portfolio
+        self.metrics.base = self._portfolio.starting_cash
+
+    def reset(self):
+        self.metrics.reset()
+
+    def on_time(self, event, kwargs=None):
+        self.metrics.on_bar(event.time, self._portfolio.last_equity)
+
+    def on_execution(self, event, kwargs=None):
+        """
+
+        Args:
+            event(fxdayu.event.ExecutionEvent):
+            kwargs:
+
+        Returns:
+            None
+        """
+        execution = event.data
+        self.metrics.on_fill(
+            execution.time, execution.symbol, SIDE_SIGN[execution.side],
+            execution.lastQty, execution.lastPx, execution.commission,
+            account=(execution.gateway, execution.account)
+        )
+
+    def link_context(self):
+        self.context.metrics = self.metrics
@@ -0,0 +1,519 @@
+# encoding: utf-8
+from __future__ import division, unicode_literals
+
+import math
+from collections import OrderedDict, deque
+
+import numpy as np
+import pandas as pd
+
+__all__ = ["StreamingMetrics"]
+
+
+def _percent(log_return):
+    return (math.exp(log_return) - 1) * 100
+
+
+class _Moments(object):
+    """
+    Count, sum and sum of squares of a sample, enough for its mean and variance.
+    """
+    __slots__ = ["n", "total", "square"]
+
+    def __init__(self):
+        self.n = 0
+        self.total = 0.0
+        self.square = 0.0
+
+    def add(self, x, sign=1):
+        self.n += sign
+        self.total += sign * x
+        self.square += sign * x * x
+
+    def variance(self, x=None):
+        """
+        Sample variance, including x if given without adding it.
+        """
+        n, total, square = self.n, self.total, self.square
+        if x is not None:
+            n, total, square = n + 1, total + x, square + x * x
+        if n < 1:
+            return np.nan
+        variance = (square - total * total / n) / (n - (n > 1))
+        return variance if variance > 1e-7 else 0.0
+
+
+class _Trade(object):
+    """
+    Position of a symbol from opening to being flat.
+    """
+    __slots__ = ["direction", "volume", "avg_price", "realized", "commission", "max_volume", "open_time"]
+
+    def __init__(self, direction, time):
+        self.direction = direction
+        self.volume = 0
+        self.avg_price = 0.0
+        self.realized = 0.0
+        self.commission = 0.0
+        self.max_volume = 0
+        self.open_time = time
+
+
+class _TradeStats(object):
+    """
+    Statistics of closed trades, of all directions or of one direction.
+    """
+
+    def __init__(self):
+        self.trades = 0
+        self.wins = 0
+        self.losses = 0
+        self.gross_profit = 0.0
+        self.gross_loss = 0.0
+        self.largest_win = np.nan
+        self.largest_loss = np.nan
+        self.last_profit = np.nan
+        self.win_volume = 0
+        self.loss_volume = 0
+        self.holding_time = pd.Timedelta(0)
+        self.streak = 0  # > 0 for consecutive wins, < 0 for consecutive losses
+        self.streak_profit = 0.0
+        self.max_win_streak = 0
+        self.max_loss_streak = 0
+        self.max_streak_profit = 0.0
+        self.max_streak_loss = 0.0
+        self.win_sections = 0
+        self.loss_sections = 0
+
+    def add(self, profit, volume, holding_time):
+        self.trades += 1
+        self.last_profit = profit
+        self.holding_time += holding_time
+        per_volume = profit / volume if volume else np.nan
+        if profit >= 0:
+            self.wins += 1
+            self.gross_profit += profit
+            self.win_volume += volume
+            if not per_volume <= self.largest_win:
+                self.largest_win = per_volume
+            if self.streak > 0:
+                self.streak += 1
+                self.streak_profit += profit
+            else:
+                self.streak, self.streak_profit = 1, profit
+                self.win_sections += 1
+            self.max_win_streak = max(self.max_win_streak, self.streak)
+            self.max_streak_profit = max(self.max_streak_profit, self.streak_profit)
+        else:
+            self.losses += 1
+            self.gross_loss -= profit
+            self.loss_volume += volume
+            if not per_volume >= self.largest_loss:
+                self.largest_loss = per_volume
+            if self.streak < 0:
+                self.streak -= 1
+                self.streak_profit += profit
+            else:
+                self.streak, self.streak_profit = -1, profit
+                self.loss_sections += 1
+            self.max_loss_streak = max(self.max_loss_streak, -self.streak)
+            self.max_streak_loss = min(self.max_streak_loss, self.streak_profit)
+
+    def summary(self):
+        dct = OrderedDict()
+        dct[u"总净利"] = self.gross_profit - self.gross_loss
+        dct[u"总盈利"] = self.gross_profit
+        dct[u"总亏损"] = self.gross_loss
+        dct[u"总交易次数"] = self.trades
+        dct[u"总盈利次数"] = self.wins
+        dct[u"总亏损次数"] = self.losses
+        dct[u"总交易笔数"] = self.win_volume + self.loss_volume
+        dct[u"总盈利笔数"] = self.win_volume
+        dct[u"总亏损笔数"] = self.loss_volume
+        dct[u"总持仓时间"] = self.holding_time
+        dct[u"平均持仓时间"] = self.holding_time / self.trades if self.trades else pd.NaT
+        dct[u"总盈利段数"] = self.win_sections
+        dct[u"总亏损段数"] = self.loss_sections
+        dct[u"单笔最大盈利"] = self.largest_win
+        dct[u"单笔最大亏损"] = abs(self.largest_loss)
+        dct[u"平均每笔盈利"] = self.gross_profit / self.win_volume if self.win_volume else np.nan
+        dct[u"平均每笔亏损"] = self.gross_loss / self.loss_volume if self.loss_volume else np.nan
+        dct[u"平均连续盈利次数"] = self.wins / self.win_sections if self.win_sections else np.nan
+        dct[u"平均连续亏损次数"] = self.losses / self.loss_sections if self.loss_sections else np.nan
+        dct[u"最大连续盈利次数"] = self.max_win_streak
+        dct[u"最大连续亏损次数"] = self.max_loss_streak
+        dct[u"最大连续盈利金额"] = self.max_streak_profit
+        dct[u"最大连续亏损金额"] = abs(self.max_streak_loss)
+        dct[u"胜率"] = self.wins / self.trades if self.trades else np.nan
+        return dct
+
+
+class StreamingMetrics(object):
+    """
+    Performance metrics updated on every bar close and every fill, each one readable at any
+    time in O(1) without rebuilding DataFrames.
+
+    Equity metrics follow OrderAnalysis: daily returns are the log change of the last equity
+    of a day, volatility and sharpe ratio are annualized from them, monthly and yearly returns
+    are sums of daily log returns. The return of the day in progress is included when read.
+
+    Trades are positions of a symbol in an account from opening to being flat, valued by average
+    price as OrderAnalysis.position_details does, commissions of a trade are deducted from its
+    profit. A trade is a win when its profit >= 0. Statistics are kept for all, long and short trades.
+    """
+
+    def __init__(self, base=100000, window=20, annual_factor=250):
+        """
+
+        Args:
+            base(float): starting capital
+            window(int): number of bars of rolling volatility
+            annual_factor(int): trading days of a year
+        """
+        self.base = base
+        self.window = window
+        self.annual_factor = annual_factor
+        self.reset()
+
+    def reset(self):
+        # equity
+        self.time = None
+        self.equity = np.nan
+        self.peak = np.nan
+        self.drawdown = 0.0
+        self.drawdown_ratio = 0.0
+        self.max_drawdown = 0.0
+        self.max_drawdown_ratio = 0.0
+        self.max_drawdown_time = None
+        self._returns = deque()
+        self._rolling = _Moments()
+
+        # daily, monthly and yearly log returns
+        self._day = None
+        self._day_log = None
+        self._last_log = None
+        self._daily_log = _Moments()
+        self._daily_percent = _Moments()
+        self._month = None
+        self._month_log = 0.0
+        self._monthly = _Moments()
+        self._year = None
+        self._year_log = 0.0
+        self._year_days = 0
+        self._years = deque(maxlen=5)
+
+        # trades
+        self._open = {}  # (account, symbol) -> _Trade
+        self.all_trades = _TradeStats()
+        self.long_trades = _TradeStats()
+        self.short_trades = _TradeStats()
+        self.first_fill = None
+        self.last_fill = None
+
+    # ------------------------------------------------------------------ equity
+
+    def on_bar(self, time, equity):
+        """
+        Update with equity at the close of a bar.
+
+        Args:
+            time(datetime): bar time
+            equity(float): equity of the portfolio
+
+        Returns:
+            None
+        """
+        if equity != equity:
+            return
+        last = self.equity
+        self.time = time
+        self.equity = equity
+
+        if last == last and last:
+            r = equity / last - 1
+            self._returns.append(r)
+            self._rolling.add(r)
+            if len(self._returns) > self.window:
+                self._rolling.add(self._returns.popleft(), -1)
+
+        if not equity <= self.peak:
+            self.peak = equity
+        self.drawdown = equity - self.peak
+        self.drawdown_ratio = self.drawdown / self.peak if self.peak else 0.0
+        if self.drawdown < self.max_drawdown:
+            self.max_drawdown = self.drawdown
+        if self.drawdown_ratio < self.max_drawdown_ratio:
+            self.max_drawdown_ratio = self.drawdown_ratio
+            self.max_drawdown_time = time
+
+        ratio = equity / self.base
+        if ratio <= 0:
+            return
+        day = (time.year, time.month, time.day)
+        if day != self._day:
+            self._close_day()
+            self._day = day
+        self._day_log = math.log(ratio)
+
+    def _day_return(self):
+        # log return of the day in progress, the first day of all returns 0
+        if self._day_log is None:
+            return None
+        return self._day_log - (self._last_log if self._last_log is not None else self._day_log)
+
+    def _close_day(self):
+        r = self._day_return()
+        if r is None:
+            return
+        self._daily_log.add(r)
+        self._daily_percent.add(_percent(r))
+        month, year = self._day[:2], self._day[0]
+        if month != self._month:
+            if self._month is not None:
+                self._monthly.add(_percent(self._month_log))
+            self._month, self._month_log = month, 0.0
+        self._month_log += r
+        if year != self._year:
+            if self._year is not None:
+                self._years.append((self._year_log, self._year_days))
+            self._year, self._year_log, self._year_days = year, 0.0, 0
+        self._year_log += r
+        self._year_days += 1
+        self._last_log = self._day_log
+        self._day_log = None
+
+    def _current(self):
+        """
+        Returns:
+            tuple: (return of the day in progress, log return of its month, months before it,
+                (log return, days) of its year, years before it)
+        """
+        r = self._day_return()
+        if r is None:
+            return None, None, self._monthly, None, self._years
+        month, year = self._day[:2], self._day[0]
+        if month == self._month:
+            month_log = self._month_log + r
+            monthly = self._monthly
+        else:
+            month_log = r
+            monthly = _Moments()
+            monthly.n, monthly.total, monthly.square = self._monthly.n, self._monthly.total, self._monthly.square
+            if self._month is not None:
+                monthly.add(_percent(self._month_log))
+        if year == self._year:
+            year_ = (self._year_log + r, self._year_days + 1)
+            years = self._years
+        else:
+            year_ = (r, 1)
+            years = deque(self._years, maxlen=5)
+            if self._year is not None:
+                years.append((self._year_log, self._year_days))
+        return r, month_log, monthly, year_, years
+
+    @property
+    def trade_days(self):
+        return self._daily_log.n + (self._day_log is not None)
+
+    @property
+    def rolling_volatility(self):
+        """
+        Returns:
+            float: standard deviation of simple returns of the latest window bars
+        """
+        if self._rolling.n < 2:
+            return np.nan
+        return self._rolling.variance() ** 0.5
+
+    @property
+    def volatility(self):
+        """
+        Returns:
+            float: annualized standard deviation of daily returns in percent, 年化收益标准差
+        """
+        r = self._day_return()
+        variance = self._daily_percent.variance(_percent(r) if r is not None else None)
+        return variance ** 0.5 * self.annual_factor ** 0.5
+
+    @property
+    def annual_return(self):
+        """
+        Returns:
+            float: annualized compound return in percent
+        """
+        r = self._day_return()
+        n = self._daily_log.n + (r is not None)
+        if not n:
+            return np.nan
+        return _percent((self._daily_log.total + (r or 0.0)) / n * self.annual_factor)
+
+    @property
+    def sharpe_ratio(self):
+        volatility = self.volatility
+        if not volatility or volatility != volatility:
+            return np.nan
+        return self.annual_return / volatility
+
+    @property
+    def monthly_return(self):
+        """
+        Returns:
+            float: average monthly compound return in percent, 平均月收益
+        """
+        r, month_log, monthly, year_, years = self._current()
+        if r is None:
+            return monthly.total / monthly.n if monthly.n else np.nan
+        return (monthly.total + _percent(month_log)) / (monthly.n + 1)
+
+    @property
+    def yearly_return(self):
+        """
+        Returns:
+            float: average annualized return of the latest five years in percent, 五年平均年收益
+        """
+        r, month_log, monthly, year_, years = self._current()
+        years = list(years)
+        if year_ is not None:
+            years = (years + [year_])[-5:]
+        if not years:
+            return np.nan
+        return sum(_percent(log / days * self.annual_factor) for log, days in years) / len(years)
+
+    # ------------------------------------------------------------------ trades
+
+    def on_fill(self, time, symbol, sign, quantity, price, commission=0.0, multiplier=1, account=None):
+        """
+        Update with a fill.
+
+        Args:
+            time(datetime): fill time
+            symbol(str): symbol
+            sign(int): 1 for buy, -1 for sell
+            quantity(float): filled quantity, positive
+            price(float): fill price
+            commission(float): commission of the fill
+            multiplier(float): value of one price point
+            account: key of the account, e.g. (gateway, account), positions of a symbol in
+                different accounts are different trades
+
+        Returns:
+            None
+        """
+        if self.first_fill is None:
+            self.first_fill = time
+        self.last_fill = time
+        key = (account, symbol)
+        trade = self._open.get(key, None)
+        if trade is None:
+            trade = self._open[key] = _Trade(sign, time)
+        trade.commission += commission
+        volume = trade.volume
+        delta = sign * quantity
+        if volume * delta >= 0:
+            trade.avg_price = (trade.avg_price * abs(volume) + price * quantity) / (abs(volume) + quantity)
+            trade.volume = volume + delta
+        else:
+            closed = min(quantity, abs(volume))
+            trade.realized += closed * (price - trade.avg_price) * (1 if volume > 0 else -1) * multiplier
+            trade.volume = volume + delta
+            if trade.volume * volume < 0:  # reversed, the rest opens a new trade
+                self._close(key, trade, time)
+                trade = self._open[key] = _Trade(sign, time)
+                trade.volume = volume + delta
+                trade.avg_price = price
+        trade.max_volume = max(trade.max_volume, abs(trade.volume))
+        if trade.volume == 0:
+            self._close(key, trade, time)
+
+    def _close(self, key, trade, time):
+        del self._open[key]
+        profit = trade.realized - trade.commission
+        holding_time = pd.Timedelta(time - trade.open_time)
+        self.all_trades.add(profit, trade.max_volume, holding_time)
+        directed = self.long_trades if trade.direction > 0 else self.short_trades
+        directed.add(profit, trade.max_volume, holding_time)
+
+    @property
+    def trades(self):
+        return self.all_trades.trades
+
+    @property
+    def last_profit(self):
+        return self.all_trades.last_profit
+
+    @property
+    def streak(self):
+        return self.all_trades.streak
+
+    @property
+    def net_profit(self):
+        return self.all_trades.gross_profit - self.all_trades.gross_loss
+
+    @property
+    def win_rate(self):
+        return self.all_trades.wins / self.trades if self.trades else np.nan
+
+    @property
+    def profit_factor(self):
+        if self.all_trades.gross_loss > 1e-7:
+            return self.all_trades.gross_profit / self.all_trades.gross_loss
+        return np.inf
+
+    # ------------------------------------------------------------------ reports
+
+    def trade_summary(self, direction=None):
+        """
+        Args:
+            direction(int): 1 for long trades, -1 for short trades, None for all
+
+        Returns:
+            pandas.Series: summary of closed trades, named as OrderAnalysis.trade_summary_all
+        """
+        stats = {None: self.all_trades, 1: self.long_trades, -1: self.short_trades}[direction]
+        return pd.Series(stats.summary())
+
+    def strategy_summary(self):
+        """
+        Returns:
+            pandas.Series: same fields as OrderAnalysis.strategy_summary
+        """
+        dct = OrderedDict()
+        dct[u"五年平均年收益"] = self.yearly_return
+        dct[u"年化收益标准差"] = self.volatility
+        dct[u"平均月收益"] = self.monthly_return
+        dct[u"最大回撤率"] = - self.max_drawdown_ratio * 100
+        dct[u"夏普比率"] = self.sharpe_ratio
+        dct[u"盈利因子"] = self.profit_factor
+        return pd.Series(dct)
+
+    def risk_indicator(self):
+        """
+        Returns:
+            pandas.Series: same fields as OrderAnalysis.risk_indicator
+        """
+        dct = OrderedDict()
+        dct[u"最大回撤金额"] = self.max_drawdown
+        dct[u"最大回撤比率"] = self.max_drawdown_ratio * 100
+        dct[u"最大回撤发生时间"] = self.max_drawdown_time
+        dct[u"净利回撤比"] = self.net_profit / - self.max_drawdown if self.max_drawdown else np.nan
+        dct[u"持仓时间比率"] = None
+        return pd.Series(dct)
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: current values of main metrics, for live monitoring
+        """
+        return OrderedDict([
+            ("time", self.time),
+            ("equity", self.equity),
+            ("drawdown", self.drawdown),
+            ("drawdown_ratio", self.drawdown_ratio),
+            ("max_drawdown_ratio", self.max_drawdown_ratio),
+            ("rolling_volatility", self.rolling_volatility),
+            ("trades", self.trades),
+            ("win_rate", self.win_rate),
+            ("last_profit", self.last_profit),
+            ("streak", self.streak),
+            ("net_profit", self.net_profit),
+        ])
@@ -1,6 +1,5 @@
 # encoding: utf-8
 
-from collections import OrderedDict
 import copy
 
 from enum import Enum
@@ -10,6 +9,7 @@ from fxdayu.engine.handler import Handler
 from fxdayu.event import EVENTS, ExecutionEvent, OrderStatusEvent
 from fxdayu.models.data import ExecutionData
 from fxdayu.router.base import AbstractRouter
+from fxdayu.router.order_book import OrderBook
 from fxdayu.context import ContextMixin
 from fxdayu.utils.api_support import api_method
 
@@ -40,9 +40,10 @@ class DummyExchange(AbstractRouter, ContextMixin):
         self.ticker_info = ticker_information
         self.exchange_name = exchange_name
         self.deal_mode = deal_model
-        self._orders = OrderedDict()
+        self._orders = OrderBook(self._trigger)
         self._handlers = {
             "on_order": Handler(self.on_order, EVENTS.ORDER, topic="", priority=0),
+            "on_orders": Handler(self.on_orders, EVENTS.ORDERS, topic="", priority=0),
             "on_time": Handler(self.on_time, EVENTS.TIME, topic="bar.open", priority=200),
             "on_execution": Handler(self.on_execution, EVENTS.EXECUTION, priority=0),
             "on_cancel": Handler(self.on_cancel, EVENTS.CANCEL, priority=0)
@@ -54,6 +55,10 @@ class DummyExchange(AbstractRouter, ContextMixin):
         }
         self._order_id = 0
 
+    def reset(self):
+        self._orders.clear()
+        self._order_id = 0
+
     @property
     def next_order_id(self):
         self._order_id += 1
@@ -205,19 +210,39 @@ class DummyExchange(AbstractRouter, ContextMixin):
             price = order.price if bar.open >= order.price else bar.open
             return self._make_execution(order, price, bar.name)
 
+    @staticmethod
+    def _trigger(order):
+        """
+        Which side of a bar triggers the order, the way _execute_limit and _execute_stop match it.
+        """
+        if order.ordType == OrderType.MARKET.value:
+            return OrderBook.MARKET
+        side = Direction(order.side)
+        if side not in (Direction.LONG, Direction.SHORT):
+            return None
+        if order.action not in (OrderAction.OPEN.value, OrderAction.CLOSE.value, OrderAction.NONE.value):
+            return None
+        if order.ordType == OrderType.LIMIT.value:
+            limit = order.action != OrderAction.CLOSE.value
+        elif order.ordType == OrderType.STOP.value:
+            limit = order.action == OrderAction.CLOSE.value
+        else:
+            return None
+        if limit:
+            return OrderBook.BELOW if side == Direction.LONG else OrderBook.ABOVE
+        else:
+            return OrderBook.ABOVE if side == Direction.LONG else OrderBook.BELOW
+
     def _put(self, event):
         if event:
             self.engine.put(event)
 
     def on_time(self, event, kwargs=None):
-        executed = []
-        for order in self._orders.values():
-            event = self.handle_order[order.ordType](order, self.data.current(order.symbol))
+        for order, bar in self._orders.match(self.data.current):
+            event = self.handle_order[order.ordType](order, bar)
             if event:
-                executed.append(order.clOrdID)
+                self._orders.pop(order.clOrdID, None)
             self._put(event)
-        for order in executed:
-            self._orders.pop(order, None)
 
     def on_order(self, event, kwargs=None):
         """
@@ -229,7 +254,22 @@ class DummyExchange(AbstractRouter, ContextMixin):
         Returns:
 
         """
-        order = event.data
+        self._accept(event.data)
+
+    def on_orders(self, event, kwargs=None):
+        """
+
+        Args:
+            event(fxdayu.event.OrderBatchEvent):
+            kwargs:
+
+        Returns:
+
+        """
+        for order in event.data:
+            self._accept(order)
+
+    def _accept(self, order):
         if order.ordType == OrderType.MARKET.value and self.deal_mode == BACKTESTDEALMODE.THIS_BAR_CLOSE:
             self._orders.pop(order.clOrdID, None)  # modify order
             current = self.data.current(order.symbol)
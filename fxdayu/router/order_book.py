@@ -0,0 +1,155 @@
+# encoding: utf-8
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+
+
+class OrderBook(object):
+    """
+    Resting orders of a simulated exchange, indexed by symbol and trigger price.
+
+    Every order is classified by a trigger function of the exchange:
+
+    * MARKET: matched on every bar
+    * BELOW: matched when bar.low < price, e.g. long limit and short stop orders
+    * ABOVE: matched when bar.high > price, e.g. short limit and long stop orders
+    * None: never matched
+
+    BELOW and ABOVE orders of a symbol are kept in lists sorted by price, so orders crossed by
+    a bar are located with bisect instead of checking every resting order.
+    Iteration follows the order of arrival, as an OrderedDict of {clOrdID: order} does.
+    """
+
+    MARKET = 0
+    BELOW = 1
+    ABOVE = 2
+
+    def __init__(self, trigger):
+        """
+
+        Args:
+            trigger(function): trigger(order) -> MARKET, BELOW, ABOVE or None
+        """
+        self.trigger = trigger
+        self._orders = OrderedDict()  # clOrdID -> (seq, kind, order)
+        self._books = {}  # symbol -> {kind: sorted list of (price, seq, clOrdID) or (seq, clOrdID)}
+        self._seq = 0
+
+    def __len__(self):
+        return len(self._orders)
+
+    def __contains__(self, cl_ord_id):
+        return cl_ord_id in self._orders
+
+    def __setitem__(self, cl_ord_id, order):
+        self.add(order)
+
+    def __getitem__(self, cl_ord_id):
+        return self._orders[cl_ord_id][2]
+
+    def get(self, cl_ord_id, default=None):
+        item = self._orders.get(cl_ord_id, None)
+        return default if item is None else item[2]
+
+    def keys(self):
+        return list(self._orders.keys())
+
+    def values(self):
+        return [item[2] for item in self._orders.values()]
+
+    def items(self):
+        return [(cl_ord_id, item[2]) for cl_ord_id, item in self._orders.items()]
+
+    def symbols(self):
+        return list(self._books.keys())
+
+    def add(self, order):
+        """
+        Add an order, an order of the same clOrdID is replaced and keeps its place in arrival order.
+        """
+        item = self._orders.get(order.clOrdID, None)
+        if item is None:
+            self._seq += 1
+            seq = self._seq
+        else:
+            seq = item[0]
+            self._remove(order.clOrdID, item)
+        kind = self.trigger(order)
+        if kind in (self.BELOW, self.ABOVE) and order.price != order.price:
+            kind = None  # NaN price is never crossed
+        self._orders[order.clOrdID] = (seq, kind, order)
+        book = self._books.get(order.symbol, None)
+        if book is None:
+            book = self._books[order.symbol] = {self.MARKET: [], self.BELOW: [], self.ABOVE: [], None: []}
+        if kind == self.MARKET or kind is None:
+            insort(book[kind], (seq, order.clOrdID))
+        else:
+            insort(book[kind], (order.price, seq, order.clOrdID))
+
+    def clear(self):
+        self._orders.clear()
+        self._books.clear()
+        self._seq = 0
+
+    def pop(self, cl_ord_id, default=None):
+        """
+        Remove an order.
+
+        Returns:
+            order removed, default if not found
+        """
+        item = self._orders.pop(cl_ord_id, None)
+        if item is None:
+            return default
+        return self._remove(cl_ord_id, item)
+
+    def _remove(self, cl_ord_id, item):
+        seq, kind, order = item
+        book = self._books[order.symbol]
+        entries = book[kind]
+        if kind == self.MARKET or kind is None:
+            del entries[bisect_left(entries, (seq, cl_ord_id))]
+        else:
+            del entries[bisect_left(entries, (order.price, seq))]
+        if not any(book.values()):
+            del self._books[order.symbol]
+        return order
+
+    def crossed(self, symbol, low, high):
+        """
+        Orders of a symbol triggered by a bar of given low and high.
+
+        Returns:
+            list: [(seq, order)] of market orders, BELOW orders with price > low
+                and ABOVE orders with price < high
+        """
+        book = self._books.get(symbol, None)
+        if book is None:
+            return []
+        orders = self._orders
+        result = [(seq, orders[cl_ord_id][2]) for seq, cl_ord_id in book[self.MARKET]]
+        below = book[self.BELOW]
+        if below and low == low:
+            start = bisect_right(below, (low, float("inf")))
+            result.extend((seq, orders[cl_ord_id][2]) for _, seq, cl_ord_id in below[start:])
+        above = book[self.ABOVE]
+        if above and high == high:
+            stop = bisect_left(above, (high, -1))
+            result.extend((seq, orders[cl_ord_id][2]) for _, seq, cl_ord_id in above[:stop])
+        return result
+
+    def match(self, bars):
+        """
+        Orders triggered by bars, in the order of arrival.
+
+        Args:
+            bars(function): bars(symbol) -> bar with low and high
+
+        Returns:
+            list: [(order, bar)]
+        """
+        result = []
+        for symbol in self.symbols():
+            bar = bars(symbol)
+            result.extend((seq, order, bar) for seq, order in self.crossed(symbol, bar.low, bar.high))
+        result.sort(key=lambda item: item[0])
+        return [(order, bar) for seq, order, bar in result]
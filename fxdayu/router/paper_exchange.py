@@ -1,6 +1,5 @@
 # encoding: utf-8
 import copy
-from collections import OrderedDict
 
 import numpy as np
 from enum import Enum
@@ -10,6 +9,7 @@ from fxdayu.engine.handler import Handler
 from fxdayu.event import EVENTS, ExecutionEvent, OrderStatusEvent
 from fxdayu.models.data import ExecutionData
 from fxdayu.router.base import AbstractRouter
+from fxdayu.router.order_book import OrderBook
 from fxdayu.context import ContextMixin
 from fxdayu.utils.api_support import api_method
 
@@ -38,9 +38,10 @@ class PaperExchange(AbstractRouter, ContextMixin):
         ContextMixin.__init__(self)
         self.exchange_name = exchange_name
         self.deal_mode = deal_model
-        self._orders = OrderedDict()
+        self._orders = OrderBook(self._trigger)
         self._handlers = {
             "on_order": Handler(self.on_order, EVENTS.ORDER, topic=".", priority=-200),
+            "on_orders": Handler(self.on_orders, EVENTS.ORDERS, topic=".", priority=-200),
             "on_time": Handler(self.on_time, EVENTS.TIME, topic="bar.open", priority=200),
             "on_execution": Handler(self.on_execution, EVENTS.EXECUTION, priority=0),
             "on_cancel": Handler(self.on_cancel, EVENTS.CANCEL, priority=0)
@@ -52,6 +53,10 @@ class PaperExchange(AbstractRouter, ContextMixin):
         }
         self._order_id = 0
 
+    def reset(self):
+        self._orders.clear()
+        self._order_id = 0
+
     @property
     def next_order_id(self):
         self._order_id += 1
@@ -168,18 +173,30 @@ class PaperExchange(AbstractRouter, ContextMixin):
             price = order.price if bar.open >= order.price else bar.open
             return self._make_execution(order, price, bar.name)
 
+    @staticmethod
+    def _trigger(order):
+        """
+        Which side of a bar triggers the order, the way _execute_limit and _execute_stop match it.
+        """
+        if order.ordType == OrderType.MARKET.value:
+            return OrderBook.MARKET
+        side = Direction(order.side)
+        if side not in (Direction.LONG, Direction.SHORT):
+            return None
+        if order.ordType == OrderType.LIMIT.value:
+            return OrderBook.BELOW if side == Direction.LONG else OrderBook.ABOVE
+        elif order.ordType == OrderType.STOP.value:
+            return OrderBook.ABOVE if side == Direction.LONG else OrderBook.BELOW
+
     def _put_execution(self, event):
         self.engine.put(event)
 
     def on_time(self, event, kwargs=None):
-        executed = []
-        for order in self._orders.values():
-            event = self.handle_order[order.ordType](order, self.data.current(order.symbol))
+        for order, bar in self._orders.match(self.data.current):
+            event = self.handle_order[order.ordType](order, bar)
             if event:
-                executed.append(order.clOrdID)
+                self._orders.pop(order.clOrdID, None)
                 self._put_execution(event)
-        for order in executed:
-            self._orders.pop(order, None)
 
     def on_order(self, event, kwargs=None):
         """
@@ -191,7 +208,22 @@ class PaperExchange(AbstractRouter, ContextMixin):
         Returns:
 
         """
-        order = event.data
+        self._accept(event.data)
+
+    def on_orders(self, event, kwargs=None):
+        """
+
+        Args:
+            event(fxdayu.event.OrderBatchEvent):
+            kwargs:
+
+        Returns:
+
+        """
+        for order in event.data:
+            self._accept(order)
+
+    def _accept(self, order):
         if OrderType(order.ordType) == OrderType.MARKET and self.deal_mode == BACKTESTDEALMODE.THIS_BAR_CLOSE:
             self._orders.pop(order.clOrdID, None)  # modify order
             current = self.data.current(order.symbol)
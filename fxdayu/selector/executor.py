@@ -52,8 +52,7 @@ class ExecutorAdmin(object):
         pass
 
     def send_order(self, context, data, environment, target):
-        for code, pct in target.items():
-            environment['order_target_percent'](code, pct)
+        environment['order_target_percent_batch'](target)
 
 
 class EqualWeightAdmin(ExecutorAdmin):
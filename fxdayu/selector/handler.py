@@ -1,3 +1,5 @@
+from collections import OrderedDict
+
 from fxdayu.context import ContextMixin
 from fxdayu.engine.handler import HandlerCompose, Handler
 from fxdayu.event import EVENTS
@@ -37,10 +39,9 @@ class SelectorHandler(HandlerCompose, ContextMixin):
         self.send_order()
 
     def send_order(self):
-        for code in self.context.portfolio.positions:
-            if code not in self.context.selector_pool:
-                self.environment['order_target'](code, 0)
-
-        for code, pct in self.context.executor_pool.items():
-            self.environment['order_target_percent'](code, pct)
+        # positions out of the pool are closed first
+        targets = OrderedDict((code, 0) for code in self.context.portfolio.positions
+                              if code not in self.context.selector_pool)
+        targets.update(self.context.executor_pool)
+        self.environment['order_target_percent_batch'](targets)
 
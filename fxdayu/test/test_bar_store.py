@@ -0,0 +1,108 @@
+# encoding:utf-8
+import unittest
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from fxdayu.data.bar_store import BarStore, Cursor, to_nanosecond
+
+
+def make_bars(start, days, offset=0.0):
+    index = [start + timedelta(days=i) for i in range(days)]
+    values = np.arange(days, dtype=np.float64) + offset
+    return pd.DataFrame({"open": values, "close": values + 0.5}, index=index)
+
+
+class TestCursor(unittest.TestCase):
+    def setUp(self):
+        self.times = np.array([10, 20, 30, 40], dtype=np.int64)
+        self.cursor = Cursor(self.times)
+
+    def test_seek_forward(self):
+        self.assertEqual(self.cursor.seek(5), -1)
+        self.assertEqual(self.cursor.seek(10), 0)
+        self.assertEqual(self.cursor.seek(15), 0)
+        self.assertEqual(self.cursor.seek(20), 1)
+        self.assertEqual(self.cursor.seek(35), 2)  # skips a bar
+        self.assertEqual(self.cursor.seek(100), 3)
+
+    def test_seek_backward(self):
+        self.assertEqual(self.cursor.seek(40), 3)
+        self.assertEqual(self.cursor.seek(25), 1)
+        self.assertEqual(self.cursor.seek(1), -1)
+
+    def test_reset(self):
+        self.cursor.seek(30)
+        self.cursor.reset()
+        self.assertEqual(self.cursor.position, -1)
+        self.assertEqual(self.cursor.seek(20), 1)
+
+
+class TestBarStore(unittest.TestCase):
+    def setUp(self):
+        self.start = datetime(2017, 1, 1)
+        self.store = BarStore.from_frames(
+            {"A": make_bars(self.start, 5), "B": make_bars(self.start + timedelta(days=2), 5, 100)},
+            ["open", "close"]
+        )
+
+    def test_shared_axis(self):
+        self.assertEqual(len(self.store), 7)
+        self.assertEqual(self.store.symbols, ["A", "B"])
+        self.assertEqual(self.store.index[0], pd.Timestamp(self.start))
+        b = self.store.frame("B", "open")
+        self.assertTrue(np.isnan(b.iloc[:2]).all())
+        self.assertEqual(list(b.iloc[2:4]), [100.0, 101.0])
+        self.assertTrue(np.isnan(self.store.frame("A", "close").iloc[5:]).all())
+
+    def test_frame_is_view(self):
+        frame = self.store.frame("A", start=1, stop=3)
+        self.assertEqual(list(frame.columns), ["open", "close"])
+        self.assertEqual(list(frame["close"]), [1.5, 2.5])
+        self.assertTrue(np.shares_memory(self.store.values("A", "close", 1, 3), self.store.array("A")))
+
+    def test_bar_and_cross(self):
+        bar = self.store.bar("A", 1)
+        self.assertEqual(bar.name, pd.Timestamp(self.start + timedelta(days=1)))
+        self.assertEqual(list(bar), [1.0, 1.5])
+        self.assertEqual(self.store.bar("A", 1, "close"), 1.5)
+        cross = self.store.cross(["A", "B"], 3, "open")
+        self.assertEqual(list(cross), [3.0, 101.0])
+        self.assertEqual(list(self.store.cross(["A", "B"], 3).index), ["A", "B"])
+
+    def test_panel_of_field(self):
+        frame = self.store.panel(["A", "B"], "close", 2, 4)
+        self.assertEqual(list(frame.columns), ["A", "B"])
+        self.assertEqual(list(frame["B"]), [100.5, 101.5])
+
+    def test_search(self):
+        day = self.start + timedelta(days=2)
+        self.assertEqual(self.store.searchsorted(day), 2)
+        self.assertEqual(self.store.searchsorted(day, "right"), 3)
+        self.assertEqual(self.store.locate(day + timedelta(hours=1)), 2)
+        self.assertEqual(self.store.locate(self.start - timedelta(days=1)), -1)
+
+    def test_seek(self):
+        self.assertEqual(self.store.seek(self.start + timedelta(days=3, hours=12)), 3)
+        self.assertEqual(self.store.cursor, 3)
+        self.store.reset_cursor()
+        self.assertEqual(self.store.cursor, -1)
+
+    def test_insert_realigns(self):
+        self.store.insert("C", make_bars(self.start + timedelta(days=10), 2, 200))
+        self.assertEqual(len(self.store), 9)
+        self.assertEqual(self.store.times[-1], to_nanosecond(self.start + timedelta(days=11)))
+        self.assertEqual(self.store.values("A", "open", 0, 1)[0], 0.0)
+        self.assertTrue(np.isnan(self.store.values("A", "open", -1)[0]))
+        self.assertEqual(self.store.seek(self.start + timedelta(days=10)), 7)
+
+    def test_drop(self):
+        array = self.store.drop("A")
+        self.assertEqual(array.shape, (2, 7))
+        self.assertNotIn("A", self.store)
+        self.assertIn("B", self.store)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+# encoding:utf-8
+import unittest
+
+import numpy as np
+
+from fxdayu.modules.portfolio.recorder import EquityRecorder
+
+
+class TestEquityRecorder(unittest.TestCase):
+    def test_market_value_carries_last_price(self):
+        recorder = EquityRecorder(capacity=2)
+        recorder.set_volume("000001.XSHE", 100)
+        recorder.set_volume("600000.XSHG", 200)
+        quotes = {"000001.XSHE": 10.0, "600000.XSHG": 5.0}
+
+        def prices(symbols):
+            return np.array([quotes[symbol] for symbol in symbols])
+
+        self.assertEqual(recorder.market_value(prices), 2000.0)
+        quotes["600000.XSHG"] = np.nan  # halted
+        self.assertEqual(recorder.market_value(prices), 2000.0)
+        quotes["000001.XSHE"] = 11.0
+        self.assertEqual(recorder.market_value(prices), 2100.0)
+        quotes["600000.XSHG"] = 6.0
+        self.assertEqual(recorder.market_value(prices), 2300.0)
+
+    def test_market_value_never_priced(self):
+        recorder = EquityRecorder()
+        recorder.set_volume("000001.XSHE", 100)
+        self.assertEqual(recorder.market_value(lambda symbols: np.array([np.nan])), 0.0)
+
+    def test_clear_drops_last_prices(self):
+        recorder = EquityRecorder()
+        recorder.set_volume("000001.XSHE", 100)
+        recorder.market_value(lambda symbols: np.array([10.0]))
+        recorder.clear()
+        recorder.set_volume("000001.XSHE", 100)
+        self.assertEqual(recorder.market_value(lambda symbols: np.array([np.nan])), 0.0)
+
+    def test_volumes_summed_over_accounts(self):
+        recorder = EquityRecorder()
+        recorder.set_volume("000001.XSHE", 100, ("IB", "U1"))
+        recorder.set_volume("000001.XSHE", 200, ("IB", "U2"))
+        self.assertEqual(recorder.market_value(lambda symbols: np.array([10.0])), 3000.0)
+        recorder.set_volume("000001.XSHE", 50, ("IB", "U1"))
+        self.assertEqual(recorder.market_value(lambda symbols: np.array([10.0])), 2500.0)
+        recorder.set_volume("000001.XSHE", 0, ("IB", "U2"))
+        symbols, volumes = recorder.volumes()
+        self.assertEqual((symbols, list(volumes)), (["000001.XSHE"], [50.0]))
+        recorder.record("2017-03-03", 0, 500)
+        self.assertEqual(list(recorder.holdings()["000001.XSHE"]), [50.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+# encoding:utf-8
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from fxdayu.router.paper_exchange import BACKTESTDEALMODE
+from fxdayu.trader.optimizer import ProcessOptimizer, _copy_settings
+from fxdayu.trader.packages import DEVELOP_MODE
+
+
+class FakeClient(object):
+    db = "db"
+    write = None
+    inplace = None
+
+    def read(self, symbol, db, index="datetime", start=None, end=None, length=None, projection=None):
+        close = 100 + np.cumsum(np.random.RandomState(1).randn(100))
+        frame = pd.DataFrame({"open": close, "high": close + 1, "low": close - 1, "close": close,
+                              "volume": 1000.0}, index=pd.date_range("2016-01-01", periods=100, freq="D"))
+        if start is not None:
+            frame = frame[frame.index >= start]
+        if end is not None:
+            frame = frame[frame.index <= end]
+        return frame
+
+
+class TestProcessOptimizer(unittest.TestCase):
+    def test_run_module_params(self):
+        settings = _copy_settings(DEVELOP_MODE)
+        settings["data"].kwargs["client"] = FakeClient()
+        optimizer = ProcessOptimizer(settings, processes=1)
+        modes = [BACKTESTDEALMODE.THIS_BAR_CLOSE, BACKTESTDEALMODE.NEXT_BAR_OPEN]
+        result = optimizer.run(["000001"], "D", router={"deal_mode": modes})
+        self.assertEqual(len(result), 2)
+        self.assertEqual(set(result["router.deal_mode"]), set(modes))
+        self.assertIn(u"夏普比率", result)
+
+
+if __name__ == '__main__':
+    unittest.main()
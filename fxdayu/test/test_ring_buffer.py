@@ -0,0 +1,32 @@
+# encoding:utf-8
+import unittest
+from datetime import datetime, timedelta
+
+from fxdayu.data.ring_buffer import BarRing
+
+
+class TestBarRing(unittest.TestCase):
+    def setUp(self):
+        self.ring = BarRing(3)
+        self.start = datetime(2017, 3, 3, 9, 31)
+        for i in range(4):
+            self.ring.append(self.start + timedelta(minutes=i), (i, i + 1, i - 1, i, 100 * i))
+
+    def test_keeps_latest_bars(self):
+        self.assertEqual(len(self.ring), 3)
+        frame = self.ring.frame()
+        self.assertEqual(list(frame["close"]), [1, 2, 3])
+        self.assertEqual(frame.index[-1], self.start + timedelta(minutes=3))
+
+    def test_frame_is_a_view(self):
+        frame = self.ring.frame(2)
+        self.ring.append(self.start + timedelta(minutes=3), (3, 5, 2, 4, 300))
+        self.assertEqual(frame["close"].iloc[-1], 4)
+
+    def test_older_bar_ignored(self):
+        self.assertFalse(self.ring.append(self.start, (0, 0, 0, 0, 0)))
+        self.assertEqual(list(self.ring.frame(1, ["volume"])["volume"]), [300])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+# encoding:utf-8
+from __future__ import unicode_literals
+
+import unittest
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from fxdayu.const import OrderSide
+from fxdayu.performance import OrderAnalysis
+from fxdayu.performance.stream import StreamingMetrics
+
+BASE = 100000
+
+# (symbol, side, quantity, price, commission, day)
+FILLS = [
+    ("000001.XSHE", OrderSide.BUY.value, 100, 10.0, 5.0, 3),
+    ("000001.XSHE", OrderSide.BUY.value, 100, 11.0, 5.0, 10),
+    ("000001.XSHE", OrderSide.SELL.value, 200, 12.0, 5.0, 30),
+    ("600000.XSHG", OrderSide.SELL.value, 300, 20.0, 5.0, 40),
+    ("600000.XSHG", OrderSide.BUY.value, 300, 21.0, 5.0, 60),
+    ("000001.XSHE", OrderSide.BUY.value, 500, 12.5, 5.0, 100),
+    ("000001.XSHE", OrderSide.SELL.value, 200, 12.0, 5.0, 150),
+    ("000001.XSHE", OrderSide.SELL.value, 300, 13.0, 5.0, 200),
+    ("600000.XSHG", OrderSide.BUY.value, 100, 19.0, 5.0, 250),
+    ("600000.XSHG", OrderSide.SELL.value, 100, 18.0, 5.0, 300),
+]
+
+
+def make_equity():
+    rng = np.random.RandomState(7)
+    days = pd.bdate_range("2015-01-05", periods=420)
+    times = [day + timedelta(hours=hour) for day in days for hour in (10, 15)]
+    returns = rng.normal(0.0003, 0.006, len(times))
+    return pd.Series(BASE * np.exp(np.cumsum(returns)), index=pd.DatetimeIndex(times))
+
+
+def make_orders(equity):
+    days = equity.index[::2]
+    rows = []
+    for i, (symbol, side, quantity, price, commission, day) in enumerate(FILLS, 1):
+        time = days[day] + timedelta(hours=10)
+        rows.append({
+            "报单编号": i, "合约": symbol, "买卖": side, "开平": "", "报单状态": "", "报单价格": price,
+            "报单数": quantity, "未成交数": 0, "成交数": quantity, "报单时间": time, "最后成交时间": time,
+            "撤销时间": pd.NaT, "成交均价": price, "手续费": commission, "整点价值": 1, "杠杆": 1, "交易所": "",
+        })
+    return pd.DataFrame(rows)
+
+
+def sum_trade_summary(summaries, column="全部"):
+    # totals of all symbols, as OrderAnalysis.trade_summary_all sums them
+    frames = list(summaries.values())
+    total = frames[0][column].copy()
+    for frame in frames[1:]:
+        for key in total.index:
+            if key.startswith("总"):
+                total[key] += frame[column][key]
+    return total
+
+
+class TestStreamingMetrics(unittest.TestCase):
+    """
+    StreamingMetrics should report what OrderAnalysis computes from the same equity and fills.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.equity = make_equity()
+        cls.orders = make_orders(cls.equity)
+
+        cls.analysis = OrderAnalysis()
+        cls.analysis.set_equity(cls.equity, BASE)
+        cls.analysis.set_orders(cls.orders.copy())
+
+        cls.metrics = StreamingMetrics(BASE)
+        fills = cls.orders.set_index("最后成交时间")
+        position = 0
+        for time, equity in cls.equity.items():
+            while position < len(fills) and fills.index[position] <= time:
+                fill = fills.iloc[position]
+                sign = 1 if fill["买卖"] == OrderSide.BUY.value else -1
+                cls.metrics.on_fill(fills.index[position], fill["合约"], sign, fill["成交数"], fill["成交均价"],
+                                    fill["手续费"])
+                position += 1
+            cls.metrics.on_bar(time, equity)
+
+    def assertSeriesAlmostEqual(self, first, second, keys):
+        for key in keys:
+            self.assertAlmostEqual(first[key], second[key], places=6, msg=key)
+
+    def test_equity_metrics(self):
+        self.assertAlmostEqual(self.metrics.volatility, self.analysis.volatility, places=6)
+        self.assertAlmostEqual(self.metrics.annual_return, self.analysis.annual_return, places=6)
+        self.assertAlmostEqual(self.metrics.sharpe_ratio, self.analysis.sharpe_ratio, places=6)
+        self.assertAlmostEqual(self.metrics.max_drawdown, self.analysis.drawdown.min(), places=6)
+
+    def test_trade_summary(self):
+        expected = sum_trade_summary(self.analysis.trade_summary)
+        result = self.metrics.trade_summary()
+        self.assertSeriesAlmostEqual(result, expected, [
+            "总净利", "总盈利", "总亏损", "总交易次数", "总盈利次数", "总亏损次数",
+            "总交易笔数", "总盈利笔数", "总亏损笔数",
+        ])
+        self.assertEqual(result["总持仓时间"], expected["总持仓时间"])
+
+    def test_trade_summary_by_direction(self):
+        for column, direction in (("多头", 1), ("空头", -1)):
+            expected = sum_trade_summary(self.analysis.trade_summary, column)
+            result = self.metrics.trade_summary(direction)
+            self.assertSeriesAlmostEqual(result, expected, [
+                "总净利", "总盈利", "总亏损", "总交易次数", "总盈利次数", "总亏损次数", "总交易笔数",
+            ])
+
+    def test_trades_kept_per_account(self):
+        metrics = StreamingMetrics(BASE)
+        time = self.equity.index[0]
+        metrics.on_fill(time, "000001.XSHE", 1, 100, 10.0, account="A")
+        metrics.on_fill(time, "000001.XSHE", 1, 100, 10.0, account="B")
+        metrics.on_fill(time, "000001.XSHE", -1, 100, 11.0, account="A")
+        self.assertEqual(metrics.trades, 1)
+        self.assertAlmostEqual(metrics.net_profit, 100.0)
+
+    def test_strategy_summary(self):
+        self.assertSeriesAlmostEqual(
+            self.metrics.strategy_summary(), self.analysis.strategy_summary,
+            ["五年平均年收益", "年化收益标准差", "平均月收益", "最大回撤率", "夏普比率", "盈利因子"]
+        )
+
+    def test_risk_indicator(self):
+        result, expected = self.metrics.risk_indicator(), self.analysis.risk_indicator
+        self.assertSeriesAlmostEqual(result, expected, ["最大回撤金额", "最大回撤比率", "净利回撤比"])
+        self.assertEqual(result["最大回撤发生时间"], expected["最大回撤发生时间"])
+
+    def test_performance_keeps_snapshot(self):
+        performance = OrderAnalysis()
+        performance.set_equity(self.equity, BASE)
+        metrics = StreamingMetrics(BASE)
+        for time, equity in self.equity.items():
+            metrics.on_bar(time, equity)
+        performance.set_metrics(metrics)
+        summary = performance.strategy_summary.copy()
+        metrics.reset()
+        metrics.on_bar(self.equity.index[0], BASE / 2)
+        self.assertAlmostEqual(performance.strategy_summary["年化收益标准差"], summary["年化收益标准差"])
+        self.assertAlmostEqual(performance.risk_indicator["最大回撤金额"], self.metrics.max_drawdown)
+
+    def test_performance_trade_summary_all(self):
+        performance = OrderAnalysis()
+        performance.set_equity(self.equity, BASE)
+        performance.set_metrics(self.metrics)
+        result, expected = performance.trade_summary_all, self.analysis.trade_summary_all
+        for column in ("全部", "多头", "空头"):
+            self.assertSeriesAlmostEqual(result[column], expected[column], [
+                "总净利", "总盈利", "总亏损", "总交易次数", "总盈利次数", "总亏损次数",
+            ])
+        self.assertEqual(result["全部"]["总持仓时间"], expected["全部"]["总持仓时间"])
+        self.assertEqual(result["全部"]["交易天数"], expected["全部"]["交易天数"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+# encoding:utf-8
+import unittest
+from datetime import datetime
+
+from fxdayu.engine import Engine
+from fxdayu.event import EVENTS, TickEvent, ScheduleEvent
+from fxdayu.models.data import TickData
+from fxdayu.modules.timer.tick_bar import TickBarAggregator, FLUSH_TOPIC
+
+
+def make_tick(symbol, time, price, volume):
+    tick = TickData()
+    tick.symbol = symbol
+    tick.date = "20170303"
+    tick.time = time
+    tick.lastPrice = price
+    tick.volume = volume
+    return tick
+
+
+class TestTickBarAggregator(unittest.TestCase):
+    def setUp(self):
+        self.engine = Engine(mode=Engine.MODE.BACKTEST)
+        self.aggregator = TickBarAggregator(self.engine, frequencies=("1min", "5min"))
+        self.aggregator.register()
+
+    def put_tick(self, symbol, time, price, volume):
+        self.engine._dispatch(TickEvent(make_tick(symbol, time, price, volume)))
+
+    def drain(self):
+        events = []
+        while not self.engine.event_queue.empty():
+            events.append(self.engine.event_queue.get())
+        return events
+
+    def flush_at(self, time):
+        self.engine._dispatch(ScheduleEvent(datetime.strptime("20170303 " + time, "%Y%m%d %H:%M:%S"),
+                                            topic=FLUSH_TOPIC))
+
+    def test_next_tick_closes_bar(self):
+        self.put_tick("000001.XSHE", "11:28:10", 10.0, 100)
+        self.put_tick("000001.XSHE", "11:28:50", 10.2, 150)
+        self.assertEqual(self.drain(), [])
+        self.put_tick("000001.XSHE", "11:29:10", 10.1, 180)
+        events = self.drain()
+        bars = [e for e in events if e.type == EVENTS.BAR]
+        self.assertEqual(len(bars), 1)
+        self.assertEqual(bars[0].time, datetime(2017, 3, 3, 11, 29))
+        self.assertEqual((bars[0].open, bars[0].high, bars[0].close), (10.0, 10.2, 10.2))
+        times = [(e.time, e.topic) for e in events if e.type == EVENTS.TIME]
+        self.assertEqual(times, [(datetime(2017, 3, 3, 11, 29), "bar.open"),
+                                 (datetime(2017, 3, 3, 11, 29), "bar.close")])
+
+    def test_flush_closes_session_end_bars(self):
+        self.put_tick("000001.XSHE", "11:29:30", 10.0, 100)
+        self.put_tick("600000.XSHG", "11:29:40", 5.0, 200)
+        self.drain()
+        self.flush_at("11:29:59")
+        self.assertEqual(self.drain(), [])
+
+        self.flush_at("11:30:05")
+        events = self.drain()
+        bars = sorted((e.ticker, e.topic, e.time) for e in events if e.type == EVENTS.BAR)
+        self.assertEqual(bars, [("000001.XSHE", "1min", datetime(2017, 3, 3, 11, 30)),
+                                ("000001.XSHE", "5min", datetime(2017, 3, 3, 11, 30)),
+                                ("600000.XSHG", "1min", datetime(2017, 3, 3, 11, 30)),
+                                ("600000.XSHG", "5min", datetime(2017, 3, 3, 11, 30))])
+        self.assertEqual(len([e for e in events if e.type == EVENTS.TIME]), 2)
+        self.assertEqual(len(self.aggregator.history("000001.XSHE")), 1)
+
+        self.flush_at("11:31:05")
+        self.assertEqual(self.drain(), [])
+
+    def test_late_tick_rolls_into_next_bar(self):
+        self.put_tick("000001.XSHE", "11:29:30", 10.0, 100)
+        self.flush_at("11:30:05")
+        self.drain()
+        self.put_tick("000001.XSHE", "11:29:59", 10.5, 130)
+        self.assertEqual(self.drain(), [])
+
+        self.put_tick("000001.XSHE", "13:00:01", 10.3, 160)
+        self.assertEqual(self.drain(), [])
+        self.flush_at("13:01:05")
+        events = self.drain()
+        bars = [e for e in events if e.type == EVENTS.BAR and e.topic == "1min"]
+        self.assertEqual(len(bars), 1)
+        self.assertEqual(bars[0].time, datetime(2017, 3, 3, 13, 1))
+        self.assertEqual(bars[0].volume, 60)
+        self.assertEqual(len(self.aggregator.history("000001.XSHE")), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+# encoding:utf-8
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+from fxdayu.context import Context
+from fxdayu.engine import Engine
+from fxdayu.event import OrderBatchEvent
+from fxdayu.models.dao.engine import PersistenceEngine
+from fxdayu.models.order import OrderReq, OrderStatusData
+from fxdayu.modules.order.handlers import OrderStatusHandler
+
+
+def make_order(ord_id, symbol="000001.XSHE", qty=100):
+    order = OrderReq()
+    order.gateway = "BACKTEST"
+    order.account = "BACKTEST"
+    order.clOrdID = str(ord_id)
+    order.exchange = "XSHE"
+    order.symbol = symbol
+    order.side = "Buy"
+    order.action = "Open"
+    order.orderQty = qty
+    order.price = 10.0
+    return order
+
+
+class TestWriteBehindOrders(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.url = "sqlite:///" + os.path.join(self.path, "orders.db")
+        self.persistence = PersistenceEngine(self.url, write_behind=True, interval=60)
+        self.engine = Engine(mode=Engine.MODE.BACKTEST)
+        self.context = Context(self.engine)
+        self.handler = OrderStatusHandler(self.engine)
+        self.handler.set_context(self.context)
+        self.handler.set_environment({"persistence": self.persistence})
+        self.handler.init()
+        self.handler.register()
+
+    def tearDown(self):
+        self.persistence.close()
+        shutil.rmtree(self.path)
+
+    def test_order_batch(self):
+        orders = [make_order(i) for i in range(1, 4)]
+        # dispatch through the registered handlers, as the engine does for each event
+        self.engine._dispatch(OrderBatchEvent(orders, datetime(2016, 1, 4, 9, 30)))
+
+        status_dao = self.persistence.get_dao(OrderStatusData)
+        self.assertEqual(len(status_dao.find_all()), 3)
+        self.assertEqual(len(self.persistence.get_dao(OrderReq).find_all()), 3)
+        self.assertEqual(status_dao.find("BACKTEST", "BACKTEST", "2").orderQty, 100)
+
+        self.assertEqual(self.persistence.writer.flush(), 6)
+        session = self.persistence.session
+        self.assertEqual(
+            sorted(status.clOrdID for status in session.query(OrderStatusData).all()), ["1", "2", "3"]
+        )
+        self.assertEqual(session.query(OrderReq).count(), 3)
+
+    def test_flush_writes_queued_state(self):
+        dao = self.persistence.get_dao(OrderReq)
+        order = make_order(1)
+        dao.insert(order)
+        order.orderQty = 200  # changed after queued, not written until inserted again
+
+        self.assertEqual(self.persistence.writer.flush(), 1)
+        session = self.persistence.session
+        self.assertEqual(session.query(OrderReq).one().orderQty, 100)
+        self.assertEqual(dao.find("BACKTEST", "BACKTEST", "1").orderQty, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,19 @@
 # encoding: utf-8
+import numpy as np
 import pandas as pd
 import os
+import inspect
+import math
+import multiprocessing
+from collections import OrderedDict
 from datetime import datetime
 import logging
 
-from ipyparallel import Client
-
+from fxdayu.data.cache import BarCache
+from fxdayu.engine import Engine
+from fxdayu.performance import OrderAnalysis
+from fxdayu.trader.component import Component
+from fxdayu.trader.packages import DEVELOP_MODE
 from .trader import Trader
 
 ROUND_MAP = {u"五年平均年收益": 2,
@@ -37,9 +45,9 @@ class Optimizer(object):
         for model, param in params.items():
             dct.update({'.'.join((model, key)): value for key, value in param.items()})
 
+        trader = Trader(self.settings, mode=Engine.MODE.BACKTEST)
         for param in self.exhaustion(**dct):
             pa = self.split(param)
-            trader = Trader(self.settings)
             trader.run(symbols, frequency, start, end, ticker_type, pa, save)
             op_dict = trader.output("strategy_summary", "risk_indicator")
             print(param, "accomplish")
@@ -64,8 +72,8 @@ class Optimizer(object):
                      **params):
         result = []
 
+        trader = Trader(self.settings, mode=Engine.MODE.BACKTEST)
         for param in self.exhaustion(**params):
-            trader = Trader(self.settings)
             trader.back_test(
                 filename, symbols, frequency,
                 start, end, ticker_type, params=param, save=False
@@ -101,9 +109,53 @@ class Optimizer(object):
         for prod in product(*values):
             yield dict(zip(keys, prod))
 
+    @staticmethod
+    def sampling(n, method="lhs", seed=None, **kwargs):
+        """
+        generator, 从所有参数组合中抽取n个不重复的组合
+
+        Args:
+            n(int): 抽样数，不小于组合总数时返回全部组合
+            method(str): "random" 随机抽样，"lhs" 拉丁超立方抽样，每个参数的取值范围
+                被均分为n层，每层恰好抽到一次，参数较少时比随机抽样覆盖更均匀
+            seed(int): 随机种子
+            **kwargs: 参数及其取值列表
+
+        Returns:
+            generator: dict
+        """
+        keys = list(kwargs.keys())
+        values = [list(kwargs[key]) for key in keys]
+        sizes = [len(v) for v in values]
+        total = 1
+        for size in sizes:
+            total *= size
+        if n >= total:
+            for param in Optimizer.exhaustion(**kwargs):
+                yield param
+            return
+
+        rng = np.random.RandomState(seed)
+        seen = set()
+        for _ in range(100):
+            if method == "random":
+                indices = [rng.randint(0, size, n) for size in sizes]
+            elif method == "lhs":
+                indices = [((rng.permutation(n) + rng.random_sample(n)) / n * size).astype(int) for size in sizes]
+            else:
+                raise ValueError("Unknown sampling method: %s" % method)
+            for combination in zip(*indices):
+                if combination not in seen:
+                    seen.add(combination)
+                    yield {key: v[i] for key, v, i in zip(keys, values, combination)}
+                    if len(seen) == n:
+                        return
+
 
 class ParallelOptimizer(Optimizer):
     def __init__(self, url_file=None, profile=None, settings=None):
+        from ipyparallel import Client
+
         super(ParallelOptimizer, self).__init__(settings)
         self.settings = settings if settings else {}
         self._client = Client(url_file=url_file, profile=profile)
@@ -123,7 +175,7 @@ class ParallelOptimizer(Optimizer):
 
     @staticmethod
     def run_trader(settings, code, param, runtime_meta):
-        trader = Trader()
+        trader = Trader(mode=Engine.MODE.BACKTEST)
 
         for k, v in settings.items():
             trader[k].kwargs.update(v)
@@ -145,3 +197,428 @@ class ParallelOptimizer(Optimizer):
         tmp = [ar.get() for ar in ars]
         result = pd.DataFrame(tmp).sort_values(by=sort, ascending=ascending)
         return result
+
+
+# state of the running sweep, inherited by forked workers instead of being pickled
+_SWEEP = None
+# trader of a worker process, reset and reused by every parameter combination it runs
+_TRADER = None
+
+
+def _accepts(constructor, name):
+    try:
+        spec = inspect.getfullargspec(constructor.__init__)
+    except AttributeError:  # python2
+        spec = inspect.getargspec(constructor.__init__)
+    return name in spec.args
+
+
+def _copy_settings(settings):
+    return OrderedDict(
+        (name, Component(co.name, co.constructor, co.args, dict(co.kwargs))) for name, co in settings.items()
+    )
+
+
+def _share_bars(settings, cache_bytes, runtime_meta):
+    """
+    Give the data module of settings a BarCache if it accepts one, and load bars into it.
+
+    Returns:
+        Trader: the initialized trader used to load bars
+    """
+    data = settings["data"]
+    if _accepts(data.constructor, "bar_cache") and data.kwargs.get("bar_cache", None) is None:
+        data.kwargs["bar_cache"] = BarCache(cache_bytes)
+    trader = Trader(settings, mode=Engine.MODE.BACKTEST)
+    trader.initialize()
+    trader.modules["data"].init(*runtime_meta)
+    return trader
+
+
+def _sweep_one(param):
+    global _TRADER
+
+    settings, code, runtime_meta = _SWEEP
+    symbols, frequency, start, end, ticker_type = runtime_meta
+    if _TRADER is None:
+        _TRADER = Trader(settings, mode=Engine.MODE.BACKTEST)
+    trader = _TRADER
+    if code is None:
+        trader.run(symbols, frequency, start, end, ticker_type, Optimizer.split(param))
+    else:
+        trader.back_test(code, symbols, frequency, start, end, ticker_type, params=dict(param), raw_code=True)
+    result = dict(param)
+    for p in trader.output("strategy_summary", "risk_indicator").values():
+        result.update(p)
+    return result
+
+
+class ProcessOptimizer(Optimizer):
+    """
+    Parameter sweep on local processes.
+
+    Bars are loaded from database once in the main process into a BarCache shared by the data
+    module of every backtest. Workers are forked after that, so they read the cached bars
+    through copy-on-write memory instead of reloading them, and results are yielded as soon
+    as they finish.
+    """
+
+    def __init__(self, settings=None, processes=None, chunksize=1, cache_bytes=1024 * 1024 * 1024):
+        """
+
+        Args:
+            settings(OrderedDict): trader settings, default to DEVELOP_MODE
+            processes(int): number of worker processes, default to number of cpus
+            chunksize(int): number of parameter combinations sent to a worker at a time
+            cache_bytes(int): size of the BarCache holding bars shared by workers
+        """
+        super(ProcessOptimizer, self).__init__(_copy_settings(settings if settings else DEVELOP_MODE))
+        self.processes = processes if processes else multiprocessing.cpu_count()
+        self.chunksize = chunksize
+        self.cache_bytes = cache_bytes
+        self._code = None
+
+    def open(self, filename):
+        with open(filename) as f:
+            self._code = f.read()
+
+    def _share_data(self, runtime_meta):
+        _share_bars(self.settings, self.cache_bytes, runtime_meta)
+
+    @staticmethod
+    def _pool(processes):
+        try:
+            return multiprocessing.get_context("fork").Pool(processes)
+        except AttributeError:  # python2 forks on posix
+            return multiprocessing.Pool(processes)
+
+    def sweep(self, symbols, frequency, start=None, end=None, ticker_type=None, code=None, **params):
+        """
+        generator, 在多个进程中运行所有参数组合，按完成顺序返回结果
+
+        Args:
+            symbols(list): 品种
+            frequency(str): 周期
+            start(datetime): 开始时间
+            end(datetime): 结束时间
+            ticker_type(str): 品种类型
+            code(str): 策略代码，为None时params为{模块: {参数: 取值列表}}, 否则为{策略参数: 取值列表}
+            **params: 参数及其取值列表
+
+        Returns:
+            generator: 每个参数组合的参数和回测结果(dict)
+        """
+        global _SWEEP
+
+        if code is None:
+            dct = {}
+            for model, param in params.items():
+                dct.update({'.'.join((model, key)): value for key, value in param.items()})
+            params = dct
+        runtime_meta = (symbols, frequency, start, end, ticker_type)
+        self._share_data(runtime_meta)
+        _SWEEP = (self.settings, code, runtime_meta)
+        pool = self._pool(self.processes)
+        try:
+            for result in pool.imap_unordered(_sweep_one, self.exhaustion(**params), self.chunksize):
+                logging.info("%s accomplish", result)
+                yield result
+        finally:
+            pool.terminate()
+            pool.join()
+            _SWEEP = None
+
+    def run(self, symbols, frequency, start=None, end=None, ticker_type=None,
+            sort=u"夏普比率", ascending=False, save=False, **params):
+        result = list(self.sweep(symbols, frequency, start, end, ticker_type, **params))
+        return pd.DataFrame(result).sort_values(by=sort, ascending=ascending)
+
+    def optimization(self, filename, symbols, frequency,
+                     start=None, end=None, ticker_type=None,
+                     sort=u"夏普比率", ascending=False, save=False,
+                     **params):
+        self.open(filename)
+        result = pd.DataFrame(list(self.sweep(symbols, frequency, start, end, ticker_type, self._code, **params)))
+        result = result.sort_values(by=sort, ascending=ascending)
+        for key, value in ROUND_MAP.items():
+            if key in result:
+                result[key] = result[key].round(value)
+
+        if save:
+            name = os.path.basename(filename).split(".")[0]
+            dt = datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
+            result.to_excel("Optimization_%s&%s.xls" % (name, dt), encoding="utf-8")
+        return result
+
+
+class HalvingOptimizer(Optimizer):
+    """
+    Parameter search for grids too large to be exhausted.
+
+    Candidates are sampled from the grid, randomly or by latin hypercube, then searched by
+    successive halving: all candidates are backtested on a short window from start, the best
+    1 / eta of them by the sort column of strategy_summary and risk_indicator are kept and the
+    window is extended eta times, until the survivors are backtested on the whole period.
+    A backtest whose drawdown exceeds max_drawdown is stopped at once and ranked last.
+
+    All backtests run on one reused Trader, bars of the whole period are loaded once into a
+    BarCache, so shorter windows are served from memory.
+    """
+
+    def __init__(self, settings=None, samples=100, method="lhs", eta=3, rounds=None, max_drawdown=None,
+                 seed=None, cache_bytes=1024 * 1024 * 1024):
+        """
+
+        Args:
+            settings(OrderedDict): trader settings, default to DEVELOP_MODE
+            samples(int): number of parameter combinations sampled from the grid
+            method(str): sampling method, "lhs" or "random", see Optimizer.sampling
+            eta(int): 1 / eta of candidates are kept after each round
+            rounds(int): number of rounds, default to the number of times samples can be divided by eta
+            max_drawdown(float): stop a backtest when its drawdown exceeds it, None to never stop
+            seed(int): random seed of sampling
+            cache_bytes(int): size of the BarCache holding bars of the whole period
+        """
+        super(HalvingOptimizer, self).__init__(_copy_settings(settings if settings else DEVELOP_MODE))
+        self.samples = samples
+        self.method = method
+        self.eta = eta
+        self.rounds = rounds
+        self.max_drawdown = max_drawdown
+        self.seed = seed
+        self.cache_bytes = cache_bytes
+
+    def _windows(self, count, start, end):
+        # end of the backtest window of every round, the last one is end
+        rounds = self.rounds
+        if rounds is None:
+            rounds = 1
+            while count > 1:
+                count = int(math.ceil(count / float(self.eta)))
+                rounds += 1
+        start = pd.Timestamp(start)
+        period = pd.Timestamp(end) - start
+        return [(start + period * (float(self.eta) ** (r + 1 - rounds))).to_pydatetime()
+                for r in range(rounds - 1)] + [end]
+
+    def _evaluate(self, trader, code, param, runtime_meta):
+        symbols, frequency, start, end, ticker_type = runtime_meta
+        if code is None:
+            trader.run(symbols, frequency, start, end, ticker_type, self.split(param), max_drawdown=self.max_drawdown)
+        else:
+            trader.back_test(code, symbols, frequency, start, end, ticker_type, params=dict(param), raw_code=True,
+                             max_drawdown=self.max_drawdown)
+        result = dict(param)
+        for p in trader.output("strategy_summary", "risk_indicator").values():
+            result.update(p)
+        result["aborted"] = trader.aborted
+        return result
+
+    @staticmethod
+    def _rank(results, sort, ascending):
+        frame = pd.DataFrame(results)
+        frame["_last"] = frame["aborted"].astype(bool) | frame[sort].isnull()
+        frame = frame.sort_values(by=["_last", sort], ascending=[True, ascending], kind="mergesort")
+        return list(frame.index)
+
+    def search(self, symbols, frequency, start, end, ticker_type=None, code=None,
+               sort=u"夏普比率", ascending=False, **params):
+        """
+        按逐次减半搜索抽样得到的参数组合
+
+        Args:
+            symbols(list): 品种
+            frequency(str): 周期
+            start(datetime): 开始时间
+            end(datetime): 结束时间
+            ticker_type(str): 品种类型
+            code(str): 策略代码，为None时params为{模块: {参数: 取值列表}}, 否则为{策略参数: 取值列表}
+            sort(str): 排序依据，strategy_summary或risk_indicator中的指标
+            ascending(bool): 是否升序，即指标越小越好
+            **params: 参数及其取值列表
+
+        Returns:
+            pandas.DataFrame: 每个参数组合在其最后一轮的结果，round为所在轮次，aborted表示是否因回撤被提前结束，
+                按轮次和排序依据排列，第一行为最优
+        """
+        if start is None or end is None:
+            raise ValueError("start and end are required by successive halving")
+        if code is None:
+            dct = {}
+            for model, param in params.items():
+                dct.update({'.'.join((model, key)): value for key, value in param.items()})
+            params = dct
+
+        candidates = list(self.sampling(self.samples, self.method, self.seed, **params))
+        trader = _share_bars(self.settings, self.cache_bytes, (symbols, frequency, start, end, ticker_type))
+        windows = self._windows(len(candidates), start, end)
+        final = {}
+        alive = list(range(len(candidates)))
+        for number, window_end in enumerate(windows):
+            results = {}
+            for i in alive:
+                result = self._evaluate(trader, code, candidates[i], (symbols, frequency, start, window_end, ticker_type))
+                result["round"] = number
+                results[i] = final[i] = result
+                logging.info("%s accomplish", result)
+            ranked = self._rank([results[i] for i in alive], sort, ascending)
+            if number < len(windows) - 1:
+                alive = [alive[j] for j in ranked[:max(int(math.ceil(len(alive) / float(self.eta))), 1)]]
+
+        result = pd.DataFrame([final[i] for i in range(len(candidates))])
+        result["_last"] = result["aborted"].astype(bool) | result[sort].isnull()
+        result = result.sort_values(by=["round", "_last", sort], ascending=[False, True, ascending], kind="mergesort")
+        return result.drop("_last", axis=1).reset_index(drop=True)
+
+    def run(self, symbols, frequency, start=None, end=None, ticker_type=None,
+            sort=u"夏普比率", ascending=False, save=False, **params):
+        return self.search(symbols, frequency, start, end, ticker_type, None, sort, ascending, **params)
+
+    def optimization(self, filename, symbols, frequency,
+                     start=None, end=None, ticker_type=None,
+                     sort=u"夏普比率", ascending=False, save=False,
+                     **params):
+        with open(filename) as f:
+            code = f.read()
+        result = self.search(symbols, frequency, start, end, ticker_type, code, sort, ascending, **params)
+        for key, value in ROUND_MAP.items():
+            if key in result:
+                result[key] = result[key].round(value)
+
+        if save:
+            name = os.path.basename(filename).split(".")[0]
+            dt = datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
+            result.to_excel("Optimization_%s&%s.xls" % (name, dt), encoding="utf-8")
+        return result
+
+
+class WalkForwardOptimizer(ProcessOptimizer):
+    """
+    Walk-forward analysis of a strategy file.
+
+    The period is cut into rolling windows, parameters are swept on the in-sample part of each
+    window in parallel, and the best of them is backtested on the out-of-sample part right
+    after it. Out-of-sample equity curves are stitched, each one compounded on the end of the
+    previous, into one OrderAnalysis.
+
+    Bars of the whole period are loaded once into a BarCache, so every window is sliced from
+    memory, and out-of-sample backtests run on one reused Trader.
+    """
+
+    def __init__(self, settings=None, in_sample="365D", out_sample="90D", step=None,
+                 processes=None, chunksize=1, cache_bytes=1024 * 1024 * 1024):
+        """
+
+        Args:
+            settings(OrderedDict): trader settings, default to DEVELOP_MODE
+            in_sample(str | timedelta): length of in-sample part of a window
+            out_sample(str | timedelta): length of out-of-sample part of a window
+            step(str | timedelta): distance between starts of two windows, default to out_sample
+            processes(int): number of worker processes of in-sample sweeps
+            chunksize(int): number of parameter combinations sent to a worker at a time
+            cache_bytes(int): size of the BarCache holding bars of the whole period
+        """
+        super(WalkForwardOptimizer, self).__init__(settings, processes, chunksize, cache_bytes)
+        self.in_sample = pd.Timedelta(in_sample)
+        self.out_sample = pd.Timedelta(out_sample)
+        self.step = pd.Timedelta(step) if step is not None else self.out_sample
+        self.performance = None
+
+    def windows(self, start, end):
+        """
+        Args:
+            start(datetime): start of the whole period
+            end(datetime): end of the whole period
+
+        Returns:
+            list: [(in-sample start, in-sample end, out-of-sample end)]
+        """
+        result = []
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        while start + self.in_sample < end:
+            in_end = start + self.in_sample
+            result.append((start.to_pydatetime(), in_end.to_pydatetime(),
+                           min(in_end + self.out_sample, end).to_pydatetime()))
+            start += self.step
+        return result
+
+    def _share_data(self, runtime_meta):
+        # bars of the whole period are already cached by walk
+        if self.settings["data"].kwargs.get("bar_cache", None) is None:
+            super(WalkForwardOptimizer, self)._share_data(runtime_meta)
+
+    @staticmethod
+    def _stitch(equities, orders, base):
+        stitched = []
+        level = base
+        last = None
+        for equity in equities:
+            if last is not None:
+                equity = equity[equity.index > last]
+            if not len(equity):
+                continue
+            equity = equity * (level / base)
+            stitched.append(equity)
+            level, last = equity.iloc[-1], equity.index[-1]
+
+        performance = OrderAnalysis()
+        performance.set_equity(pd.concat(stitched) if stitched else pd.Series(dtype=float), base)
+
+        frames, offset = [], 0
+        for frame in orders:
+            if isinstance(frame, pd.DataFrame) and len(frame) and u"报单编号" in frame:
+                frame = frame.copy()
+                frame[u"报单编号"] = frame[u"报单编号"].astype(int) + offset
+                offset = frame[u"报单编号"].max()
+                frames.append(frame)
+        if frames:
+            performance.set_orders(pd.concat(frames, ignore_index=True))
+        return performance
+
+    def walk(self, filename, symbols, frequency, start, end, ticker_type=None,
+             sort=u"夏普比率", ascending=False, **params):
+        """
+        运行滚动窗口的样本内参数优化和样本外检验
+
+        Args:
+            filename(str): 策略文件
+            symbols(list): 品种
+            frequency(str): 周期
+            start(datetime): 开始时间
+            end(datetime): 结束时间
+            ticker_type(str): 品种类型
+            sort(str): 样本内选择参数的依据，strategy_summary或risk_indicator中的指标
+            ascending(bool): 是否升序，即指标越小越好
+            **params: 策略参数及其取值列表
+
+        Returns:
+            pandas.DataFrame: 每个窗口一行，包括窗口时间、选出的参数、样本内指标和样本外结果，
+                拼接后的样本外绩效保存在self.performance
+        """
+        self.open(filename)
+        trader = _share_bars(self.settings, self.cache_bytes, (symbols, frequency, start, end, ticker_type))
+        base = trader.modules["portfolio"].starting_cash
+
+        rows, equities, orders = [], [], []
+        for in_start, in_end, out_end in self.windows(start, end):
+            results = list(self.sweep(symbols, frequency, in_start, in_end, ticker_type, self._code, **params))
+            best = results[pd.DataFrame(results).sort_values(by=sort, ascending=ascending).index[0]]
+            param = {key: best[key] for key in params}
+
+            trader.back_test(self._code, symbols, frequency, in_end, out_end, ticker_type, params=dict(param),
+                             raw_code=True)
+            row = OrderedDict([("in_sample_start", in_start), ("in_sample_end", in_end), ("out_sample_end", out_end)])
+            row.update(param)
+            row[u"样本内" + sort] = best[sort]
+            for p in trader.output("strategy_summary", "risk_indicator").values():
+                if p is not None:
+                    row.update(p)
+            rows.append(row)
+            logging.info("%s accomplish", row)
+
+            info = trader.modules["portfolio"].info
+            equities.append(pd.Series(info["equity"].values, index=info["datetime"]))
+            orders.append(trader.performance.orders)
+
+        self.performance = self._stitch(equities, orders, base)
+        return pd.DataFrame(rows)
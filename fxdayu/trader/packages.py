@@ -8,6 +8,7 @@ from fxdayu.modules.portfolio.handlers import PortfolioHandler
 from fxdayu.modules.security import SecurityPool
 from fxdayu.modules.timer.real_timer import RealTimer
 from fxdayu.modules.timer.simulation import TimeSimulation
+from fxdayu.performance.handlers import MetricsHandler
 from fxdayu.router import DummyExchange
 from fxdayu.router.paper_exchange import PaperExchange
 from fxdayu.trader.component import Component
@@ -21,7 +22,8 @@ DEVELOP_MODE = OrderedDict([
     ("security_pool", Component("security_pool", SecurityPool, (), {})),
     ("account_handler", Component("account_handler", AccountHandler, (), {})),
     ("order_book_handler", Component("order_book_handler", OrderStatusHandler, (), {})),
-    ("persistence", Component("persistence", PersistenceEngine, (), {}))
+    ("persistence", Component("persistence", PersistenceEngine, (), {})),
+    ("metrics", Component("metrics", MetricsHandler, (), {}))
 ])
 
 PORTFOLIO_CONFIG = {"host": "localhost",
@@ -39,7 +41,9 @@ TRADING_MODE = OrderedDict([
     ("security_pool", Component("security_pool", SecurityPool, (), {})),
     ("account_handler", Component("account_handler", AccountHandler, (), {})),
     ("order_book_handler", Component("order_book_handler", OrderStatusHandler, (), {})),
-    ("persistence", Component("persistence", PersistenceEngine, ("sqlite:///db.sqlite", ), {}))
+    ("persistence", Component("persistence", PersistenceEngine, ("sqlite:///db.sqlite", ),
+                              {"write_behind": True, "journal": "db.sqlite.journal"})),
+    ("metrics", Component("metrics", MetricsHandler, (), {}))
 ])
 
 if __name__ == '__main__':
@@ -4,15 +4,16 @@ from __future__ import unicode_literals
 import os
 from collections import OrderedDict
 from datetime import datetime
+from functools import partial
 
 import pandas as pd
 from pandas import ExcelWriter
 
 from fxdayu.context import Context, ContextMixin
 from fxdayu.engine import Engine
-from fxdayu.engine.handler import HandlerCompose
+from fxdayu.engine.handler import HandlerCompose, Handler
 from fxdayu.environment import *
-from fxdayu.event import EVENTS
+from fxdayu.event import EVENTS, ExitEvent
 from fxdayu.performance import OrderAnalysis
 from fxdayu.trader.component import Component
 from fxdayu.trader.packages import DEVELOP_MODE
@@ -46,10 +47,18 @@ OUTPUT_COLUMN_MAP = {
 class Trader(object):
     """
     用于自由组织模块并进行回测
+
+    同一个Trader可以连续进行多次回测，第二次起run和back_test会先调用reset，
+    只清除上一次回测的状态，保留构造好的模块、已加载的数据和编译好的策略代码。
+
+    Args:
+        settings(OrderedDict): 模块配置，默认为DEVELOP_MODE
+        mode(Engine.MODE): 事件引擎运行模式，纯回测时可使用Engine.MODE.BACKTEST
+            在当前线程中同步运行，默认为Engine.MODE.BLOCKING
     """
 
-    def __init__(self, settings=None):
-        self.engine = Engine()
+    def __init__(self, settings=None, mode=Engine.MODE.BLOCKING):
+        self.engine = Engine(mode=mode)
         self.context = Context(self.engine)
         self.context.register()
         self.environment = Environment()
@@ -63,6 +72,11 @@ class Trader(object):
         else:
             self.settings = DEVELOP_MODE
         self.initialized = False
+        self.finished = False
+        self.aborted = False
+        self._run_handlers = []
+        self._codes = {}
+        self._data_args = None
 
     def __getitem__(self, item):
         return self.settings[item]
@@ -118,6 +132,74 @@ class Trader(object):
         self.initialized = True
         return self
 
+    def reset(self):
+        """
+        清除上一次回测的状态：事件队列、本次回测注册的事件处理函数、持久化数据、
+        各模块的计数和记录以及绩效缓存，之后可以在同一个Trader上开始下一次回测。
+
+        Returns:
+            Trader: self
+        """
+        for handler in self._run_handlers:
+            handler.unregister(self.engine)
+        self._run_handlers = []
+        for name, module in self.modules.items():
+            if hasattr(module, "reset"):
+                module.reset()
+        self.performance = OrderAnalysis()
+        self.finished = False
+        self.aborted = False
+        return self
+
+    def _prepare(self):
+        if not self.initialized:
+            self.initialize()
+        elif self.finished:
+            self.reset()
+
+    def _register_run(self, func, stream, topic=".", priority=0):
+        # handlers of a single run, unregistered by reset
+        handler = Handler(func, stream, topic, priority)
+        handler.register(self.engine)
+        self._run_handlers.append(handler)
+
+    def stop_on_drawdown(self, limit):
+        """
+        在本次回测中，收盘后净值回撤超过limit时立即结束回测，并将aborted设为True
+
+        Args:
+            limit(float): 最大回撤比率，如0.3
+
+        Returns:
+            None
+        """
+        portfolio, engine = self.modules["portfolio"], self.engine
+
+        def on_time(event, kwargs=None):
+            if not self.aborted and portfolio.drawdown > limit:
+                self.aborted = True
+                engine.put(ExitEvent(priority=-999))
+
+        self._register_run(on_time, EVENTS.TIME, topic="bar.close", priority=-100)
+
+    def _init_data(self, *args):
+        # bars loaded by the last run are reused when loading arguments are the same
+        if self._data_args != args:
+            self.modules["data"].init(*args)
+            self._data_args = args
+
+    def _compile(self, filename, raw_code):
+        key = (filename, raw_code)
+        code = self._codes.get(key, None)
+        if code is None:
+            if raw_code:
+                code = compile(filename, "<strategy>", "exec")
+            else:
+                with open(filename) as f:
+                    code = compile(f.read(), filename, "exec")
+            self._codes[key] = code
+        return code
+
     def activate(self):
         context, data, engine = self.context, self.modules["data"], self.engine
         context.account = Environment()
@@ -127,10 +209,16 @@ class Trader(object):
         engine.start()
         engine.join()
         engine.stop()
+        self.finished = True
 
-    def run(self, symbols, frequency=None, start=None, end=None, ticker_type=None, params=None, save=False):
-        if not self.initialized:
-            self.initialize()
+    def run(self, symbols, frequency=None, start=None, end=None, ticker_type=None, params=None, save=False,
+            max_drawdown=None):
+        self._prepare()
+        if max_drawdown is not None:
+            self.stop_on_drawdown(max_drawdown)
+
+        def on_stop(event, kwargs=None):
+            self.perform
 
         context, data, engine = self.context, self.modules["data"], self.engine
 
@@ -139,8 +227,9 @@ class Trader(object):
                 for key, value in param.items():
                     setattr(self.modules[name], key, value)
 
-        data.init(symbols, frequency, start, end, ticker_type)
+        self._init_data(symbols, frequency, start, end, ticker_type)
         self.modules['timer'].put_time()
+        self._register_run(on_stop, EVENTS.EXIT, priority=100)
 
         self.activate()
 
@@ -150,11 +239,7 @@ class Trader(object):
         context, data = self.context, self.modules["data"]
         strategy = self.environment.public.copy()
 
-        if raw_code:
-            exec (filename, strategy, strategy)
-        else:
-            with open(filename) as f:
-                exec (f.read(), strategy, strategy)
+        exec (self._compile(filename, raw_code), strategy, strategy)
 
         if params:
             for key, value in params.items():
@@ -167,7 +252,7 @@ class Trader(object):
             if handle_data:
                 handle_data(context, data)
 
-        self.engine.register(on_time, EVENTS.TIME, topic="bar.close", priority=100)
+        self._register_run(on_time, EVENTS.TIME, topic="bar.close", priority=100)
 
         with self.environment_context:
             strategy["initialize"](context, data)
@@ -175,14 +260,17 @@ class Trader(object):
         return strategy
 
     def real_trade(self, filename, **kwargs):
-        if not self.initialized:
-            self.initialize()
+        self._prepare()
+
+        def on_stop(event, kwargs=None):
+            self.modules["persistence"].close()
 
         self.use_file(filename, **kwargs)
+        self._register_run(on_stop, EVENTS.EXIT, priority=100)
         self.activate()
 
     def back_test(self, filename, symbols, frequency=None,
-                  start=None, end=None, db=None, params=None, save=False, raw_code=False):
+                  start=None, end=None, db=None, params=None, save=False, raw_code=False, max_drawdown=None):
         """
         运行一个策略, 完成后返回一个账户对象
 
@@ -195,19 +283,22 @@ class Trader(object):
             ticker_type:
             params:
             save:
+            raw_code: filename为策略代码而不是文件名
+            max_drawdown(float): 回撤超过该比率时提前结束回测，见stop_on_drawdown
         """
-        if not self.initialized:
-            self.initialize()
+        self._prepare()
+        if max_drawdown is not None:
+            self.stop_on_drawdown(max_drawdown)
 
         def on_stop(event, kwargs=None):
             self.perform
             self.modules["persistence"].close()
 
         context, data = self.context, self.modules["data"]
-        data.init(symbols, frequency, start, end, db)
+        self._init_data(symbols, frequency, start, end, db)
         self.use_file(filename, raw_code, params)
         self.modules['timer'].put_time()
-        self.engine.register(on_stop, EVENTS.EXIT, priority=100)
+        self._register_run(on_stop, EVENTS.EXIT, priority=100)
         self.activate()
 
         if save:
@@ -231,9 +322,27 @@ class Trader(object):
 
     @property
     def perform(self):
+        """
+        绩效分析对象。若配置了metrics模块，strategy_summary和risk_indicator取自回测中
+        逐bar更新的指标在此时的快照，报单和成交也在此时取出，报单明细在第一次使用时才生成，
+        因此之后的reset和下一次回测不会改变已返回的绩效。
+        """
         if not self.initialized:
             raise ValueError("trader not initialized, no data to perform")
 
+        info = self.modules["portfolio"].info
+        self.performance.set_equity(pd.Series(info["equity"].values, index=info["datetime"]))
+        if "metrics" in self.modules:
+            book = self.modules["order_book_handler"]
+            self.performance.set_metrics(self.modules["metrics"].metrics)
+            self.performance.set_orders(partial(
+                self._trades, book.get_executions(method="df"), book.get_status(method="df")
+            ))
+        else:
+            self.performance.set_orders(self._trades())
+        return self.performance
+
+    def _trades(self, execs=None, orders=None):
         def reorganize(data_frame, key):
             return data_frame.rename_axis(OUTPUT_COLUMN_MAP[key], axis=1) \
                 .reindex(columns=OUTPUT_COLUMN_MAP[key].values())
@@ -242,10 +351,10 @@ class Trader(object):
             avg_price = (x["成交数"] * x["成交均价"]).sum() / x["成交数"].sum()
             return pd.Series(avg_price, index=["avg_price"])
 
-        eqt = pd.DataFrame(self.modules["portfolio"].info)
-        eqt = pd.Series(eqt["equity"].values, index=eqt["datetime"])
-        execs = self.modules["order_book_handler"].get_executions(method="df")
-        orders = self.modules["order_book_handler"].get_status(method="df")
+        if execs is None:
+            execs = self.modules["order_book_handler"].get_executions(method="df")
+        if orders is None:
+            orders = self.modules["order_book_handler"].get_status(method="df")
         execs = reorganize(execs, "execution")
         orders = reorganize(orders, "order")
         execs_group = execs.groupby("报单编号")
@@ -264,9 +373,7 @@ class Trader(object):
         trades["撤销时间"] = trades["撤销时间"].fillna(pd.NaT)
         trades["报单编号"] = trades["报单编号"].astype(int)
         trades.sort_values("报单编号", inplace=True)
-        self.performance.set_equity(eqt)
-        self.performance.set_orders(trades)
-        return self.performance
+        return trades
 
     def output(self, *args):
         return {attr: getattr(self.performance, attr, None) for attr in args}